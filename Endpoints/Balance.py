@@ -1,11 +1,14 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Response
 from typing import List
-from db.connection import db_dependency
+from datetime import datetime
+from db.connection import db_dependency, run_db
+from db.pagination import page_dependency, paginate
 from db.VerifyToken import user_dependency
+from web.fastjson import FastJSONRoute
 from models.userModels import Balance
 from schemas.schemas import BalanceCreateSchema, BalanceResponseSchema
 
-router = APIRouter(prefix="/balance", tags=["Balance Management"])
+router = APIRouter(prefix="/balance", tags=["Balance Management"], route_class=FastJSONRoute)
 
 # Create balance entry (either opening or closing)
 @router.post("/add", response_model=BalanceResponseSchema, status_code=201)
@@ -19,6 +22,10 @@ async def create_balance(balance: BalanceCreateSchema, db: db_dependency, user:u
         cash_balance=balance.cash_balance,
         momo_balance=balance.momo_balance
     )
+    return await run_db(db, _save_balance, db_balance)
+
+
+def _save_balance(db, db_balance: Balance):
     db.add(db_balance)
     db.commit()
     db.refresh(db_balance)
@@ -26,10 +33,10 @@ async def create_balance(balance: BalanceCreateSchema, db: db_dependency, user:u
 
 # Get all balances
 @router.get("/", response_model=List[BalanceResponseSchema])
-async def get_all_balances(db: db_dependency,user:user_dependency):
+async def get_all_balances(db: db_dependency,user:user_dependency, page: page_dependency, response: Response):
     if isinstance(user, HTTPException):
         raise user
-    balances = db.query(Balance).all()
+    balances = await run_db(db, lambda db: paginate(db.query(Balance), Balance.id, page, response))
     return balances
 
 # Get a single balance by ID
@@ -37,7 +44,7 @@ async def get_all_balances(db: db_dependency,user:user_dependency):
 async def get_balance(balance_id: int, db: db_dependency,user:user_dependency):
     if isinstance(user, HTTPException):
         raise user
-    balance = db.query(Balance).filter(Balance.id == balance_id).first()
+    balance = await run_db(db, lambda db: db.query(Balance).filter(Balance.id == balance_id).first())
     if not balance:
         raise HTTPException(status_code=404, detail="Balance not found")
     return balance
@@ -1,11 +1,17 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta, datetime
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, WebSocketException
+from starlette.requests import HTTPConnection
 from starlette import status
-from typing import Annotated
+from typing import Annotated, Optional
 from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
 from jose import jwt, JWTError
-from db.connection import db_dependency
+from db.cache import TTLCache
+from db.connection import db_dependency, run_db
+from web.fastjson import FastJSONRoute
 from models import userModels
 from models.userModels import Users
 from sqlalchemy.orm import Session
@@ -19,7 +25,7 @@ import os
 # Load environment variables from .env file
 load_dotenv()
 
-router = APIRouter(prefix="/auth", tags=["Authentication"])
+router = APIRouter(prefix="/auth", tags=["Authentication"], route_class=FastJSONRoute)
 
 # Load environment values
 SECRET_KEY = os.getenv("SECRET_KEY")
@@ -29,19 +35,53 @@ ALGORITHM = os.getenv("ALGORITHM")
 bcrypt_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_bearer = OAuth2PasswordBearer(tokenUrl="auth/token")
 
+# bcrypt burns 100-300 ms of CPU per call, so it runs on its own bounded pool
+# instead of the event loop (or the threadpool the database work shares)
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+
+# Verified token -> claims, so repeat requests skip the signature check.
+# Entries never outlive the token's own `exp`.
+token_cache = TTLCache(
+    maxsize=int(os.getenv("TOKEN_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("TOKEN_CACHE_TTL", "300")),
+)
+
+
+async def hash_password(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_executor, bcrypt_context.hash, password)
+
+
+async def verify_password(password: str, hashed_password: str) -> bool:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_executor, bcrypt_context.verify, password, hashed_password)
+
 
 # Handle register User
 @router.post("/register", status_code=status.HTTP_201_CREATED)
 async def register_user(db:db_dependency, create_user_request: CreateUserRequest):
-    try:
-        checkUser = db.query(Users).filter(Users.username == create_user_request.username).first()
-        if checkUser:
-            return HTTPException(status_code=400, detail="Username Is Taken")
+    # A taken name is turned away before it costs a bcrypt hash
+    if await run_db(db, _username_taken, create_user_request.username):
+        raise HTTPException(status_code=400, detail="Username Is Taken")
+    hashed_password = await hash_password(create_user_request.password)
+    return await run_db(db, _register_user, create_user_request, hashed_password)
+
+
+def _username_taken(db: Session, username: str) -> bool:
+    return db.query(Users.id).filter(Users.username == username).first() is not None
 
+
+def _register_user(db: Session, create_user_request: CreateUserRequest, hashed_password: str):
+    # Checked again: the name may have been taken while the password was hashed
+    if _username_taken(db, create_user_request.username):
+        raise HTTPException(status_code=400, detail="Username Is Taken")
+
+    try:
         # Create the user model
         create_user_model = Users(
             username=create_user_request.username,
-            password=bcrypt_context.hash(create_user_request.password),
+            password=hashed_password,
         )
 
         # Add to the database and commit
@@ -60,7 +100,7 @@ async def register_user(db:db_dependency, create_user_request: CreateUserRequest
 # Login user and create token
 @router.post("/login", response_model=Token)
 async def login_for_access_token(form_data: FromData, db:db_dependency):
-    user = authenticate_user(form_data.username, form_data.password, db)
+    user = await authenticate_user(form_data.username, form_data.password, db)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -76,7 +116,16 @@ async def login_for_access_token(form_data: FromData, db:db_dependency):
     return {"UserInfo": user_info, "access_token": token, "token_type": "bearer"}
 
 
-def authenticate_user(username: str, password: str, db: Session):
+async def authenticate_user(username: str, password: str, db: Session):
+    user = await run_db(db, _find_user, username)
+    if not user:
+        return False
+    if not await verify_password(password, user.password):
+        return False
+    return user
+
+
+def _find_user(db: Session, username: str):
     user = (
         db.query(userModels.Users)
         .filter(
@@ -86,10 +135,11 @@ def authenticate_user(username: str, password: str, db: Session):
         )
         .first()
     )
-    if not user:
-        return False
-    if not bcrypt_context.verify(password, user.password):
-        return False
+    # Hand the connection back to the pool before the slow password check; the session
+    # itself belongs to get_db, which closes it at the end of the request
+    if user is not None:
+        db.expunge(user)
+    db.rollback()
     return user
 
 
@@ -103,6 +153,9 @@ def create_access_token(
 
 
 async def get_current_user(token: Annotated[str, Depends(oauth2_bearer)]):
+    claims = token_cache.get(token)
+    if claims is not None:
+        return dict(claims)
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("uname")
@@ -112,9 +165,30 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_bearer)]):
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Authentication required!",
             )
-        return {"username": username, "user_id": user_id}
+        claims = {"username": username, "user_id": user_id}
+        if payload.get("exp") is not None:
+            token_cache.set(token, claims, ttl=payload["exp"] - time.time())
+        return dict(claims)
     except JWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Authentication failed. Your token is invalid or has expired. Please re-authenticate.",
         )
+
+
+async def get_stream_user(connection: HTTPConnection, token: Optional[str] = None):
+    """
+    `get_current_user` for event streams. Browsers can't send an Authorization header from
+    EventSource or WebSocket, so the token may come as the `token` query parameter instead.
+    """
+    scheme, _, credentials = connection.headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and credentials:
+        token = credentials
+    try:
+        if not token:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+        return await get_current_user(token)
+    except HTTPException as error:
+        if connection.scope["type"] == "websocket":
+            raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason=error.detail)
+        raise
@@ -1,151 +1,85 @@
+import os
+from datetime import datetime
 from fastapi import APIRouter, HTTPException
-from sqlalchemy import func, and_
-from db.connection import db_dependency
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+from db.cache import TTLCache
+from db.connection import db_dependency, run_db
 from db.VerifyToken import user_dependency
-from models.userModels import Hospital, Doctor, Nurse, Appointments, Records,Users                                                                                                                      
-router = APIRouter(prefix="/sum", tags=["Totals"])
+from web.fastjson import FastJSONRoute
+from models.userModels import Products, Stock, DailyProductSummary, Balance
 
-@router.get(
-    "/hospital/",
-    description="Get all hospital counts for various entities",
-)
-async def get_all_hospitals_total_counts(
-    user: user_dependency,
-    db: db_dependency
-):
-    if isinstance(user, HTTPException):
-        raise user
-
-    if user["acc_type"] not in ["hospital"]:
-        raise HTTPException(status_code=403, detail="You are not allowed to perform this action")
-
-    hospital = db.query(Hospital).filter(Hospital.OwnerId == user["user_id"]).first()
-    if not hospital:
-        raise HTTPException(status_code=404, detail="Hospital not found")
-
-    # Counting entities
-    doctor_count = db.query(func.count(Doctor.id)).filter(Doctor.hospitalId == hospital.id).scalar()
-    nurse_count = db.query(func.count(Nurse.id)).filter(Nurse.hospitalId == hospital.id).scalar()
-    appointment_count = db.query(func.count(Appointments.id)).filter(Appointments.hospitalId == hospital.id).scalar()
-    record_count = db.query(func.count(Records.id)).filter(Records.hospitalId == hospital.id).scalar()
-
-    return {
-        "hospital_name": hospital.hospital_name,
-        "doctor_count": doctor_count,
-        "nurse_count": nurse_count,
-        "appointment_count": appointment_count,
-        "record_count": record_count
-    }
-@router.get(
-    "/doctor",
-    description="Get all totals for the doctor including appointments and records.",
-)
-async def get_doctor_totals(
-    user:user_dependency,
-    db: db_dependency
-):
-    if isinstance(user, HTTPException):
-        raise user
+router = APIRouter(prefix="/sum", tags=["Totals"], route_class=FastJSONRoute)
 
-    if user["acc_type"] not in ["doctor"]:
-        raise HTTPException(status_code=403, detail="You are not allowed to perform this action")
+# Dashboard totals, keyed by day; short-lived so polling clients share one query
+totals_cache = TTLCache(maxsize=4, ttl=float(os.getenv("TOTALS_CACHE_TTL", "5")))
 
-    doctor = db.query(Doctor).filter(Doctor.OwnerId == user["user_id"]).first()
-    if not doctor:
-        raise HTTPException(status_code=404, detail="Doctor not found")
 
-    # Total appointments received
-    total_appointments = db.query(func.count(Appointments.id)).filter(Appointments.Doctor_id == doctor.id).scalar()
-    
-    # Total pending appointments
-    pending_appointments = db.query(func.count(Appointments.id)).filter(
-        and_(Appointments.Doctor_id == doctor.id, Appointments.app_status == False)
-    ).scalar()
+def _scalar(column, *criteria):
+    return select(column).where(*criteria).scalar_subquery()
 
-    # Total completed appointments
-    completed_appointments = db.query(func.count(Appointments.id)).filter(
-        and_(Appointments.Doctor_id == doctor.id, Appointments.app_status == True)
-    ).scalar()
 
-    # Total records created
-    total_records = db.query(func.count(Records.id)).filter(Records.Doctor_id == doctor.id).scalar()
-
-    # Total patients attended (distinct count based on patient IDs in appointments)
-    total_patients = db.query(func.count(func.distinct(Appointments.OwnerId))).filter(Appointments.Doctor_id == doctor.id).scalar()
+def _latest_balance(balance_type: str, column):
+    """`column` of the most recent dated balance entry of this type."""
+    # Postgres sorts NULLs first in DESC order; undated entries are never the latest
+    return (
+        select(column)
+        .where(Balance.balance_type == balance_type, Balance.date.is_not(None))
+        .order_by(Balance.date.desc(), Balance.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
 
-    return {
-        "total_appointments": total_appointments,
-        "pending_appointments": pending_appointments,
-        "completed_appointments": completed_appointments,
-        "total_records": total_records,
-        "total_patients": total_patients
-    }
 
 @router.get(
-    "/admin",
-    description="Get all totals for admin including users, hospitals, doctors, nurses, appointments, and records.",
+    "/",
+    description="Get the dashboard totals: products, stock on hand, today's sales and the latest balances.",
 )
-async def get_admin_totals(db: db_dependency, user:user_dependency):
+async def get_totals(user: user_dependency, db: db_dependency):
     if isinstance(user, HTTPException):
         raise user
 
-    if not user or "user_id" not in user:
-        raise HTTPException(status_code=401, detail="Authentication required")
-    
-    if user["acc_type"] not in ["admin"]:
-        raise HTTPException(status_code=403, detail="You are not allowed to perform this action")
-
-    # Total users count
-    total_users = db.query(func.count(Users.id)).scalar()
-
-    # Total hospitals count
-    total_hospitals = db.query(func.count(Hospital.id)).scalar()
-
-    # Total doctors count
-    total_doctors = db.query(func.count(Doctor.id)).scalar()
-
-    # Total nurses count
-    total_nurses = db.query(func.count(Nurse.id)).scalar()
-
-    # Total appointments count
-    total_appointments = db.query(func.count(Appointments.id)).scalar()
-
-    # Total records count
-    total_records = db.query(func.count(Records.id)).scalar()
-
-    # Hospital-wise counts including doctors and records
-    hospital_data = (
-        db.query(
-            Hospital.hospital_name,
-            Hospital.hospital_address,
-            func.count(Doctor.id).label("doctor_count"),
-            func.count(Records.id).label("record_count"),
-            func.count(Appointments.id).label("appointment_count")
-        )
-        .outerjoin(Doctor, Doctor.hospitalId == Hospital.id)
-        .outerjoin(Records, Records.hospitalId == Hospital.id)
-        .outerjoin(Appointments, Appointments.hospitalId == Hospital.id)
-        .group_by(Hospital.id)
-        .all()
-    )
-
-    detailed_hospital_data = [
-        {
-            # "hospital_name": data.hospital_name,
-            # "hospital_address": data.hospital_address,
-            "doctor_count": data.doctor_count,
-            "record_count": data.record_count,
-            "appointment_count": data.appointment_count,
-        }
-        for data in hospital_data
-    ]
+    today = datetime.utcnow().date()  # StockHistory, and so the rollup, is dated in UTC
+    totals = totals_cache.get(today)
+    if totals is None:
+        totals = await run_db(db, _totals, today)
+        totals_cache.set(today, totals)
+    return totals
+
+
+def _totals(db: Session, today):
+    # Every figure is a scalar subquery of one SELECT, so the dashboard costs a single round trip
+    sold_today = DailyProductSummary.day == today
+    row = db.execute(select(
+        _scalar(func.count(Products.Pro_id)).label("product_count"),
+        _scalar(func.coalesce(func.sum(Stock.product_quantity), 0)).label("stock_units"),
+        _scalar(func.coalesce(func.sum(Stock.total_price), 0)).label("stock_value"),
+        _scalar(func.coalesce(func.sum(DailyProductSummary.qty_out), 0), sold_today).label("quantity_sold"),
+        _scalar(func.coalesce(func.sum(DailyProductSummary.revenue), 0), sold_today).label("revenue"),
+        _scalar(func.coalesce(func.sum(DailyProductSummary.cost), 0), sold_today).label("cost"),
+        *(
+            _latest_balance(balance_type, column).label(f"{balance_type}_{column.key}")
+            for balance_type in ("opening", "closing")
+            for column in (Balance.date, Balance.cash_balance, Balance.momo_balance)
+        ),
+    )).one()._mapping
 
     return {
-        "total_users": total_users,
-        "total_hospitals": total_hospitals,
-        "total_doctors": total_doctors,
-        "total_nurses": total_nurses,
-        "total_appointments": total_appointments,
-        "total_records": total_records,
-        "hospital_data": detailed_hospital_data
-    }
\ No newline at end of file
+        "product_count": row["product_count"],
+        "stock_units": row["stock_units"],
+        "stock_value": row["stock_value"],
+        "today": {
+            "date": today,
+            "quantity_sold": row["quantity_sold"],
+            "revenue": row["revenue"],
+            "profit": row["revenue"] - row["cost"],
+        },
+        **{
+            f"{balance_type}_balance": {
+                "date": row[f"{balance_type}_date"],
+                "cash_balance": row[f"{balance_type}_cash_balance"],
+                "momo_balance": row[f"{balance_type}_momo_balance"],
+            } if row[f"{balance_type}_cash_balance"] is not None else None
+            for balance_type in ("opening", "closing")
+        },
+    }
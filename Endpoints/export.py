@@ -0,0 +1,135 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+from typing import Literal, Optional
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from db.VerifyToken import user_dependency
+from db.database import SessionLocal
+from web.fastjson import FastJSONRoute
+from models.userModels import StockHistory, Transaction
+
+router = APIRouter(prefix="/export", tags=["Exports"], route_class=FastJSONRoute)
+
+# Rows fetched per round trip; also the number of rows written per streamed chunk
+EXPORT_BATCH_SIZE = 1000
+
+STOCK_HISTORY_COLUMNS = [
+    StockHistory.stock_id,
+    StockHistory.product_id,
+    StockHistory.product_quantity,
+    StockHistory.price_per_unit,
+    StockHistory.total_price,
+    StockHistory.stocktype,
+    StockHistory.date,
+]
+
+TRANSACTION_COLUMNS = [
+    Transaction.id,
+    Transaction.description,
+    Transaction.amount,
+    Transaction.type,
+    Transaction.date,
+]
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _parse_range(startDate: Optional[str], endDate: Optional[str]):
+    try:
+        start = datetime.strptime(startDate, '%Y-%m-%d') if startDate else None  # 00:00:00
+        end = datetime.strptime(endDate, '%Y-%m-%d') + timedelta(days=1) - timedelta(seconds=1) if endDate else None  # 23:59:59
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be formatted as YYYY-MM-DD.")
+    return start, end
+
+
+def stream_rows(statement, format: str):
+    """
+    Yield `statement`'s rows as NDJSON lines or CSV text, one chunk per fetched batch.
+
+    The export uses its own session because the request's session is closed before a
+    streamed body is sent, and plain column rows with `yield_per` (a server-side cursor
+    on Postgres) so memory stays flat however many rows the range covers.
+    """
+    names = [column.name for column in statement.selected_columns]
+    db = SessionLocal()
+    try:
+        result = db.execute(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        if format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(names)
+            for batch in result.partitions():
+                writer.writerows(batch)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            yield buffer.getvalue()
+        else:
+            for batch in result.partitions():
+                yield "".join(json.dumps(dict(zip(names, row)), default=str) + "\n" for row in batch)
+    finally:
+        db.close()
+
+
+def _export_response(statement, format: str, filename: str):
+    return StreamingResponse(
+        stream_rows(statement, format),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{format}"'},
+    )
+
+
+@router.get("/stock-history", status_code=200)
+async def export_stock_history(
+    user: user_dependency,
+    format: Literal["ndjson", "csv"] = "ndjson",
+    startDate: Optional[str] = None,
+    endDate: Optional[str] = None,
+    product_id: Optional[int] = None,
+):
+    if isinstance(user, HTTPException):
+        raise user
+
+    """
+    Endpoint to stream StockHistory rows for accounting exports.
+    - **format**: `ndjson` (default) or `csv`.
+    - **startDate** / **endDate**: (optional) Inclusive YYYY-MM-DD range.
+    - **product_id**: (optional) Only export movements of this product.
+    """
+    start, end = _parse_range(startDate, endDate)
+    statement = select(*STOCK_HISTORY_COLUMNS).order_by(StockHistory.stock_id)
+    if start:
+        statement = statement.where(StockHistory.date >= start)
+    if end:
+        statement = statement.where(StockHistory.date <= end)
+    if product_id is not None:
+        statement = statement.where(StockHistory.product_id == product_id)
+    return _export_response(statement, format, "stock-history")
+
+
+@router.get("/transactions", status_code=200)
+async def export_transactions(
+    user: user_dependency,
+    format: Literal["ndjson", "csv"] = "ndjson",
+    startDate: Optional[str] = None,
+    endDate: Optional[str] = None,
+):
+    if isinstance(user, HTTPException):
+        raise user
+
+    """
+    Endpoint to stream transactions for accounting exports.
+    - **format**: `ndjson` (default) or `csv`.
+    - **startDate** / **endDate**: (optional) Inclusive YYYY-MM-DD range.
+    """
+    start, end = _parse_range(startDate, endDate)
+    statement = select(*TRANSACTION_COLUMNS).order_by(Transaction.id)
+    if start:
+        statement = statement.where(Transaction.date >= start.date())
+    if end:
+        statement = statement.where(Transaction.date <= end.date())
+    return _export_response(statement, format, "transactions")
@@ -0,0 +1,44 @@
+from typing import Annotated, Optional
+from fastapi import APIRouter, Header, HTTPException, WebSocket
+from fastapi.responses import StreamingResponse
+from db.VerifyToken import stream_user_dependency
+from web.broadcast import SSE_HEADERS, parse_event_id, sse_stream, websocket_feed
+from web.fastjson import FastJSONRoute
+from web.stockfeed import stock_events
+
+router = APIRouter(prefix="/stock/feed", tags=["Live Feed"], route_class=FastJSONRoute)
+
+FEED_EVENT = "stock"
+
+
+@router.get("")
+async def stream_stock_feed(user: stream_user_dependency, last_event_id: Annotated[Optional[str], Header()] = None):
+    if isinstance(user, HTTPException):
+        raise user
+
+    """
+    Server-sent events stream of stock movements, for dashboards that would otherwise poll the
+    stock in / stock out lists. Each `stock` event carries product_id, stocktype, quantity,
+    price_per_unit, total_price and date; a comment line is sent every 15 seconds.
+    - **token**: (optional) Access token, for EventSource clients that can't send the Authorization header.
+
+    Reconnecting clients send `Last-Event-ID` (EventSource does this by itself) and get the events
+    they missed first. A `reset` event means too many were missed: reload the lists.
+    """
+    return StreamingResponse(
+        sse_stream(stock_events, FEED_EVENT, parse_event_id(last_event_id)),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
+
+@router.websocket("/ws")
+async def stock_feed_websocket(websocket: WebSocket, user: stream_user_dependency, last_event_id: Optional[str] = None):
+    """
+    The stock movement feed over a WebSocket: one `{"id", "event", "data"}` JSON text frame per
+    event, `data` shaped like the `GET /stock/feed` events.
+    - **token**: Access token, unless the Authorization header is sent.
+    - **last_event_id**: (optional) `id` of the last event seen; the ones after it are sent first.
+    """
+    await websocket.accept()
+    await websocket_feed(websocket, stock_events, FEED_EVENT, parse_event_id(last_event_id))
@@ -0,0 +1,33 @@
+from fastapi import APIRouter, HTTPException
+from db.VerifyToken import user_dependency
+from db.catalog import product_catalog
+from db.database import engine, async_engine
+from db.metrics import pool_metrics
+from web.fastjson import FastJSONRoute
+from Endpoints.auth import token_cache
+from Endpoints.counts import totals_cache
+
+router = APIRouter(prefix="/internal", tags=["Internal Metrics"], route_class=FastJSONRoute)
+
+
+@router.get("/metrics", status_code=200)
+async def get_metrics(user: user_dependency):
+    if isinstance(user, HTTPException):
+        raise user
+
+    """
+    Endpoint to read in-process runtime metrics for this worker, used to size pools.
+    - **pool**: checkout wait histogram, overflow events, timeouts and in-use/idle counts per engine.
+    - **token_cache**: size and hit/miss counters of the verified-token cache.
+    - **totals_cache**: the same for the `/sum/` dashboard totals cache.
+    - **product_cache**: the same for the product catalog cache, by id and by name.
+    """
+    pools = {"sync": engine.pool}
+    if async_engine is not None:
+        pools["async"] = async_engine.pool
+    return {
+        "pool": pool_metrics.snapshot(pools),
+        "token_cache": token_cache.stats(),
+        "totals_cache": totals_cache.stats(),
+        "product_cache": product_catalog.stats(),
+    }
@@ -0,0 +1,83 @@
+from datetime import date, datetime
+from typing import Literal, Optional
+from fastapi import APIRouter, HTTPException
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from db.VerifyToken import user_dependency
+from db.connection import db_dependency, run_db
+from db.rollup import period_start
+from web.fastjson import FastJSONRoute
+from models.userModels import DailyProductSummary, Products
+
+router = APIRouter(prefix="/reports", tags=["Reports"], route_class=FastJSONRoute)
+
+Period = Literal["day", "week", "month"]
+GroupBy = Literal["product", "product_type"]
+
+
+def _parse_range(startDate: Optional[str], endDate: Optional[str]):
+    # Defaults to the current calendar year
+    today = datetime.today()
+    try:
+        start = datetime.strptime(startDate, '%Y-%m-%d').date() if startDate else date(today.year, 1, 1)
+        end = datetime.strptime(endDate, '%Y-%m-%d').date() if endDate else date(today.year, 12, 31)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be formatted as YYYY-MM-DD.")
+    return start, end
+
+
+@router.get("/sales", status_code=200)
+async def get_sales_report(
+    db: db_dependency,
+    user: user_dependency,
+    period: Period = "day",
+    group_by: Optional[GroupBy] = None,
+    startDate: Optional[str] = None,
+    endDate: Optional[str] = None,
+):
+    if isinstance(user, HTTPException):
+        raise user
+
+    """
+    Endpoint to report sales aggregated in the database.
+    - **period**: `day` (default), `week` or `month`.
+    - **group_by**: (optional) `product` or `product_type`; totals across all products if omitted.
+    - **startDate** / **endDate**: (optional) Inclusive YYYY-MM-DD range, defaulting to the current year.
+
+    Each row carries quantity sold, revenue, cost (quantity × purchase price at the time of sale) and profit.
+    Figures come from the daily_product_summary rollup.
+    """
+    start, end = _parse_range(startDate, endDate)
+    rows = await run_db(db, _sales_report, period, group_by, start, end)
+    return {"period": period, "group_by": group_by, "rows": rows}
+
+
+def _sales_report(db: Session, period: str, group_by: Optional[str], start: date, end: date):
+    # Reads the daily rollup, so the work grows with days x products rather than with movements
+    bucket = period_start(DailyProductSummary.day, period, db.get_bind().dialect.name).label("period_start")
+    keys = [bucket]
+    if group_by == "product":
+        keys += [DailyProductSummary.product_id, Products.product_name]
+    elif group_by == "product_type":
+        keys += [Products.product_type]
+
+    query = (
+        db.query(
+            *keys,
+            func.sum(DailyProductSummary.qty_out).label("quantity"),
+            func.sum(DailyProductSummary.revenue).label("revenue"),
+            func.sum(DailyProductSummary.cost).label("cost"),
+        )
+        .filter(DailyProductSummary.day.between(start, end), DailyProductSummary.qty_out > 0)
+        .group_by(*keys)
+        .order_by(*keys)
+    )
+    if group_by:
+        query = query.join(Products, Products.Pro_id == DailyProductSummary.product_id)
+
+    result = []
+    for row in query.all():
+        entry = dict(row._mapping)
+        entry["profit"] = entry["revenue"] - entry["cost"]
+        result.append(entry)
+    return result
@@ -1,12 +1,17 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, Response
 from dotenv import load_dotenv
 from db.VerifyToken import user_dependency
-from db.connection import db_dependency
-from models.userModels import Products 
+from db.catalog import product_catalog
+from db.connection import db_dependency, run_db
+from db.lowstock import forget, is_low, record_levels
+from db.pagination import page_dependency, paginate
+from db.versions import table_etag, etag_matches
+from web.fastjson import FastJSONRoute
+from models.userModels import Products, Stock
 
 from schemas.stockSchema import ProductCreateSchema, ProductUpdateSchema, ProductResponseSchema
 
-router = APIRouter(prefix="/products", tags=["Product Management"])
+router = APIRouter(prefix="/products", tags=["Product Management"], route_class=FastJSONRoute)
 
 # Create a new product
 @router.post("/", response_model=ProductResponseSchema, status_code=201)
@@ -18,16 +23,32 @@ async def create_product(product: ProductCreateSchema, db:db_dependency, user:us
     - **product_name**: Name of the product (required).
     - **product_price**: Price of the product (optional).
     - **date**: Date the product was added (optional).
+    - **reorder_threshold**: Quantity at or below which the product is listed by `GET /stock/low` (optional).
     """
+    return await run_db(db, _create_product, product)
+
+
+def _create_product(db, product: ProductCreateSchema):
     # Check for product name uniqueness
-    existing_product = db.query(Products).filter(Products.product_name == product.product_name).first()
+    existing_product = product_catalog.get_by_name(db, product.product_name)
     if existing_product:
         raise HTTPException(status_code=400, detail="Product with this name already exists.")
-    
+
     new_product = Products(**product.dict())
     db.add(new_product)
+    if product.reorder_threshold is not None:
+        db.flush()  # for the Pro_id
+        # Nothing is in stock yet
+        record_levels(db, [{
+            "product_id": new_product.Pro_id,
+            "product_name": new_product.product_name,
+            "threshold": new_product.reorder_threshold,
+            "quantity": 0,
+            "was_low": False,
+        }])
     db.commit()
     db.refresh(new_product)
+    product_catalog.invalidate(new_product.Pro_id, [new_product.product_name])
 
     return new_product
 
@@ -40,21 +61,26 @@ async def get_product(product_id: int, db:db_dependency, user:user_dependency):
     Endpoint to retrieve a single product by its ID.
     - **product_id**: ID of the product to retrieve.
     """
-    product = db.query(Products).filter(Products.Pro_id == product_id).first()
+    product = await run_db(db, product_catalog.get, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found.")
-    
+
     return product
 
 # Get all products
 @router.get("/", response_model=list[ProductResponseSchema], status_code=200)
-async def get_all_products(db:db_dependency, user:user_dependency):
+async def get_all_products(db:db_dependency, user:user_dependency, page: page_dependency, request: Request, response: Response):
     if isinstance(user, HTTPException):
         raise user
     """
-    Endpoint to retrieve all products.
+    Endpoint to retrieve all products, one page at a time (see `after` / `limit`).
+    Sends an ETag; a request whose `If-None-Match` still matches gets an empty 304.
     """
-    products = db.query(Products).all()
+    etag = await run_db(db, table_etag, ["products"], page.after, page.limit)
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    products = await run_db(db, lambda db: paginate(db.query(Products), Products.Pro_id, page, response))
     return products
 
 # Update an existing product by its ID
@@ -69,11 +95,17 @@ async def update_product(product_id: int, product_update: ProductUpdateSchema, d
     - **product_type**: (optional) Updated name of the product.
     - **product_price**: (optional) Updated price of the product.
     - **date**: (optional) Updated date the product was added.
+    - **reorder_threshold**: (optional) Updated reorder threshold; `null` turns low-stock alerts off.
     """
+    return await run_db(db, _update_product, product_id, product_update)
+
+
+def _update_product(db, product_id: int, product_update: ProductUpdateSchema):
     product = db.query(Products).filter(Products.Pro_id == product_id).first()
     if not product:
         raise HTTPException(status_code=404, detail="Product not found.")
-    
+    previous_name = product.product_name
+
     # Update fields
     if product_update.product_name:
         product.product_name = product_update.product_name
@@ -83,10 +115,21 @@ async def update_product(product_id: int, product_update: ProductUpdateSchema, d
         product.product_price = product_update.product_price
     if product_update.date:
         product.date = product_update.date
-    
+    if "reorder_threshold" in product_update.model_fields_set:
+        quantity = db.query(Stock.product_quantity).filter(Stock.product_id == product_id).scalar() or 0
+        record_levels(db, [{
+            "product_id": product_id,
+            "product_name": product.product_name,
+            "threshold": product_update.reorder_threshold,
+            "quantity": quantity,
+            "was_low": is_low(quantity, product.reorder_threshold),
+        }])
+        product.reorder_threshold = product_update.reorder_threshold
+
     db.commit()
     db.refresh(product)
-    
+    product_catalog.invalidate(product_id, [previous_name, product.product_name])
+
     return product
 
 # Delete a product by its ID
@@ -98,10 +141,16 @@ async def delete_product(product_id: int, db:db_dependency, user:user_dependency
     Endpoint to delete a product by its ID.
     - **product_id**: ID of the product to delete.
     """
+    await run_db(db, _delete_product, product_id)
+    return None
+
+
+def _delete_product(db, product_id: int):
     product = db.query(Products).filter(Products.Pro_id == product_id).first()
     if not product:
         raise HTTPException(status_code=404, detail="Product not found.")
-    
+
+    forget(db, product_id)
     db.delete(product)
     db.commit()
-    return None
+    product_catalog.invalidate(product_id, [product.product_name])
@@ -1,13 +1,27 @@
-from fastapi import APIRouter, HTTPException, Depends
+from datetime import datetime
+from types import SimpleNamespace
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
+from typing import List
 from db.VerifyToken import user_dependency
-from db.connection import db_dependency
+from db.catalog import product_catalog
+from db.connection import db_dependency, run_db
+from db.costing import record_receipts, set_on_hand
+from db.database import upsert_insert
+from db.idempotency import idempotency_dependency
+from db.lowstock import record_levels, stock_level
+from db.pagination import page_dependency, paginate
+from db.rollup import record_movements
+from db.versions import table_etag, etag_matches
+from web.fastjson import FastJSONRoute
+from web.stockfeed import record_feed
 from models.userModels import Stock, Products, StockHistory
 from schemas.stockInSchema import StockCreateSchema, StockUpdateSchema, StockResponseSchema
 
-router = APIRouter(prefix="/stock/in", tags=["Stock In Management"])
+router = APIRouter(prefix="/stock/in", tags=["Stock In Management"], route_class=FastJSONRoute)
 @router.post("/", status_code=201)
-async def create_or_update_stock(stock: StockCreateSchema, db: db_dependency, user: user_dependency):
+async def create_or_update_stock(stock: StockCreateSchema, db: db_dependency, user: user_dependency, idempotency: idempotency_dependency):
     if isinstance(user, HTTPException):
         raise user
 
@@ -18,78 +32,162 @@ async def create_or_update_stock(stock: StockCreateSchema, db: db_dependency, us
     - **price_per_unit**: Price per unit (required).
     - **total_price**: Total price (optional, calculated from product_quantity * price_per_unit).
     - **date**: Date when the stock was added (optional).
+
+    Send an `Idempotency-Key` header to make retries safe: a repeated key returns the first response.
     """
+    return await run_db(db, idempotency.run, _create_or_update_stock, stock, stock)
+
 
+def _create_or_update_stock(db: Session, stock: StockCreateSchema):
     # Check if the product exists
-    product = db.query(Products).filter(Products.Pro_id == stock.product_id).first()
+    product = product_catalog.get(db, stock.product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product with this ID does not exist.")
 
     # Check if stock for this product already exists
-    existing_stock = db.query(Stock).filter(Stock.product_id == stock.product_id).first()
-
-    if existing_stock:
-        # If stock exists, update its quantity, prices, and date
-        existing_stock.product_quantity += stock.product_quantity
-        existing_stock.price_per_unit = stock.price_per_unit
-        existing_stock.total_price = str(float(existing_stock.product_quantity) * float(stock.price_per_unit))
-        existing_stock.date = stock.date
-        db.commit()
-        db.refresh(existing_stock)
-
-        # Add to stock history as an update
-        history = StockHistory(
-            product_id=stock.product_id,
-            product_quantity=stock.product_quantity,
-            price_per_unit=stock.price_per_unit,
-            total_price=existing_stock.total_price,
-            stocktype="stock update",
-        )
-        db.add(history)
-        db.commit()
-
-        return {
-            "message": "Stock updated successfully",
-            "product_id": existing_stock.product_id,
-            "product_name": product.product_name,
-            "product_type": product.product_type,
-            "product_quantity": existing_stock.product_quantity,
-            "price_per_unit": existing_stock.price_per_unit,
-            "total_price": existing_stock.total_price,
-            "date": existing_stock.date
-        }
+    existed = db.query(Stock.stock_id).filter(Stock.product_id == stock.product_id).first() is not None
+
+    stock_row = _add_stock(db, [stock])[stock.product_id]
+    history, message = _stock_in_history(stock, stock_row, existed)
+    db.add(StockHistory(**history))
+    record_levels(db, [stock_level(product, stock_row.product_quantity - stock.product_quantity, stock_row.product_quantity)])
+    record_receipts(db, [history])
+    record_movements(db, [history])
+    record_feed(db, [history])
+    db.flush()  # committed by Idempotency.run
+
+    return _stock_in_result(message, stock_row, product)
+
+
+def _add_stock(db: Session, items: List[StockCreateSchema]) -> dict:
+    """
+    Add delivery lines to their products' Stock rows, creating the rows that don't exist, with
+    one upsert. Quantities are added in SQL rather than written back from a value read earlier,
+    so a sale of the same product running at the same time keeps its decrement (see
+    `_take_stock` in stockOut.py). Returns each product's Stock row values after the delivery.
+    """
+    lines = {}
+    for item in items:
+        lines.setdefault(item.product_id, []).append(item)
+    rows = []
+    for product_id, product_lines in lines.items():
+        last = product_lines[-1]
+        quantity = sum(line.product_quantity for line in product_lines)
+        # Like a single new row, a lone line keeps the total price it was sent with
+        total_price = last.total_price if len(product_lines) == 1 and last.total_price else quantity * last.price_per_unit
+        rows.append({"product_id": product_id, "product_quantity": quantity, "price_per_unit": last.price_per_unit,
+                     "total_price": total_price, "date": last.date})
+
+    statement = upsert_insert(db, Stock)
+    added = statement.excluded
+    new_quantity = Stock.product_quantity + added.product_quantity
+    statement = statement.on_conflict_do_update(
+        index_elements=[Stock.product_id],
+        set_={
+            "product_quantity": new_quantity,
+            "price_per_unit": added.price_per_unit,
+            "total_price": new_quantity * added.price_per_unit,
+            "date": added.date,
+        },
+    ).returning(Stock.product_id, Stock.product_quantity, Stock.price_per_unit, Stock.total_price, Stock.date)
+    return {row.product_id: row for row in db.execute(statement, rows)}
+
+
+def _stock_in_history(stock: StockCreateSchema, stock_row, existed: bool):
+    """
+    The column values of the StockHistory entry for one delivery line and the response message.
+    `stock_row` holds the Stock row's values after the line.
+    """
+    if existed:
+        stocktype, message = "stock update", "Stock updated successfully"
     else:
-        # Create new stock since it doesn't exist
-        new_stock = Stock(**stock.dict())
-        # Automatically calculate total price if not provided
-        if not stock.total_price:
-            new_stock.total_price = str(float(stock.product_quantity) * float(stock.price_per_unit))
-
-        # Add to stock history as a new stock entry
-        history = StockHistory(
-            product_id=stock.product_id,
-            product_quantity=stock.product_quantity,
-            price_per_unit=stock.price_per_unit,
-            total_price=new_stock.total_price,
-            stocktype="stock in",
-        )
-
-        # Add new stock and its history to the database
-        db.add(new_stock)
-        db.add(history)
-        db.commit()
-        db.refresh(new_stock)
-
-        return {
-            "message": "Stock created successfully",
-            "product_id": new_stock.product_id,
-            "product_name": product.product_name,
-            "product_type": product.product_type,
-            "product_quantity": new_stock.product_quantity,
-            "price_per_unit": new_stock.price_per_unit,
-            "total_price": new_stock.total_price,
-            "date": new_stock.date
-        }
+        stocktype, message = "stock in", "Stock created successfully"
+    history = {
+        "product_id": stock.product_id,
+        "product_quantity": stock.product_quantity,
+        "price_per_unit": stock.price_per_unit,
+        "total_price": stock_row.total_price,
+        "stocktype": stocktype,
+        "date": datetime.utcnow(),
+    }
+    return history, message
+
+
+def _stock_in_result(message: str, stock_row: Stock, product: Products):
+    return {
+        "message": message,
+        "product_id": stock_row.product_id,
+        "product_name": product.product_name,
+        "product_type": product.product_type,
+        "product_quantity": stock_row.product_quantity,
+        "price_per_unit": stock_row.price_per_unit,
+        "total_price": stock_row.total_price,
+        "date": stock_row.date
+    }
+
+
+@router.post("/bulk", status_code=201)
+async def create_or_update_stock_bulk(items: List[StockCreateSchema], db: db_dependency, user: user_dependency):
+    if isinstance(user, HTTPException):
+        raise user
+
+    """
+    Endpoint to receive a whole delivery in one request.
+    - **items**: List of stock lines, each shaped like the `POST /stock/in/` body.
+
+    All lines are applied in a single transaction: if any product ID is unknown nothing is saved.
+    Returns one result per line, in request order.
+    """
+    if not items:
+        raise HTTPException(status_code=400, detail="No stock items provided.")
+    return await run_db(db, _create_or_update_stock_bulk, items)
+
+
+def _create_or_update_stock_bulk(db: Session, items: List[StockCreateSchema]):
+    product_ids = {item.product_id for item in items}
+
+    # Validate every product and find the ones with a Stock row already, with one query each
+    products = product_catalog.get_many(db, product_ids)
+    missing = sorted(product_ids - products.keys())
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Products with these IDs do not exist: {missing}")
+
+    existing = {
+        product_id for (product_id,) in db.query(Stock.product_id).filter(Stock.product_id.in_(product_ids))
+    }
+    stocks = _add_stock(db, items)
+
+    # Each line's result shows the product's stock as of that line
+    running = {product_id: stock_row.product_quantity for product_id, stock_row in stocks.items()}
+    for item in reversed(items):
+        running[item.product_id] -= item.product_quantity
+    before = dict(running)
+
+    results = []
+    histories = []
+    for item in items:
+        running[item.product_id] += item.product_quantity
+        total_price = running[item.product_id] * item.price_per_unit
+        if item.product_id not in existing and item.total_price:
+            total_price = item.total_price  # a new row keeps the total it was sent with
+        stock_row = SimpleNamespace(product_id=item.product_id, product_quantity=running[item.product_id],
+                                    price_per_unit=item.price_per_unit, total_price=total_price, date=item.date)
+        history, message = _stock_in_history(item, stock_row, item.product_id in existing)
+        existing.add(item.product_id)
+        histories.append(history)
+        results.append(_stock_in_result(message, stock_row, products[item.product_id]))
+
+    db.execute(insert(StockHistory), histories)
+    record_receipts(db, histories)
+    record_movements(db, histories)
+    record_feed(db, histories)
+    record_levels(db, [
+        stock_level(products[product_id], before[product_id], stock_row.product_quantity)
+        for product_id, stock_row in stocks.items()
+    ])
+    db.commit()
+
+    return results
 
 
 # Get a single stock entry by its ID (including product name and product type)
@@ -103,7 +201,7 @@ async def get_stock(stock_id: int, db: db_dependency, user: user_dependency):
     - **stock_id**: ID of the stock entry to retrieve.
     """
     # Perform a join to get product details (name and type)
-    stock = db.query(Stock, Products.product_name, Products.product_type).join(Products, Stock.product_id == Products.Pro_id).filter(Stock.stock_id == stock_id).first()
+    stock = await run_db(db, lambda db: db.query(Stock, Products.product_name, Products.product_type).join(Products, Stock.product_id == Products.Pro_id).filter(Stock.stock_id == stock_id).first())
     
     if not stock:
         raise HTTPException(status_code=404, detail="Stock entry not found.")
@@ -124,14 +222,23 @@ async def get_stock(stock_id: int, db: db_dependency, user: user_dependency):
 
 # Get all stock entries
 @router.get("/", response_model=list[StockResponseSchema], status_code=200)
-async def get_all_stocks(db: db_dependency, user: user_dependency):
+async def get_all_stocks(db: db_dependency, user: user_dependency, page: page_dependency, request: Request, response: Response):
     if isinstance(user, HTTPException):
         raise user
 
     """
     Endpoint to retrieve all stock entries, including product name and product type for each.
+    Results are paginated with `after` / `limit`.
+    Sends an ETag; a request whose `If-None-Match` still matches gets an empty 304.
     """
-    stocks = db.query(Stock, Products.product_name, Products.product_type).join(Products, Stock.product_id == Products.Pro_id).all()
+    etag = await run_db(db, table_etag, ["stock", "products"], page.after, page.limit)
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    stocks = await run_db(db, lambda db: paginate(
+        db.query(Stock, Products.product_name, Products.product_type).join(Products, Stock.product_id == Products.Pro_id),
+        Stock.stock_id, page, response
+    ))
 
     # Unpack and format the response
     return [
@@ -162,14 +269,26 @@ async def update_stock(stock_id: int, stock_update: StockUpdateSchema, db: db_de
     - **total_price**: (optional) Updated total price.
     - **date**: (optional) Updated date of stock entry.
     """
+    return await run_db(db, _update_stock, stock_id, stock_update)
+
+
+def _update_stock(db: Session, stock_id: int, stock_update: StockUpdateSchema):
     stock = db.query(Stock).filter(Stock.stock_id == stock_id).first()
     if not stock:
         raise HTTPException(status_code=404, detail="Stock entry not found.")
     
+    quantity_changed = stock_update.product_quantity is not None and stock_update.product_quantity != stock.product_quantity
+    price_changed = stock_update.price_per_unit is not None and stock_update.price_per_unit != stock.price_per_unit
     if stock_update.product_quantity is not None:
+        product = product_catalog.get(db, stock.product_id)
+        if product:
+            record_levels(db, [stock_level(product, stock.product_quantity, stock_update.product_quantity)])
         stock.product_quantity = stock_update.product_quantity
     if stock_update.price_per_unit is not None:
         stock.price_per_unit = stock_update.price_per_unit
+    if quantity_changed or price_changed:
+        # Keep the cost layers in step with the edited row, or sales are costed from units that aren't there
+        set_on_hand(db, stock.product_id, stock.product_quantity, stock.price_per_unit, reprice=price_changed)
     if stock_update.total_price is not None:
         stock.total_price = stock_update.total_price
     if stock_update.date:
@@ -190,10 +309,18 @@ async def delete_stock(stock_id: int, db: db_dependency, user: user_dependency):
     Endpoint to delete a stock entry by its ID.
     - **stock_id**: ID of the stock entry to delete.
     """
+    await run_db(db, _delete_stock, stock_id)
+    return None
+
+
+def _delete_stock(db: Session, stock_id: int):
     stock = db.query(Stock).filter(Stock.stock_id == stock_id).first()
     if not stock:
         raise HTTPException(status_code=404, detail="Stock entry not found.")
-    
+
+    product = product_catalog.get(db, stock.product_id)
+    if product:
+        record_levels(db, [stock_level(product, stock.product_quantity, 0)])
+    set_on_hand(db, stock.product_id, 0, stock.price_per_unit)  # its cost layers go with it
     db.delete(stock)
     db.commit()
-    return None
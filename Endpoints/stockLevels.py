@@ -0,0 +1,112 @@
+from datetime import datetime, time, timedelta
+from typing import Annotated, Optional
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from db.VerifyToken import stream_user_dependency, user_dependency
+from db.catalog import product_catalog
+from db.connection import db_dependency, run_db
+from db.lowstock import low_stock_events
+from db.snapshots import on_hand
+from web.broadcast import SSE_HEADERS, parse_event_id, sse_stream
+from web.fastjson import FastJSONRoute
+from models.userModels import LowStockQueue, Products
+
+router = APIRouter(prefix="/stock", tags=["Stock Levels"], route_class=FastJSONRoute)
+
+
+def _parse_at(value: str) -> datetime:
+    """A YYYY-MM-DD date means the close of that day; a full ISO timestamp is used as is (UTC)."""
+    try:
+        if len(value) == 10:
+            return datetime.combine(datetime.strptime(value, '%Y-%m-%d').date() + timedelta(days=1), time())
+        at = datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="date must be YYYY-MM-DD or an ISO 8601 timestamp.")
+    if at.tzinfo is not None:
+        at = (at - at.utcoffset()).replace(tzinfo=None)  # StockHistory dates are naive UTC
+    return at
+
+
+@router.get("/at", status_code=200)
+async def get_stock_at(db: db_dependency, user: user_dependency, date: str, product_id: Optional[int] = None):
+    if isinstance(user, HTTPException):
+        raise user
+
+    """
+    Endpoint to get the quantity of each product on hand at a point in time.
+    - **date**: YYYY-MM-DD for the close of that day (UTC), or an ISO 8601 timestamp.
+    - **product_id**: (optional) Only this product.
+
+    Products with nothing on hand are left out.
+    """
+    at = _parse_at(date)
+    return await run_db(db, _stock_at, at, product_id)
+
+
+def _stock_at(db: Session, at: datetime, product_id: Optional[int]):
+    quantities = on_hand(db, at, product_id)
+    products = product_catalog.get_many(db, quantities)
+    return {
+        "at": at,
+        "products": [
+            {
+                "product_id": product,
+                "product_name": products[product].product_name if product in products else None,
+                "product_type": products[product].product_type if product in products else None,
+                "quantity": quantity,
+            }
+            for product, quantity in quantities.items()
+        ],
+    }
+
+
+@router.get("/low", status_code=200)
+async def get_low_stock(db: db_dependency, user: user_dependency):
+    if isinstance(user, HTTPException):
+        raise user
+
+    """
+    Endpoint to list the products at or below their reorder threshold, most urgent first.
+    Read from the low-stock queue, so it only touches the low products.
+    """
+    return await run_db(db, _low_stock)
+
+
+def _low_stock(db: Session):
+    rows = (
+        db.query(LowStockQueue, Products.product_name, Products.product_type)
+        .join(Products, LowStockQueue.product_id == Products.Pro_id)
+        .order_by(LowStockQueue.quantity - LowStockQueue.threshold, LowStockQueue.product_id)
+    )
+    return [
+        {
+            "product_id": queued.product_id,
+            "product_name": product_name,
+            "product_type": product_type,
+            "quantity": queued.quantity,
+            "reorder_threshold": queued.threshold,
+            "since": queued.since,
+        }
+        for queued, product_name, product_type in rows
+    ]
+
+
+@router.get("/low/stream")
+async def stream_low_stock(user: stream_user_dependency, last_event_id: Annotated[Optional[str], Header()] = None):
+    if isinstance(user, HTTPException):
+        raise user
+
+    """
+    Server-sent events stream of threshold crossings, for dashboards that would otherwise poll
+    `GET /stock/low`. Each `low-stock` event carries product_id, product_name, quantity,
+    threshold and status (`low` or `recovered`); a comment line is sent every 15 seconds.
+    - **token**: (optional) Access token, for EventSource clients that can't send the Authorization header.
+
+    Reconnecting clients get the crossings they missed since `Last-Event-ID`, or a `reset` event.
+    """
+    return StreamingResponse(
+        sse_stream(low_stock_events, "low-stock", parse_event_id(last_event_id)),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
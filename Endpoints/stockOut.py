@@ -1,15 +1,55 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Response
+from sqlalchemy import select, func, insert, update, delete, case
 from sqlalchemy.orm import Session
 from db.VerifyToken import user_dependency
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime,timedelta
-from db.connection import db_dependency
+from db.catalog import product_catalog
+from db.connection import db_dependency, run_db
+from db.costing import consume
+from db.idempotency import idempotency_dependency
+from db.lowstock import record_levels, stock_level
+from db.pagination import page_dependency, paginate
+from db.rollup import STOCK_OUT, record_movements
+from web.fastjson import FastJSONRoute
+from web.stockfeed import record_feed
 from models.userModels import StockOut, Products,Stock,StockHistory
 from schemas.stockInSchema import StockCreateSchema, StockUpdateSchema, StockResponseSchema
 
-router = APIRouter(prefix="/stock/out", tags=["Stock Out Management"])
+router = APIRouter(prefix="/stock/out", tags=["Stock Out Management"], route_class=FastJSONRoute)
+
+
+def _remaining_quantity_subquery():
+    """Quantity left on the product's (first) Stock row, keyed by product_id."""
+    first_stock = (
+        select(Stock.product_id, func.min(Stock.stock_id).label("first_id"))
+        .group_by(Stock.product_id)
+        .subquery()
+    )
+    return (
+        select(Stock.product_id, Stock.product_quantity)
+        .join(first_stock, Stock.stock_id == first_stock.c.first_id)
+        .subquery()
+    )
+
+
+def _profit_status(revenue, cost):
+    # Profit calculation: (Sales price × quantity) - cost of the goods sold
+    profit = revenue - cost
+    if profit > 0:
+        return "profit"
+    elif profit < 0:
+        return "loss"
+    return "break-even"
+
+
+def _profit_status_column(revenue, cost):
+    """`_profit_status` as a SQL expression, so list endpoints get it straight from the query."""
+    profit = revenue - cost
+    return case((profit > 0, "profit"), (profit < 0, "loss"), else_="break-even").label("profit_status")
+
 @router.post("/add", status_code=201)
-async def create_stock_out(stock: StockCreateSchema, db: db_dependency, user: user_dependency):
+async def create_stock_out(stock: StockCreateSchema, db: db_dependency, user: user_dependency, idempotency: idempotency_dependency):
     if isinstance(user, HTTPException):
         raise user
 
@@ -20,87 +60,212 @@ async def create_stock_out(stock: StockCreateSchema, db: db_dependency, user: us
     - **price_per_unit**: Price per unit (required).
     - **total_price**: Total price (optional, calculated from product_quantity * price_per_unit).
     - **date**: Date when the stock was removed (optional).
+
+    Send an `Idempotency-Key` header to make retries safe: a repeated key returns the first response.
     """
+    return await run_db(db, idempotency.run, _create_stock_out, stock, stock)
 
+
+def _create_stock_out(db: Session, stock: StockCreateSchema):
     # Check if the product exists in the Products table
-    product = db.query(Products).filter(Products.Pro_id == stock.product_id).first()
-    if not product:
-        raise HTTPException(status_code=404, detail="Product with this ID does not exist.")
+    product = product_catalog.get(db, stock.product_id)
 
     # Check if sufficient stock exists in Stock (StockIn)
     stockInCurrent = db.query(Stock).filter(Stock.product_id == stock.product_id).first()
+
+    stock_out, history = _check_stock_out(
+        stock, product, stockInCurrent, stockInCurrent.product_quantity if stockInCurrent else 0
+    )
+    remaining = _take_stock(db, stockInCurrent, stock.product_quantity)
+    record_levels(db, [stock_level(product, remaining + stock.product_quantity, remaining)])
+    (cost,) = consume(db, [(stock.product_id, stock.product_quantity)], {stock.product_id: stockInCurrent.price_per_unit})
+    profit_status = _apply_cost(stock_out, history, cost)
+
+    # Update stock and commit changes
+    new_stock_out = StockOut(**stock_out)
+    db.add(new_stock_out)
+    db.add(StockHistory(**history))
+    record_movements(db, [history])
+    record_feed(db, [history])
+    db.flush()  # committed by Idempotency.run
+
+    # Return the response with required product details and profit status
+    return _stock_out_result(stock_out, product, profit_status)
+
+
+def _check_stock_out(stock: StockCreateSchema, product: Products, stockInCurrent: Stock, available: int):
+    """
+    Check one sale line against its product, Stock row and the `available` quantity.
+    Raises HTTPException when the line can't be sold. Stock itself is only changed by `_take_stock`.
+    Returns the column values of the StockOut and StockHistory rows to record; `_apply_cost` adds their cost.
+    """
+    if not product:
+        raise HTTPException(status_code=404, detail="Product with this ID does not exist.")
     if not stockInCurrent:
         raise HTTPException(status_code=404, detail="No stock entry found for this product in StockIn.")
 
-    purchase_price = float(stockInCurrent.price_per_unit)  # Price per unit at which the stock was purchased
     # Check if the quantity being stocked out exceeds the available stock
-    if stock.product_quantity > stockInCurrent.product_quantity:
+    if stock.product_quantity > available:
         raise HTTPException(
             status_code=403,
             detail="Insufficient quantity in stock. Cannot stock out more than what's available."
         )
 
-    # Subtract the stocked-out quantity from the current stock or delete if stock is exhausted
-    if stockInCurrent.product_quantity - stock.product_quantity == 0:
-        db.delete(stockInCurrent)
-    else:
-        stockInCurrent.product_quantity -= stock.product_quantity
-        stockInCurrent.total_price = str(float(stockInCurrent.product_quantity) * float(stockInCurrent.price_per_unit))
-
-    # Calculate profit or loss
-    quantity_sold = stock.product_quantity
+    # The stock out entry, and its StockHistory record with type "stock out"
+    stock_out = {
+        "product_id": stock.product_id,
+        "product_quantity": stock.product_quantity,
+        "price_per_unit": stock.price_per_unit,
+        "total_price": stock.product_quantity * stock.price_per_unit if not stock.total_price else stock.total_price,
+        "date": stock.date,
+    }
+    history = {
+        "product_id": stock.product_id,
+        "product_quantity": stock.product_quantity,
+        "price_per_unit": stock.price_per_unit,
+        "total_price": stock_out["total_price"],
+        "stocktype": "stock out",
+        "date": datetime.utcnow(),
+    }
+    return stock_out, history
 
-    # Profit calculation: (Sales price × quantity) - (Purchase price × quantity)
-    # profit = (sales_price * quantity_sold) < (purchase_price * quantity_sold)
 
-    # Determine the profit status
-    if (float(stock.product_quantity) * float(stock.price_per_unit)) > (purchase_price * quantity_sold):
-        profit_status = "profit"
-    elif (float(stock.product_quantity) * float(stock.price_per_unit)) < (purchase_price * quantity_sold):
-        profit_status = "loss"
+def _apply_cost(stock_out: dict, history: dict, cost):
+    """
+    Record a sale line's cost of goods, from `consume`, on its StockOut and StockHistory rows and
+    return its profit status. Selling below cost is not allowed.
+    """
+    stock_out["cost_of_goods"] = history["cost_of_goods"] = cost
+    profit_status = _profit_status(stock_out["price_per_unit"] * stock_out["product_quantity"], cost)
+    if profit_status == "loss":
         raise HTTPException(
             status_code=403,
             detail="You Cant Make Loss On Our Watch"
         )
-    else:
-        profit_status = "break-even"
-
-    # Create a new stock out entry in StockOut
-    new_stock_out = StockOut(
-        product_id=stock.product_id,
-        product_quantity=stock.product_quantity,
-        price_per_unit=stock.price_per_unit,
-        total_price=str(float(stock.product_quantity) * float(stock.price_per_unit)) if not stock.total_price else stock.total_price,
-        date=stock.date
-    )
+    return profit_status
 
-    # Add the stock out entry to StockHistory with type "stock out"
-    history = StockHistory(
-        product_id=stock.product_id,
-        product_quantity=stock.product_quantity,
-        price_per_unit=stock.price_per_unit,
-        total_price=new_stock_out.total_price,
-        stocktype="stock out",
-    )
 
-    # Update stock and commit changes
-    db.add(new_stock_out)
-    db.add(history)
-    db.commit()
-    db.refresh(new_stock_out)
+def _take_stock(db: Session, stockInCurrent: Stock, quantity: int):
+    """
+    Subtract the stocked-out quantity from the current stock, or delete the row if stock is exhausted.
 
-    # Return the response with required product details and profit status
+    The UPDATE only matches while enough is left and returns the new quantity, so two cashiers
+    selling the same product concurrently can't both pass the check; the row lock it takes is
+    held for the rest of this short transaction only.
+    """
+    remaining = db.execute(
+        update(Stock)
+        .where(Stock.stock_id == stockInCurrent.stock_id, Stock.product_quantity >= quantity)
+        .values(
+            product_quantity=Stock.product_quantity - quantity,
+            total_price=(Stock.product_quantity - quantity) * Stock.price_per_unit,
+        )
+        .returning(Stock.product_quantity)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+    if remaining is None:
+        raise HTTPException(
+            status_code=403,
+            detail="Insufficient quantity in stock. Cannot stock out more than what's available."
+        )
+    if remaining == 0:
+        db.execute(
+            delete(Stock)
+            .where(Stock.stock_id == stockInCurrent.stock_id, Stock.product_quantity == 0)
+            .execution_options(synchronize_session=False)
+        )
+    return remaining
+
+
+def _stock_out_result(stock_out: dict, product: Products, profit_status: str):
     return {
-        "product_id": new_stock_out.product_id,
+        "product_id": stock_out["product_id"],
         "product_name": product.product_name,
         "product_type": product.product_type,
-        "product_quantity": new_stock_out.product_quantity,
-        "price_per_unit": new_stock_out.price_per_unit,
-        "total_price": new_stock_out.total_price,
-        "date": new_stock_out.date,
+        "product_quantity": stock_out["product_quantity"],
+        "price_per_unit": stock_out["price_per_unit"],
+        "total_price": stock_out["total_price"],
+        "date": stock_out["date"],
         "profit_status": profit_status
     }
 
+
+@router.post("/bulk", status_code=201)
+async def create_stock_out_bulk(items: List[StockCreateSchema], db: db_dependency, user: user_dependency):
+    if isinstance(user, HTTPException):
+        raise user
+
+    """
+    Endpoint to record a multi-line sale (a customer's basket) in one request.
+    - **items**: List of sale lines, each shaped like the `POST /stock/out/add` body.
+
+    Every line is checked for stock and the no-loss rule before anything is saved; if one line fails
+    the whole sale is rejected with the line number in the error. Returns one result per line.
+    """
+    if not items:
+        raise HTTPException(status_code=400, detail="No sale lines provided.")
+    return await run_db(db, _create_stock_out_bulk, items)
+
+
+def _create_stock_out_bulk(db: Session, items: List[StockCreateSchema]):
+    product_ids = {item.product_id for item in items}
+
+    # One query each for the products and their Stock rows
+    products = product_catalog.get_many(db, product_ids)
+    stocks = {}
+    for stock_row in db.query(Stock).filter(Stock.product_id.in_(product_ids)).order_by(Stock.stock_id):
+        stocks.setdefault(stock_row.product_id, stock_row)
+
+    stock_outs = []
+    histories = []
+    available = {product_id: stock_row.product_quantity for product_id, stock_row in stocks.items()}
+    for line, item in enumerate(items, start=1):
+        try:
+            stock_out, history = _check_stock_out(
+                item, products.get(item.product_id), stocks.get(item.product_id), available.get(item.product_id, 0)
+            )
+        except HTTPException as error:
+            raise HTTPException(status_code=error.status_code, detail=f"Line {line}: {error.detail}")
+        available[item.product_id] -= item.product_quantity
+        stock_outs.append(stock_out)
+        histories.append(history)
+
+    # One atomic decrement per product for the basket's total quantity of it
+    levels = []
+    for product_id, stock_row in stocks.items():
+        sold = stock_row.product_quantity - available[product_id]
+        if sold:
+            try:
+                remaining = _take_stock(db, stock_row, sold)
+            except HTTPException as error:
+                raise HTTPException(status_code=error.status_code, detail=f"Product {product_id}: {error.detail}")
+            # From the UPDATE's RETURNING, not the row read above: a concurrent sale may have taken more
+            levels.append(stock_level(products[product_id], remaining + sold, remaining))
+    record_levels(db, levels)
+
+    # Cost the lines from the cost layers in basket order, then check each for a loss
+    costs = consume(
+        db,
+        [(item.product_id, item.product_quantity) for item in items],
+        {product_id: stock_row.price_per_unit for product_id, stock_row in stocks.items()},
+    )
+    results = []
+    for line, (item, stock_out, history, cost) in enumerate(zip(items, stock_outs, histories, costs), start=1):
+        try:
+            profit_status = _apply_cost(stock_out, history, cost)
+        except HTTPException as error:
+            raise HTTPException(status_code=error.status_code, detail=f"Line {line}: {error.detail}")
+        results.append(_stock_out_result(stock_out, products[item.product_id], profit_status))
+
+    # All rows go out in executemany statements under one commit
+    db.execute(insert(StockOut), stock_outs)
+    db.execute(insert(StockHistory), histories)
+    record_movements(db, histories)
+    record_feed(db, histories)
+    db.commit()
+
+    return results
+
 # Get a single stock entry by its ID (including product name and product type)
 @router.get("/{stock_id}", response_model=StockResponseSchema, status_code=200)
 async def get_stock_out(stock_id: int, db: db_dependency, user: user_dependency):
@@ -112,7 +277,7 @@ async def get_stock_out(stock_id: int, db: db_dependency, user: user_dependency)
     - **stock_id**: ID of the stock entry to retrieve.
     """
     # Perform a join to get product details (name and type)
-    stock = db.query(StockOut, Products.product_name, Products.product_type).join(Products, StockOut.product_id == Products.Pro_id).filter(StockOut.stock_id == stock_id).first()
+    stock = await run_db(db, lambda db: db.query(StockOut, Products.product_name, Products.product_type).join(Products, StockOut.product_id == Products.Pro_id).filter(StockOut.stock_id == stock_id).first())
     
     if not stock:
         raise HTTPException(status_code=404, detail="Stock entry not found.")
@@ -132,47 +297,39 @@ async def get_stock_out(stock_id: int, db: db_dependency, user: user_dependency)
     }
 
 @router.get("/",  status_code=200)
-async def get_all_stocks_out(db: db_dependency, user: user_dependency):
+async def get_all_stocks_out(db: db_dependency, user: user_dependency, page: page_dependency, response: Response):
     if isinstance(user, HTTPException):
         raise user
 
     """
     Endpoint to retrieve all stock out entries, including product name, product type, and profit status for each.
+    Results are paginated with `after` / `limit`.
     """
 
-    # Get all stock out entries
-    stock_outs = db.query(StockOut).all()
+    # Join products so the whole list is one statement; every sale carries its own cost of
+    # goods (see migrations/cost_of_goods_backfill.py), so a page only reads its own rows
+    cost = StockOut.cost_of_goods
+    stock_outs = await run_db(db, lambda db: paginate(
+        db.query(
+            StockOut,
+            Products.Pro_id,
+            Products.product_name,
+            Products.product_type,
+            cost,
+            _profit_status_column(StockOut.price_per_unit * StockOut.product_quantity, cost),
+        )
+        .outerjoin(Products, StockOut.product_id == Products.Pro_id),
+        StockOut.stock_id, page, response
+    ))
 
     result = []
 
-    # Iterate over each stock out entry and retrieve the related product and stock in details
-    for stock_out in stock_outs:
-        # Fetch the product details using the product_id from Products table
-        product = db.query(Products).filter(Products.Pro_id == stock_out.product_id).first()
-        if not product:
+    for stock_out, pro_id, product_name, product_type, cost_of_goods, profit_status in stock_outs:
+        if pro_id is None:
             raise HTTPException(status_code=404, detail=f"Product with ID {stock_out.product_id} does not exist.")
-
-        # Fetch the stock in details for the product to calculate the profit
-        stock_in = db.query(StockHistory).filter(StockHistory.product_id == stock_out.product_id).first()
-        if not stock_in:
+        if cost_of_goods is None:
             raise HTTPException(status_code=404, detail=f"No stock entry found for product ID {stock_out.product_id}.")
 
-        # Calculate profit or loss
-        purchase_price = float(stock_in.price_per_unit)  # Purchase price per unit from StockIn
-        sales_price = float(stock_out.price_per_unit)  # Sales price per unit from StockOut
-        quantity_sold = stock_out.product_quantity
-
-        # Profit calculation: (Sales price × quantity) - (Purchase price × quantity)
-        profit = (sales_price * quantity_sold) - (purchase_price * quantity_sold)
-
-        # Determine profit status
-        if profit > 0:
-            profit_status = "profit"
-        elif profit < 0:
-            profit_status = "loss"
-        else:
-            profit_status = "break-even"
-
         # Append the formatted response with profit status
         result.append({
             "stock_id": stock_out.stock_id,
@@ -181,8 +338,8 @@ async def get_all_stocks_out(db: db_dependency, user: user_dependency):
             "price_per_unit": stock_out.price_per_unit,
             "total_price": stock_out.total_price,
             "date": stock_out.date,
-            "product_name": product.product_name,
-            "product_type": product.product_type,
+            "product_name": product_name,
+            "product_type": product_type,
             "profit_status": profit_status
         })
 
@@ -202,6 +359,10 @@ async def update_stockOut(stock_id: int, stock_update: StockUpdateSchema, db: db
     - **total_price**: (optional) Updated total price.
     - **date**: (optional) Updated date of stock entry.
     """
+    return await run_db(db, _update_stock_out, stock_id, stock_update)
+
+
+def _update_stock_out(db: Session, stock_id: int, stock_update: StockUpdateSchema):
     stock = db.query(StockOut).filter(StockOut.stock_id == stock_id).first()
     if not stock:
         raise HTTPException(status_code=404, detail="Stock entry not found.")
@@ -216,7 +377,7 @@ async def update_stockOut(stock_id: int, stock_update: StockUpdateSchema, db: db
         stock.date = stock_update.date
     
     db.commit()
-    db.refresh(StockOut)
+    db.refresh(stock)
     
     return stock
 
@@ -230,13 +391,17 @@ async def delete_stock_out(stock_id: int, db: db_dependency, user: user_dependen
     Endpoint to delete a stock entry by its ID.
     - **stock_id**: ID of the stock entry to delete. 
     """
+    await run_db(db, _delete_stock_out, stock_id)
+    return None
+
+
+def _delete_stock_out(db: Session, stock_id: int):
     stock = db.query(StockOut).filter(StockOut.stock_id == stock_id).first()
     if not stock:
         raise HTTPException(status_code=404, detail="Stock entry not found.")
-    
+
     db.delete(stock)
     db.commit()
-    return None
 
 @router.post("/byDate", status_code=200)
 async def get_all_stocks_out_by_date(
@@ -264,62 +429,58 @@ async def get_all_stocks_out_by_date(
     start_datetime = datetime.strptime(startDate, '%Y-%m-%d')  # 00:00:00
     end_datetime = datetime.strptime(endDate, '%Y-%m-%d') + timedelta(days=1) - timedelta(seconds=1)  # 23:59:59
 
-    # Get all stock out entries between the provided dates or for today
-    stock_outs = db.query(StockHistory).filter(
-        StockHistory.date.between(start_datetime, end_datetime)
-    ).all()
+    # Get all stock out entries between the provided dates or for today, with the product and
+    # remaining quantity joined in rather than looked up per row. Sales carry their own cost of
+    # goods; any other movement is valued at its own price, so it comes out break-even
+    remaining = _remaining_quantity_subquery()
+    cost = case(
+        (StockHistory.stocktype == STOCK_OUT, StockHistory.cost_of_goods),
+        else_=StockHistory.price_per_unit * StockHistory.product_quantity,
+    )
+    stock_outs = await run_db(db, lambda db: (
+        db.query(
+            StockHistory,
+            Products.Pro_id,
+            Products.product_name,
+            Products.product_type,
+            cost,
+            remaining.c.product_quantity,
+            _profit_status_column(StockHistory.price_per_unit * StockHistory.product_quantity, cost),
+        )
+        .outerjoin(Products, StockHistory.product_id == Products.Pro_id)
+        .outerjoin(remaining, remaining.c.product_id == StockHistory.product_id)
+        .filter(StockHistory.date.between(start_datetime, end_datetime))
+        .all()
+    ))
 
     if not stock_outs:
         raise HTTPException(status_code=404, detail="No stock out entries found for the provided date range.")
 
     result = []
 
-    # Iterate over each stock out entry and retrieve the related product and stock in details
-    for index, stock_out in enumerate(stock_outs):
-        # Fetch the product details using the product_id from Products table
-        product = db.query(Products).filter(Products.Pro_id == stock_out.product_id).first()
-        if not product:
+    for stock_out, pro_id, product_name, product_type, cost_of_goods, remaing_quantity, profit_status in stock_outs:
+        if pro_id is None:
             raise HTTPException(status_code=404, detail=f"Product with ID {stock_out.product_id} does not exist.")
 
-        # Fetch the stock in details for the product to calculate the profit
-        stock_in = db.query(StockHistory).filter(StockHistory.product_id == stock_out.product_id).first()
-        remaing_quantity = db.query(Stock).filter(Stock.product_id == stock_out.product_id).first()
-
-        if not stock_in:
+        if cost_of_goods is None:
             raise HTTPException(status_code=404, detail=f"No stock entry found in StockHistory for product ID {stock_out.product_id}.")
 
-        if not remaing_quantity:
+        if remaing_quantity is None:
             raise HTTPException(status_code=404, detail=f"No remaining stock found for product ID {stock_out.product_id}.")
 
-        # Calculate profit or loss
-        purchase_price = float(stock_in.price_per_unit)  # Purchase price per unit from StockIn
-        sales_price = float(stock_out.price_per_unit)  # Sales price per unit from StockOut
-        quantity_sold = stock_out.product_quantity
-
-        # Profit calculation: (Sales price × quantity) - (Purchase price × quantity)
-        profit = (sales_price * quantity_sold) - (purchase_price * quantity_sold)
-
-        # Determine profit status
-        if profit > 0:
-            profit_status = "profit"
-        elif profit < 0:
-            profit_status = "loss"
-        else:
-            profit_status = "break-even"
-
         # Append the formatted response with profit status
         result.append({
             "stock_id": stock_out.stock_id,
             "product_id": stock_out.product_id,
             "product_quantity": stock_out.product_quantity,
-            "remaing_quantity": remaing_quantity.product_quantity,
+            "remaing_quantity": remaing_quantity,
             "price_per_unit": stock_out.price_per_unit,
             "total_price": stock_out.total_price,
             "date": stock_out.date,
-            "product_name": product.product_name,
-            "product_type": product.product_type,
+            "product_name": product_name,
+            "product_type": product_type,
             "profit_status": profit_status,
-            "tra_type": stock_outs[index].stocktype
+            "tra_type": stock_out.stocktype
         })
 
     return result
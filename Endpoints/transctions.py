@@ -1,55 +1,66 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Response
 from sqlalchemy.orm import Session
 from db.VerifyToken import user_dependency
 from typing import List
 from datetime import datetime
-from db.connection import db_dependency
+from db.connection import db_dependency, run_db
+from db.idempotency import idempotency_dependency
+from db.pagination import page_dependency, paginate
+from web.fastjson import FastJSONRoute
 from models.userModels import Transaction
 from schemas.schemas import TransactionCreate, TransactionUpdate, TransactionResponse
 
-router = APIRouter(prefix="/transactions", tags=["Transaction Management"])
+router = APIRouter(prefix="/transactions", tags=["Transaction Management"], route_class=FastJSONRoute)
 
 @router.post("/", status_code=201, response_model=TransactionResponse)
-async def create_transaction(transaction: TransactionCreate, db: db_dependency, user: user_dependency):
+async def create_transaction(transaction: TransactionCreate, db: db_dependency, user: user_dependency, idempotency: idempotency_dependency):
     if isinstance(user, HTTPException):
         raise user
+    return await run_db(db, idempotency.run, _create_transaction, transaction, transaction, response_model=TransactionResponse)
+
+def _create_transaction(db: Session, transaction: TransactionCreate):
     new_transaction = Transaction(**transaction.dict())
     db.add(new_transaction)
-    db.commit()
-    db.refresh(new_transaction)
+    db.flush()  # committed by Idempotency.run
     return new_transaction
 
 @router.get("/{transaction_id}", response_model=TransactionResponse)
 async def get_transaction(transaction_id: int, db: db_dependency, user: user_dependency):
     if isinstance(user, HTTPException):
         raise user
-    transaction = db.query(Transaction).filter(Transaction.id == transaction_id).first()
+    transaction = await run_db(db, lambda db: db.query(Transaction).filter(Transaction.id == transaction_id).first())
     if not transaction:
         raise HTTPException(status_code=404, detail="Transaction not found")
     return transaction
 
 @router.get("/", response_model=List[TransactionResponse])
-async def get_all_transactions(db: db_dependency, user: user_dependency):
+async def get_all_transactions(db: db_dependency, user: user_dependency, page: page_dependency, response: Response):
     if isinstance(user, HTTPException):
         raise user
-    transactions = db.query(Transaction).all()
+    transactions = await run_db(db, lambda db: paginate(db.query(Transaction), Transaction.id, page, response))
     return transactions
 
 @router.delete("/{transaction_id}", status_code=204)
 async def delete_transaction(transaction_id: int, db: db_dependency, user: user_dependency):
     if isinstance(user, HTTPException):
         raise user
+    await run_db(db, _delete_transaction, transaction_id)
+    return {"message": "Transaction deleted successfully"}
+
+def _delete_transaction(db: Session, transaction_id: int):
     transaction = db.query(Transaction).filter(Transaction.id == transaction_id).first()
     if not transaction:
         raise HTTPException(status_code=404, detail="Transaction not found")
     db.delete(transaction)
     db.commit()
-    return {"message": "Transaction deleted successfully"}
 
 @router.patch("/{transaction_id}", response_model=TransactionResponse)
 async def update_transaction(transaction_id: int, transaction_update: TransactionUpdate, db: db_dependency, user: user_dependency):
     if isinstance(user, HTTPException):
         raise user
+    return await run_db(db, _update_transaction, transaction_id, transaction_update)
+
+def _update_transaction(db: Session, transaction_id: int, transaction_update: TransactionUpdate):
     transaction = db.query(Transaction).filter(Transaction.id == transaction_id).first()
     if not transaction:
         raise HTTPException(status_code=404, detail="Transaction not found")
@@ -59,4 +70,4 @@ async def update_transaction(transaction_id: int, transaction_update: Transactio
     
     db.commit()
     db.refresh(transaction)
-    return transaction
\ No newline at end of file
+    return transaction
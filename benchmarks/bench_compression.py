@@ -0,0 +1,107 @@
+"""
+Payload size versus server CPU for response compression, on representative responses:
+POST /stock/out/byDate, a 1000-row page of GET /transactions/ and the CSV / NDJSON
+stock-history exports.
+
+For each codec installed here (gzip always; br and zstd with `brotli` / `zstandard`) and a
+few levels it prints the compressed size, the ratio and the CPU spent compressing. Exports
+are compressed the way the middleware streams them, flushing after every chunk, next to
+a one-shot compression of the same bytes to show what the flushes cost.
+
+    python -m benchmarks.bench_compression [products] [movements_per_product]
+"""
+import sys
+import time
+from datetime import date
+
+from benchmarks.common import reset_database, session
+
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+
+from web.compression import CODECS
+from Endpoints.auth import get_current_user
+from Endpoints.export import EXPORT_BATCH_SIZE
+from main import app
+from models.userModels import Products, Stock, StockHistory, Transaction
+
+LEVELS = {"gzip": (1, 6, 9), "br": (1, 4, 11), "zstd": (1, 3, 19)}
+
+
+def seed(products, movements):
+    db = session()
+    db.execute(insert(Products), [
+        {"Pro_id": n, "product_name": f"Milk {n}", "product_type": "milk", "product_price": 500}
+        for n in range(1, products + 1)
+    ])
+    db.execute(insert(Stock), [
+        {"product_id": n, "product_quantity": movements, "price_per_unit": 400, "total_price": movements * 400}
+        for n in range(1, products + 1)
+    ])
+    db.execute(insert(StockHistory), [
+        {"product_id": n, "product_quantity": 1 + m % 7, "price_per_unit": 450, "total_price": 450 * (1 + m % 7),
+         "stocktype": "stock out" if m else "stock in"}
+        for n in range(1, products + 1) for m in range(movements)
+    ])
+    db.execute(insert(Transaction), [
+        {"description": f"Sale to shop {n % 40}", "amount": 1000 + n, "type": "income", "date": date(2024, 3, 1 + n % 28)}
+        for n in range(1000)
+    ])
+    db.commit()
+    db.close()
+
+
+def fetch(client, method, url, **kwargs):
+    """The identity-encoded body, as a list of the chunks the app produced."""
+    chunks = []
+    with client.stream(method, url, headers={"Accept-Encoding": "identity"}, **kwargs) as response:
+        assert response.status_code == 200, response.read()
+        chunks.extend(response.iter_raw())
+    return chunks
+
+
+def compress(codec, level, chunks, streamed):
+    compressor = CODECS[codec](level)
+    cpu = time.process_time()
+    size = 0
+    for chunk in chunks:
+        size += len(compressor.compress(chunk))
+        if streamed:
+            size += len(compressor.flush())
+    size += len(compressor.finish())
+    return size, time.process_time() - cpu
+
+
+def main():
+    products = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    movements = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    reset_database()
+    seed(products, movements)
+    app.dependency_overrides[get_current_user] = lambda: {"username": "bench", "user_id": 1}
+    client = TestClient(app)
+
+    payloads = [
+        ("POST /stock/out/byDate", fetch(client, "POST", "/stock/out/byDate"), False),
+        ("GET /transactions/ (1000 rows)", fetch(client, "GET", "/transactions/", params={"limit": 1000}), False),
+        ("export stock-history csv", fetch(client, "GET", "/export/stock-history", params={"format": "csv"}), True),
+        ("export stock-history ndjson", fetch(client, "GET", "/export/stock-history"), True),
+    ]
+    print(f"{products} products x {movements} movements; exports stream {EXPORT_BATCH_SIZE} rows per chunk")
+    for label, chunks, streamed in payloads:
+        raw = b"".join(chunks)
+        if streamed:
+            # Re-chunk to the export's batch boundaries; the test transport may merge chunks
+            lines = raw.splitlines(keepends=True)
+            chunks = [b"".join(lines[n:n + EXPORT_BATCH_SIZE]) for n in range(0, len(lines), EXPORT_BATCH_SIZE)]
+        print(f"{label}: {len(raw) / 1024:.1f} KiB")
+        for codec in CODECS:
+            for level in LEVELS[codec]:
+                modes = [("streamed", True), ("one-shot", False)] if streamed else [("", False)]
+                for mode, flush in modes:
+                    size, cpu = compress(codec, level, chunks, flush)
+                    name = f"{codec} {level} {mode}".strip()
+                    print(f"  {name:<22} {size / 1024:9.1f} KiB {len(raw) / size:6.1f}x {cpu * 1000:8.1f} ms CPU")
+
+
+if __name__ == "__main__":
+    main()
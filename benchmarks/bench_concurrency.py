@@ -0,0 +1,92 @@
+"""
+Throughput of many simultaneous GET /stock/out/ requests.
+
+The baseline runs the ORM work inline in the handler, the way every route did before
+`run_db`, so each query blocks the event loop. Run once as-is (threadpool + sync
+session) and once with DB_ASYNC=true (async driver) to compare the three:
+
+    python -m benchmarks.bench_concurrency [requests] [in_flight]
+    DB_ASYNC=true python -m benchmarks.bench_concurrency [requests] [in_flight]
+
+Keep `in_flight` at or below the pool capacity: in the blocking baseline a request
+waiting on pool checkout freezes the loop that would release the other connections.
+On the default SQLite file the work is CPU-bound under the GIL and the three paths
+come out about even; export DATABASE_URL to a networked Postgres to see the gap.
+"""
+import asyncio
+import statistics
+import sys
+import time
+
+from benchmarks.common import reset_database, session
+
+import httpx
+
+import Endpoints.stockOut
+from db.database import DB_ASYNC
+from Endpoints.auth import get_current_user
+from main import app
+from models.userModels import Products, StockHistory, StockOut
+
+
+async def inline_run_db(db, work, *args):
+    """The old behaviour: call the blocking session right on the event loop."""
+    if DB_ASYNC:
+        return await db.run_sync(work, *args)
+    return work(db, *args)
+
+
+def seed(rows):
+    db = session()
+    db.add(Products(Pro_id=1, product_name="Milk", product_type="milk", product_price="500"))
+    db.add(StockHistory(product_id=1, product_quantity=rows, price_per_unit="400", total_price="0", stocktype="stock in"))
+    db.add_all(StockOut(product_id=1, product_quantity=1, price_per_unit="450", total_price="450", cost_of_goods="400") for _ in range(rows))
+    db.commit()
+    db.close()
+
+
+async def fire(client, requests, in_flight):
+    slots = asyncio.Semaphore(in_flight)
+
+    async def one():
+        async with slots:
+            start = time.perf_counter()
+            response = await client.get("/stock/out/", params={"limit": 200})
+            assert response.status_code == 200, response.text
+            return time.perf_counter() - start
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(one() for _ in range(requests)))
+    return time.perf_counter() - start, latencies
+
+
+def report(label, elapsed, latencies):
+    latencies = sorted(latencies)
+    print(f"{label:<28} {len(latencies) / elapsed:8.1f} req/s"
+          f"   p50 {statistics.median(latencies) * 1000:7.1f} ms"
+          f"   p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:7.1f} ms")
+
+
+async def compare(requests, in_flight):
+    # One event loop for both runs: the async engine's pool is bound to the loop that created it
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        current = Endpoints.stockOut.run_db
+        Endpoints.stockOut.run_db = inline_run_db
+        report("blocking (baseline)", *await fire(client, requests, in_flight))
+        Endpoints.stockOut.run_db = current
+        report("async driver" if DB_ASYNC else "threadpool", *await fire(client, requests, in_flight))
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    in_flight = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    reset_database()
+    seed(2000)
+    app.dependency_overrides[get_current_user] = lambda: {"username": "bench", "user_id": 1}
+    print(f"{requests} requests, {in_flight} in flight, DB_ASYNC={DB_ASYNC}", flush=True)
+    asyncio.run(compare(requests, in_flight))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Response model validation (the default) versus the fast JSON path (FAST_JSON=true) for
+a 50k-row stock list:
+
+- serialization alone: 50k `get_all_stocks` rows through list[StockResponseSchema] validation
+  and dump, versus projection and orjson;
+- end to end: GET /stock/in/ walking every page, where the query and ORM loading also count.
+
+    python -m benchmarks.bench_fast_json [rows] [page_size]
+"""
+import sys
+import time
+from datetime import date
+from decimal import Decimal
+
+from benchmarks.common import reset_database, session
+
+from fastapi.testclient import TestClient
+from pydantic import TypeAdapter
+from sqlalchemy import insert
+
+from web.fastjson import FastJSONResponse, _projector, enable_fast_json
+from Endpoints.auth import get_current_user
+from main import app
+from models.userModels import Products, Stock
+from schemas.stockInSchema import StockResponseSchema
+
+
+def seed(rows):
+    db = session()
+    db.execute(insert(Products), [
+        {"Pro_id": n, "product_name": f"Milk {n}", "product_type": "milk", "product_price": 500}
+        for n in range(1, rows + 1)
+    ])
+    db.execute(insert(Stock), [
+        {"product_id": n, "product_quantity": n % 300, "price_per_unit": 400, "total_price": (n % 300) * 400}
+        for n in range(1, rows + 1)
+    ])
+    db.commit()
+    db.close()
+
+
+def walk(client, page_size):
+    """Fetch every page; returns wall seconds, CPU seconds and rows received."""
+    rows = 0
+    params = {"limit": page_size}
+    wall, cpu = time.perf_counter(), time.process_time()
+    while True:
+        response = client.get("/stock/in/", params=params)
+        assert response.status_code == 200, response.text
+        rows += len(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+        params["after"] = cursor
+    return time.perf_counter() - wall, time.process_time() - cpu, rows
+
+
+def serialization_only(rows):
+    stock_rows = [
+        {"stock_id": n, "product_id": n, "product_quantity": n % 300, "price_per_unit": Decimal("400.00"),
+         "total_price": Decimal(n % 300 * 400), "date": date(2024, 5, 1), "product_name": f"Milk {n}",
+         "product_type": "milk"}
+        for n in range(rows)
+    ]
+    adapter = TypeAdapter(list[StockResponseSchema])
+    project = _projector(list[StockResponseSchema])
+    for label, serialize in (
+        ("validate + dump (FastAPI)", lambda: adapter.dump_json(adapter.validate_python(stock_rows))),
+        ("project + orjson (fast)", lambda: FastJSONResponse(project(stock_rows)).body),
+    ):
+        cpu = time.process_time()
+        serialize()
+        print(f"  {label:<26} {(time.process_time() - cpu) * 1000:8.1f} ms CPU")
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    page_size = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    reset_database()
+    seed(rows)
+    app.dependency_overrides[get_current_user] = lambda: {"username": "bench", "user_id": 1}
+    client = TestClient(app)
+    print(f"serializing {rows} rows")
+    serialization_only(rows)
+    print(f"GET /stock/in/ over {rows} rows in pages of {page_size}")
+
+    # Parsing the body on the client side is the same for both, so it's inside both timings
+    for label, fast in (("response_model validation", False), ("fast JSON (orjson)", True)):
+        enable_fast_json(fast)
+        walk(client, page_size)  # warm up
+        wall, cpu, received = walk(client, page_size)
+        assert received == rows
+        print(f"  {label:<26} {wall * 1000:8.1f} ms wall {cpu * 1000:8.1f} ms CPU")
+
+
+if __name__ == "__main__":
+    main()
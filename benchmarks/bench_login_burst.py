@@ -0,0 +1,74 @@
+"""
+Latency of GET /products/ while a burst of logins is being verified.
+
+The baseline verifies passwords inline on the event loop, as the login route used to;
+the current path hands bcrypt to its bounded executor (PASSWORD_HASH_WORKERS).
+
+    python -m benchmarks.bench_login_burst [logins] [product_requests]
+"""
+import asyncio
+import statistics
+import sys
+import time
+
+from benchmarks.common import reset_database, session
+
+import httpx
+
+import Endpoints.auth
+from Endpoints.auth import bcrypt_context, get_current_user
+from main import app
+from models.userModels import Products, Users
+
+
+async def inline_verify_password(password, hashed_password):
+    return bcrypt_context.verify(password, hashed_password)
+
+
+async def burst(client, logins, product_requests):
+    async def login():
+        response = await client.post("/auth/login", json={"username": "cashier", "password": "s3cret"})
+        assert response.status_code == 200, response.text
+
+    async def products():
+        await asyncio.sleep(0.01)  # let the logins get going first
+        start = time.perf_counter()
+        response = await client.get("/products/")
+        assert response.status_code == 200, response.text
+        return time.perf_counter() - start
+
+    results = await asyncio.gather(*(login() for _ in range(logins)), *(products() for _ in range(product_requests)))
+    return sorted(latency for latency in results if latency is not None)
+
+
+def report(label, latencies):
+    print(f"{label:<28} GET /products/ p50 {statistics.median(latencies) * 1000:8.1f} ms"
+          f"   max {latencies[-1] * 1000:8.1f} ms")
+
+
+async def compare(logins, product_requests):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        current = Endpoints.auth.verify_password
+        Endpoints.auth.verify_password = inline_verify_password
+        report("bcrypt on event loop", await burst(client, logins, product_requests))
+        Endpoints.auth.verify_password = current
+        report("bcrypt on executor", await burst(client, logins, product_requests))
+
+
+def main():
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    product_requests = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    reset_database()
+    db = session()
+    db.add(Users(username="cashier", password=bcrypt_context.hash("s3cret")))
+    db.add_all(Products(product_name=f"Milk {n}", product_type="milk", product_price="500") for n in range(50))
+    db.commit()
+    db.close()
+    app.dependency_overrides[get_current_user] = lambda: {"username": "bench", "user_id": 1}
+    print(f"{logins} concurrent logins, {product_requests} product list requests", flush=True)
+    asyncio.run(compare(logins, product_requests))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Sales for a year of history three ways: summing fetched rows in Python (what the dashboard
+did with /stock/out/byDate), GROUP BY over StockHistory, and GET /reports/sales reading the
+daily_product_summary rollup. Also times the rollup rebuild from scratch.
+
+    python -m benchmarks.bench_reports [history_rows] [products]
+
+SQLite has no hash aggregate, so on the default file the million-row GROUP BY sorts through
+a temp B-tree and takes seconds; the rollup query only sees days x products rows.
+"""
+import random
+import sys
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from benchmarks.common import reset_database, session, timed
+
+from fastapi.testclient import TestClient
+from sqlalchemy import insert, func
+
+from db.rollup import period_start, rebuild
+from Endpoints.auth import get_current_user
+from main import app
+from models.userModels import Products, StockHistory
+
+YEAR_START = datetime(2024, 1, 1)
+
+
+def seed(rows, products):
+    db = session()
+    db.execute(insert(Products), [
+        {"Pro_id": n, "product_name": f"Milk {n}", "product_type": f"type {n % 5}", "product_price": 500}
+        for n in range(1, products + 1)
+    ])
+    db.execute(insert(StockHistory), [
+        {"product_id": n, "product_quantity": rows, "price_per_unit": 400, "total_price": 0,
+         "stocktype": "stock in", "date": YEAR_START}
+        for n in range(1, products + 1)
+    ])
+    rng = random.Random(13)
+    batch = []
+    for _ in range(rows):
+        price = rng.randint(380, 520)
+        batch.append({"product_id": rng.randint(1, products), "product_quantity": 1, "price_per_unit": price,
+                      "total_price": price, "stocktype": "stock out",
+                      "date": YEAR_START + timedelta(seconds=rng.randrange(366 * 86400))})
+        if len(batch) == 50000:
+            db.execute(insert(StockHistory), batch)
+            batch = []
+    if batch:
+        db.execute(insert(StockHistory), batch)
+    db.commit()
+    db.close()
+
+
+def sum_in_python():
+    """Pull every sale of the year and bucket it client-side."""
+    db = session()
+    days = defaultdict(lambda: [0, 0])
+    sales = db.query(StockHistory.date, StockHistory.product_quantity, StockHistory.total_price).filter(
+        StockHistory.stocktype == "stock out",
+        StockHistory.date.between(YEAR_START, datetime(2024, 12, 31, 23, 59, 59)),
+    )
+    for sold_at, quantity, total in sales:
+        day = days[sold_at.date()]
+        day[0] += quantity
+        day[1] += total
+    db.close()
+    return days
+
+
+def group_by_history():
+    """Daily totals straight from StockHistory, without the rollup."""
+    db = session()
+    day = period_start(StockHistory.date, "day", db.get_bind().dialect.name)
+    rows = db.query(day, func.sum(StockHistory.product_quantity), func.sum(StockHistory.total_price)).filter(
+        StockHistory.stocktype == "stock out",
+        StockHistory.date.between(YEAR_START, datetime(2024, 12, 31, 23, 59, 59)),
+    ).group_by(day).all()
+    db.close()
+    return rows
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    products = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    reset_database()
+    print(f"seeding {rows} history rows over {products} products...", flush=True)
+    seed(rows, products)
+    db = session()
+    with timed("rebuild daily_product_summary"):
+        rebuild(db)
+        db.commit()
+    db.close()
+
+    app.dependency_overrides[get_current_user] = lambda: {"username": "bench", "user_id": 1}
+    client = TestClient(app)
+    year = {"startDate": "2024-01-01", "endDate": "2024-12-31"}
+
+    with timed("fetch + sum in Python (old)"):
+        days = sum_in_python()
+    with timed("GROUP BY over StockHistory"):
+        group_by_history()
+    for period, group_by in (("day", None), ("week", "product_type"), ("month", "product"), ("day", "product")):
+        params = {**year, "period": period, **({"group_by": group_by} if group_by else {})}
+        with timed(f"GET /reports/sales {period}/{group_by or 'all'}"):
+            response = client.get("/reports/sales", params=params)
+        assert response.status_code == 200, response.text
+        if (period, group_by) == ("day", None):
+            assert len(response.json()["rows"]) == len(days)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+A 200-SKU delivery: one POST /stock/in/ per line versus a single POST /stock/in/bulk.
+
+    python -m benchmarks.bench_stock_in_bulk [skus]
+"""
+import sys
+
+from benchmarks.common import reset_database, session, timed
+
+from fastapi.testclient import TestClient
+
+from Endpoints.auth import get_current_user
+from main import app
+from models.userModels import Products
+
+
+def delivery(skus):
+    return [{"product_id": n, "product_quantity": 24, "price_per_unit": 400, "total_price": None, "date": "2024-05-01"}
+            for n in range(1, skus + 1)]
+
+
+def seed_products(skus):
+    reset_database()
+    db = session()
+    db.add_all(Products(Pro_id=n, product_name=f"Milk {n}", product_type="milk", product_price="500")
+               for n in range(1, skus + 1))
+    db.commit()
+    db.close()
+
+
+def main():
+    skus = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    app.dependency_overrides[get_current_user] = lambda: {"username": "bench", "user_id": 1}
+    client = TestClient(app)
+    print(f"{skus} SKUs per delivery")
+
+    # The first delivery creates the Stock rows, the second one updates them
+    seed_products(skus)
+    for label in ("create", "update"):
+        with timed(f"looped POST /stock/in/ ({label})"):
+            for line in delivery(skus):
+                assert client.post("/stock/in/", json=line).status_code == 201
+
+    seed_products(skus)
+    for label in ("create", "update"):
+        with timed(f"POST /stock/in/bulk ({label})"):
+            assert client.post("/stock/in/bulk", json=delivery(skus)).status_code == 201
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+POST /stock/out/byDate: per-row enrichment (the old loop) versus the joined query.
+
+    python -m benchmarks.bench_stock_out_by_date [products] [movements_per_product]
+"""
+import sys
+
+from benchmarks.common import reset_database, session, timed
+
+from fastapi.testclient import TestClient
+
+from Endpoints.auth import get_current_user
+from main import app
+from models.userModels import Products, Stock, StockHistory
+
+
+def seed(products, movements):
+    db = session()
+    for index in range(products):
+        product = Products(product_name=f"Milk {index}", product_type="milk", product_price="500")
+        db.add(product)
+        db.flush()
+        db.add(Stock(product_id=product.Pro_id, product_quantity=movements, price_per_unit="400", total_price="0"))
+        db.add_all(
+            StockHistory(product_id=product.Pro_id, product_quantity=1, price_per_unit="450",
+                         total_price="450", stocktype="stock out" if n else "stock in",
+                         cost_of_goods="400" if n else None)
+            for n in range(movements)
+        )
+    db.commit()
+    db.close()
+
+
+def per_row_enrichment():
+    """The pre-rewrite shape: three lookups for every history row."""
+    db = session()
+    rows = []
+    for history in db.query(StockHistory).all():
+        product = db.query(Products).filter(Products.Pro_id == history.product_id).first()
+        stock_in = db.query(StockHistory).filter(StockHistory.product_id == history.product_id).first()
+        remaining = db.query(Stock).filter(Stock.product_id == history.product_id).first()
+        rows.append((history, product.product_name, stock_in.price_per_unit, remaining.product_quantity))
+    db.close()
+    return rows
+
+
+def main():
+    products = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    movements = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    reset_database()
+    seed(products, movements)
+    print(f"{products} products x {movements} movements")
+
+    app.dependency_overrides[get_current_user] = lambda: {"username": "bench", "user_id": 1}
+    client = TestClient(app)
+
+    with timed("per-row enrichment (old)"):
+        per_row_enrichment()
+    with timed("POST /stock/out/byDate (joined)"):
+        response = client.post("/stock/out/byDate")
+    assert response.status_code == 200, response.text
+    assert len(response.json()) == products * movements
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Cost of the get_current_user dependency with and without the verified-token cache.
+
+    python -m benchmarks.bench_token_cache [calls]
+"""
+import asyncio
+import sys
+import time
+from datetime import timedelta
+
+from benchmarks.common import reset_database
+
+import Endpoints.auth
+from db.cache import TTLCache
+from Endpoints.auth import create_access_token, get_current_user
+
+
+async def call(token, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        await get_current_user(token)
+    return time.perf_counter() - start
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    reset_database()
+    token = create_access_token("cashier", 1, timedelta(days=30))
+
+    cached = Endpoints.auth.token_cache
+    Endpoints.auth.token_cache = TTLCache(maxsize=0, ttl=0)  # every call verifies the signature
+    uncached_seconds = asyncio.run(call(token, calls))
+    Endpoints.auth.token_cache = cached
+    cached_seconds = asyncio.run(call(token, calls))
+
+    print(f"{calls} calls")
+    print(f"{'jwt.decode every call':<28} {uncached_seconds / calls * 1e6:8.2f} us/call")
+    print(f"{'verified-token cache':<28} {cached_seconds / calls * 1e6:8.2f} us/call   {cached.stats()}")
+
+
+if __name__ == "__main__":
+    main()
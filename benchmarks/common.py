@@ -0,0 +1,50 @@
+"""
+Shared setup for the benchmark scripts.
+
+Benchmarks run against a throwaway SQLite file unless DATABASE_URL is already
+exported, so they can also be pointed at a scratch Postgres database.
+Run them from the repository root, e.g. ``python -m benchmarks.bench_stock_out``.
+"""
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='ozone-bench-'), 'bench.db')}"
+os.environ.setdefault("SECRET_KEY", "bench-secret-key")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+from sqlalchemy import event
+
+from db.database import engine, SessionLocal
+from models.userModels import Base
+
+
+def reset_database():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+
+def session():
+    return SessionLocal()
+
+
+@contextmanager
+def timed(label, results=None):
+    """Print the wall time and SQL statement count of the wrapped block."""
+    statements = [0]
+
+    def count(*args, **kwargs):
+        statements[0] += 1
+
+    event.listen(engine, "before_cursor_execute", count)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        event.remove(engine, "before_cursor_execute", count)
+        print(f"{label:<40} {elapsed * 1000:10.1f} ms {statements[0]:8d} statements")
+        if results is not None:
+            results[label] = elapsed
@@ -1,6 +1,8 @@
 from fastapi import Depends
 from typing import Annotated
-from Endpoints.auth import get_current_user
+from Endpoints.auth import get_current_user, get_stream_user
 
 
 user_dependency = Annotated[dict, Depends(get_current_user)]
+# For EventSource and WebSocket clients, which may pass the token as a query parameter
+stream_user_dependency = Annotated[dict, Depends(get_stream_user)]
@@ -0,0 +1,177 @@
+"""
+Read-through cache of the product catalog, by id and by name.
+
+Products change rarely but are looked up on almost every stock request. Entries are
+immutable `CachedProduct` snapshots, never session-bound ORM objects. Writers call
+`product_catalog.invalidate(...)` after committing; it drops the entry here at once and
+hands it to the invalidation backend for the other workers:
+
+- `LocalInvalidation` (default): a single worker, nothing to broadcast.
+- `RedisInvalidation`: a Redis pub/sub channel shared by all uvicorn workers.
+  Enabled with PRODUCT_CACHE_REDIS_URL; needs `pip install redis`. After a dropped
+  connection the worker clears its cache, since it may have missed invalidations.
+"""
+import json
+import os
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from db.cache import TTLCache
+from db.pubsub import RedisListener
+from models.userModels import Products
+
+
+@dataclass(frozen=True)
+class CachedProduct:
+    Pro_id: int
+    product_name: str
+    product_type: str
+    product_price: object
+    date: Optional[str]
+    reorder_threshold: Optional[int] = None
+
+    @classmethod
+    def from_row(cls, product: Products):
+        return cls(
+            product.Pro_id, product.product_name, product.product_type, product.product_price, product.date,
+            product.reorder_threshold,
+        )
+
+
+class LocalInvalidation:
+    """Backend for a single worker: its own cache is the only one, so there is nothing to send."""
+
+    def subscribe(self, callback):
+        pass
+
+    def publish(self, message: dict):
+        pass
+
+
+class RedisInvalidation:
+    """
+    Broadcasts invalidations on a Redis pub/sub channel; every worker applies them from a
+    background listener thread (the publisher's echo is harmless). `client` is a `redis.Redis`-like object.
+    """
+
+    def __init__(self, client, channel: str = "product-catalog", **listener_options):
+        self.client = client
+        self.channel = channel
+        self._subscribers = []
+        self._listener = RedisListener(client, channel, self._receive, on_resubscribe=self._resubscribed,
+                                       **listener_options)
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs):
+        import redis
+
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+
+    def publish(self, message: dict):
+        self.client.publish(self.channel, json.dumps(message))
+
+    def _receive(self, data):
+        message = json.loads(data)
+        for callback in self._subscribers:
+            callback(message)
+
+    def _resubscribed(self):
+        for callback in self._subscribers:
+            callback({"all": True})
+
+
+class ProductCatalog:
+    def __init__(self, maxsize: int, ttl: float, backend=None):
+        self._by_id = TTLCache(maxsize, ttl)
+        self._by_name = TTLCache(maxsize, ttl)
+        # Bumped by every invalidation; a lookup that raced one doesn't store what it read
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.backend = backend or LocalInvalidation()
+        self.backend.subscribe(self._apply_invalidation)
+
+    def get(self, db: Session, product_id: int) -> Optional[CachedProduct]:
+        product = self._by_id.get(product_id)
+        if product is None:
+            generation = self._generation
+            row = db.query(Products).filter(Products.Pro_id == product_id).first()
+            product = self._store(row, generation)
+        return product
+
+    def get_by_name(self, db: Session, product_name: str) -> Optional[CachedProduct]:
+        product = self._by_name.get(product_name)
+        if product is None:
+            generation = self._generation
+            row = db.query(Products).filter(Products.product_name == product_name).first()
+            product = self._store(row, generation)
+        return product
+
+    def get_many(self, db: Session, product_ids) -> dict:
+        """Products by id for the ids that exist; the misses are loaded with one IN query."""
+        found = {}
+        missing = []
+        for product_id in set(product_ids):
+            product = self._by_id.get(product_id)
+            if product is None:
+                missing.append(product_id)
+            else:
+                found[product_id] = product
+        if missing:
+            generation = self._generation
+            for row in db.query(Products).filter(Products.Pro_id.in_(missing)):
+                found[row.Pro_id] = self._store(row, generation)
+        return found
+
+    def invalidate(self, product_id: Optional[int], names=()):
+        """Drop a product, by id and by its current and former names, from every worker's cache."""
+        message = {"id": product_id, "names": [name for name in names if name]}
+        self._apply_invalidation(message)
+        self.backend.publish(message)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._by_id.clear()
+            self._by_name.clear()
+
+    def stats(self) -> dict:
+        return {"by_id": self._by_id.stats(), "by_name": self._by_name.stats()}
+
+    def _store(self, row: Optional[Products], generation: int) -> Optional[CachedProduct]:
+        if row is None:
+            return None  # misses aren't cached, so new products show up immediately
+        product = CachedProduct.from_row(row)
+        with self._lock:
+            if generation == self._generation:
+                self._by_id.set(product.Pro_id, product)
+                self._by_name.set(product.product_name, product)
+        return product
+
+    def _apply_invalidation(self, message: dict):
+        with self._lock:
+            self._generation += 1
+            if message.get("all"):
+                self._by_id.clear()
+                self._by_name.clear()
+            if message.get("id") is not None:
+                self._by_id.invalidate(message["id"])
+            for name in message.get("names", ()):
+                self._by_name.invalidate(name)
+
+
+def _backend():
+    url = os.getenv("PRODUCT_CACHE_REDIS_URL")
+    return RedisInvalidation.from_url(url) if url else LocalInvalidation()
+
+
+product_catalog = ProductCatalog(
+    maxsize=int(os.getenv("PRODUCT_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("PRODUCT_CACHE_TTL", "300")),
+    backend=_backend(),
+)
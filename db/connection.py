@@ -1,17 +1,34 @@
 from fastapi import Depends
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from .database import engine, SessionLocal
+from .database import engine, SessionLocal, AsyncSessionLocal, DB_ASYNC
 from typing import Annotated
 from models.userModels import  Base
 
 Base.metadata.create_all(bind=engine)
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+if DB_ASYNC:
+    async def get_db():
+        async with AsyncSessionLocal() as db:
+            yield db
+else:
+    def get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
 
 
-db_dependency = Annotated[Session, Depends(get_db)]
\ No newline at end of file
+async def run_db(db, work, *args, **kwargs):
+    """
+    Run `work(session, *args, **kwargs)` without blocking the event loop.
+    With DB_ASYNC the ORM code runs on the async driver via `run_sync`,
+    otherwise it runs on the threadpool against the sync session.
+    """
+    if DB_ASYNC:
+        return await db.run_sync(work, *args, **kwargs)
+    return await run_in_threadpool(work, db, *args, **kwargs)
+
+
+db_dependency = Annotated[Session, Depends(get_db)]
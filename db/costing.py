@@ -0,0 +1,207 @@
+"""
+Cost layers: what the units in stock cost, delivery by delivery.
+
+Stock-in calls `record_receipts` with its StockHistory rows, and stock-out takes each sale's
+cost of goods from `consume`, in the same transaction. How deliveries become layers depends
+on COSTING_METHOD:
+
+- `fifo` (default): every delivery is a layer of its own and sales use up the oldest first.
+- `average`: a product keeps a single open layer, re-averaged with every delivery.
+
+Exhausted layers drop out of the partial `ix_cost_layers_open` index, and a sale only reads
+the layers it reaches, so each sale costs O(1) amortized however long the history is. When a
+Stock row is edited or deleted by hand, `set_on_hand` brings the product's open layers back in
+line with it. Units with no layer behind them, such as stock from before cost layers, are
+costed at a fallback price, the Stock row's price per unit.
+"""
+import os
+from collections import defaultdict, deque
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import select, func, case, insert, update
+from sqlalchemy.orm import Session
+
+from models.userModels import CostLayer
+
+COSTING_METHODS = ("fifo", "average")
+COSTING_METHOD = os.getenv("COSTING_METHOD", "fifo").lower()
+if COSTING_METHOD not in COSTING_METHODS:
+    raise ValueError(f"COSTING_METHOD must be one of {COSTING_METHODS}, not {COSTING_METHOD!r}")
+
+CENT = Decimal("0.01")
+UNIT_COST = Decimal("0.0001")
+
+
+def _decimal(value) -> Decimal:
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+def record_receipts(db: Session, histories: list, method: str = None):
+    """
+    Add deliveries, given as StockHistory column value dicts, to the cost layers. Under the
+    average method they are folded into the product's open layer. The caller commits.
+    """
+    method = method or COSTING_METHOD
+    if method not in COSTING_METHODS:
+        raise ValueError(f"Unknown costing method {method!r}")
+    if not histories:
+        return
+
+    if method == "average":
+        _record_average(db, histories)
+        return
+    db.execute(insert(CostLayer), [
+        {
+            "product_id": history["product_id"],
+            "received_at": history["date"],
+            "quantity": history["product_quantity"],
+            "remaining": history["product_quantity"],
+            "unit_cost": history["price_per_unit"],
+        }
+        for history in histories
+    ])
+
+
+def _record_average(db: Session, histories: list):
+    product_ids = {history["product_id"] for history in histories}
+    open_layers = defaultdict(list)
+    for layer in db.execute(
+        select(CostLayer.layer_id, CostLayer.product_id, CostLayer.quantity, CostLayer.remaining, CostLayer.unit_cost)
+        .where(CostLayer.product_id.in_(product_ids), CostLayer.remaining > 0)
+        .order_by(CostLayer.layer_id)
+        .with_for_update()
+    ):
+        open_layers[layer.product_id].append(layer)
+
+    # Per product: the layer kept open (None for a new one), and its quantities and value
+    totals = {}
+    updates = []
+    for product_id, layers in open_layers.items():
+        kept = layers[-1]
+        totals[product_id] = {
+            "layer_id": kept.layer_id,
+            "quantity": kept.quantity,
+            "remaining": sum(layer.remaining for layer in layers),
+            "value": sum(layer.remaining * _decimal(layer.unit_cost) for layer in layers),
+        }
+        # Layers left over from FIFO costing are merged into the kept one
+        updates.extend({"layer_id": layer.layer_id, "remaining": 0} for layer in layers[:-1])
+    for history in histories:
+        total = totals.setdefault(history["product_id"], {
+            "layer_id": None, "quantity": 0, "remaining": 0, "value": Decimal(0), "received_at": history["date"],
+        })
+        total["quantity"] += history["product_quantity"]
+        total["remaining"] += history["product_quantity"]
+        total["value"] += history["product_quantity"] * _decimal(history["price_per_unit"])
+
+    inserts = []
+    for product_id, total in totals.items():
+        unit_cost = (total["value"] / total["remaining"]).quantize(UNIT_COST) if total["remaining"] else Decimal(0)
+        values = {"quantity": total["quantity"], "remaining": total["remaining"], "unit_cost": unit_cost}
+        if total["layer_id"] is None:
+            inserts.append({"product_id": product_id, "received_at": total["received_at"], **values})
+        else:
+            updates.append({"layer_id": total["layer_id"], **values})
+    if updates:
+        db.execute(update(CostLayer), updates)
+    if inserts:
+        db.execute(insert(CostLayer), inserts)
+
+
+def set_on_hand(db: Session, product_id: int, quantity: int, unit_cost, reprice: bool = False, method: str = None):
+    """
+    Make the product's open layers add up to `quantity`, after its Stock row was edited or
+    deleted. Units taken away come out of the oldest layers first; units added are recorded as
+    a delivery at `unit_cost`. With `reprice` the newest open layer, the delivery the Stock
+    row's price came from, is costed at `unit_cost` instead. The caller commits.
+    """
+    layers = db.execute(
+        select(CostLayer.layer_id, CostLayer.remaining)
+        .where(CostLayer.product_id == product_id, CostLayer.remaining > 0)
+        .order_by(CostLayer.layer_id)
+        .with_for_update()
+    ).all()
+
+    excess = sum(layer.remaining for layer in layers) - quantity
+    remaining = {}
+    for layer in layers:
+        taken = min(max(excess, 0), layer.remaining)
+        remaining[layer.layer_id] = layer.remaining - taken
+        excess -= taken
+    changed = [
+        {"layer_id": layer.layer_id, "remaining": remaining[layer.layer_id]}
+        for layer in layers if remaining[layer.layer_id] != layer.remaining
+    ]
+    if changed:
+        db.execute(update(CostLayer), changed)
+
+    still_open = [layer_id for layer_id, left in remaining.items() if left]
+    if reprice and still_open:
+        db.execute(update(CostLayer).where(CostLayer.layer_id == still_open[-1]).values(unit_cost=unit_cost))
+    if excess < 0:
+        record_receipts(db, [{
+            "product_id": product_id, "product_quantity": -excess, "price_per_unit": unit_cost,
+            "date": datetime.utcnow(),
+        }], method)
+
+
+def consume(db: Session, lines: list, fallback_prices: dict) -> list:
+    """
+    Take sale `lines`, (product_id, quantity) pairs in sale order, out of the products' open
+    layers, oldest first, and return each line's cost of goods. Whatever the layers don't cover
+    is costed at `fallback_prices[product_id]`. One query reads only the layers these lines
+    reach and one executemany UPDATE writes them back.
+
+    Concurrent sales of a product must be serialized by the caller; stock-out does it with the
+    Stock row lock its decrement takes.
+    """
+    needed = defaultdict(int)
+    for product_id, quantity in lines:
+        needed[product_id] += quantity
+    if not needed:
+        return []
+
+    # Units in the product's earlier open layers; a layer is reached while that is below the need
+    before = func.sum(CostLayer.remaining).over(partition_by=CostLayer.product_id, order_by=CostLayer.layer_id) - CostLayer.remaining
+    open_layers = (
+        select(CostLayer.layer_id, CostLayer.product_id, CostLayer.remaining, CostLayer.unit_cost, before.label("before"))
+        .where(CostLayer.product_id.in_(needed), CostLayer.remaining > 0)
+        .subquery()
+    )
+    reached = db.execute(
+        select(open_layers.c.layer_id, open_layers.c.product_id, open_layers.c.remaining, open_layers.c.unit_cost)
+        .where(open_layers.c.before < case(dict(needed), value=open_layers.c.product_id))
+        .order_by(open_layers.c.product_id, open_layers.c.layer_id)
+    ).all()
+
+    queues = defaultdict(deque)
+    layers = []
+    for layer in reached:
+        entry = {"layer_id": layer.layer_id, "remaining": layer.remaining, "unit_cost": _decimal(layer.unit_cost)}
+        queues[layer.product_id].append(entry)
+        layers.append((entry, layer.remaining))
+
+    costs = []
+    for product_id, quantity in lines:
+        queue = queues[product_id]
+        cost = Decimal(0)
+        while quantity and queue:
+            layer = queue[0]
+            taken = min(quantity, layer["remaining"])
+            cost += taken * layer["unit_cost"]
+            layer["remaining"] -= taken
+            quantity -= taken
+            if not layer["remaining"]:
+                queue.popleft()
+        if quantity:
+            cost += quantity * _decimal(fallback_prices[product_id])
+        costs.append(cost.quantize(CENT))
+
+    changed = [
+        {"layer_id": entry["layer_id"], "remaining": entry["remaining"]}
+        for entry, remaining in layers if entry["remaining"] != remaining
+    ]
+    if changed:
+        db.execute(update(CostLayer), changed)
+    return costs
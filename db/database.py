@@ -1,15 +1,67 @@
 from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from dotenv import load_dotenv
+from .metrics import InstrumentedQueuePool, InstrumentedAsyncQueuePool
 import os
 # Load environment variables from .env file
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(DATABASE_URL)
+# Serve requests from an async engine (asyncpg / aiosqlite) instead of the sync one
+DB_ASYNC = os.getenv("DB_ASYNC", "false").lower() in ("1", "true", "yes")
+
+# Async drivers used when ASYNC_DATABASE_URL isn't given explicitly
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def async_url(url):
+    scheme, rest = url.split("://", 1)
+    return f"{ASYNC_DRIVERS.get(scheme, scheme)}://{rest}"
+
+
+# Connection pool tuning, per worker process
+POOL_OPTIONS = {
+    "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+    "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+    "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "-1")),
+    "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "false").lower() in ("1", "true", "yes"),
+}
+
+engine = create_engine(DATABASE_URL, poolclass = InstrumentedQueuePool, **POOL_OPTIONS)
 
 SessionLocal = sessionmaker(autocommit = False, autoflush = False, bind = engine)
 
-Base = declarative_base()
\ No newline at end of file
+if DB_ASYNC:
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+    async_engine = create_async_engine(
+        os.getenv("ASYNC_DATABASE_URL") or async_url(DATABASE_URL),
+        poolclass = InstrumentedAsyncQueuePool,
+        **POOL_OPTIONS,
+    )
+    # Objects are read after commit by the route handlers, outside the session's greenlet
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush = False, expire_on_commit = False)
+else:
+    async_engine = None
+    AsyncSessionLocal = None
+
+Base = declarative_base()
+
+# INSERT constructs with ON CONFLICT support, by dialect
+_UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def upsert_insert(session, table):
+    """`insert(table)` for the session's dialect, with `.on_conflict_do_update()` available."""
+    dialect = session.get_bind().dialect.name
+    if dialect not in _UPSERT_INSERTS:
+        raise NotImplementedError(f"No upsert support for the {dialect} dialect.")
+    return _UPSERT_INSERTS[dialect](table)
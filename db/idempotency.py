@@ -0,0 +1,130 @@
+"""
+Idempotency-Key support for write endpoints.
+
+A client that may retry a write sends the same `Idempotency-Key` header with every attempt.
+The endpoint runs its work through `Idempotency.run`. The work only flushes; `run` commits
+once, so the key, the work's writes and the stored response are saved together or not at all:
+
+- the key is looked up by primary key; a stored response is returned as is (with
+  `Idempotent-Replayed: true`) and the work doesn't run again,
+- otherwise the key is claimed with a row inserted before the work runs, so a concurrent
+  attempt waits on it and then gets the winner's response,
+- the response is written to that row and everything commits; it is kept for
+  IDEMPOTENCY_TTL seconds (default a day).
+
+Keys are scoped to the user and endpoint, and reusing one with a different body is a 422.
+Requests without the header run as before. Expired rows are deleted by the purge job:
+
+    python -m db.idempotency
+"""
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Annotated, Optional
+
+from fastapi import Depends, Header, HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from db.VerifyToken import user_dependency
+from models.userModels import IdempotencyKey
+
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", str(24 * 60 * 60)))
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class Idempotency:
+    def __init__(
+        self,
+        request: Request,
+        response: Response,
+        user: user_dependency,
+        idempotency_key: Annotated[Optional[str], Header(alias="Idempotency-Key")] = None,
+    ):
+        if idempotency_key is not None and not 0 < len(idempotency_key) <= MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters.")
+        self.response = response
+        self.key = None
+        if idempotency_key is not None:
+            user_id = user.get("user_id") if isinstance(user, dict) else None
+            self.key = _sha256(f"{user_id}|{request.method} {request.url.path}|{idempotency_key}")
+
+    def run(self, db: Session, work, payload, *args, response_model=None):
+        """
+        `work(db, *args)` and a commit, unless this key already has a response. `work` must
+        flush, not commit. `payload` is the request body the key must keep matching;
+        `response_model` turns an ORM result into JSON.
+        """
+        if self.key is None:
+            result = _to_response(work(db, *args), response_model)
+            db.commit()
+            return result
+
+        request_hash = _sha256(json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":")))
+        stored = db.get(IdempotencyKey, self.key)
+        if stored is not None and stored.expires_at <= datetime.utcnow():
+            db.delete(stored)
+            db.flush()
+            stored = None
+        if stored is not None:
+            return self._replay(stored, request_hash)
+
+        # Claimed in the work's transaction: a concurrent attempt fails on the primary key
+        claim = IdempotencyKey(
+            key=self.key,
+            request_hash=request_hash,
+            expires_at=datetime.utcnow() + timedelta(seconds=IDEMPOTENCY_TTL),
+        )
+        db.add(claim)
+        try:
+            db.flush()
+            body = jsonable_encoder(_to_response(work(db, *args), response_model))
+            claim.response = json.dumps(body)
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            stored = db.get(IdempotencyKey, self.key)
+            if stored is None:
+                raise
+            return self._replay(stored, request_hash)
+        return body
+
+    def _replay(self, stored: IdempotencyKey, request_hash: str):
+        if stored.request_hash != request_hash:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request.")
+        self.response.headers[REPLAYED_HEADER] = "true"
+        return json.loads(stored.response)
+
+
+def _to_response(result, response_model):
+    return response_model.model_validate(result, from_attributes=True) if response_model is not None else result
+
+
+idempotency_dependency = Annotated[Idempotency, Depends()]
+
+
+def purge(db: Session, now: datetime = None) -> int:
+    """Delete expired keys; returns how many. The caller commits."""
+    return db.execute(
+        delete(IdempotencyKey)
+        .where(IdempotencyKey.expires_at <= (now or datetime.utcnow()))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+
+if __name__ == "__main__":
+    from db.database import engine, SessionLocal
+
+    IdempotencyKey.__table__.create(bind=engine, checkfirst=True)
+    with SessionLocal() as db:
+        removed = purge(db)
+        db.commit()
+    print(f"Purged {removed} expired idempotency keys.")
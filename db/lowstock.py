@@ -0,0 +1,124 @@
+"""
+Low-stock reorder queue.
+
+A product is low when it has a `reorder_threshold` and its on-hand quantity (its Stock row,
+or 0 without one) is at or below it. `low_stock_queue` holds exactly the low products, kept
+up to date by every write that changes a Stock quantity or a threshold: it calls
+`record_levels` in its own transaction with the product's quantity before and after. So
+`GET /stock/low` reads as many rows as there are low products, however big the catalog is.
+Products that aren't low are deleted from the queue by primary key on every change, so a
+crossing missed along the way can't leave a stale row behind.
+
+Crossings (a product going low, or recovering) are published to `low_stock_events` once the
+transaction commits, for the `GET /stock/low/stream` server-sent events feed; a rollback
+publishes nothing. Rebuild the queue from scratch after writes that bypassed the endpoints:
+
+    python -m db.lowstock
+"""
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import delete, func, insert, literal, select
+from sqlalchemy.orm import Session
+
+from db.database import upsert_insert
+from web.broadcast import Broadcaster, broadcast_backend, publish_after_commit
+from models.userModels import LowStockQueue, Products, Stock
+
+LOW = "low"
+RECOVERED = "recovered"
+
+low_stock_events = Broadcaster(backend=broadcast_backend("low-stock"))
+
+
+def is_low(quantity: int, threshold: Optional[int]) -> bool:
+    return threshold is not None and quantity <= threshold
+
+
+def stock_level(product, before: int, after: int) -> dict:
+    """A level for `record_levels`: the product's (a `CachedProduct`) quantity went from `before` to `after`."""
+    return {
+        "product_id": product.Pro_id,
+        "product_name": product.product_name,
+        "threshold": product.reorder_threshold,
+        "quantity": after,
+        "was_low": is_low(before, product.reorder_threshold),
+    }
+
+
+def record_levels(db: Session, levels):
+    """
+    Bring the queue in line with `levels` (dicts like `stock_level` returns) and queue the
+    crossings for publishing after commit. At most one upsert and one delete; the caller commits.
+    """
+    low = []
+    not_low = []
+    crossings = []
+    for level in levels:
+        now_low = is_low(level["quantity"], level["threshold"])
+        if now_low:
+            low.append({"product_id": level["product_id"], "quantity": level["quantity"],
+                        "threshold": level["threshold"], "since": datetime.utcnow()})
+        else:
+            not_low.append(level["product_id"])
+        if now_low != level["was_low"]:
+            crossings.append({
+                "product_id": level["product_id"],
+                "product_name": level["product_name"],
+                "quantity": level["quantity"],
+                "threshold": level["threshold"],
+                "status": LOW if now_low else RECOVERED,
+            })
+
+    if low:
+        statement = upsert_insert(db, LowStockQueue)
+        statement = statement.on_conflict_do_update(
+            index_elements=[LowStockQueue.product_id],
+            set_={"quantity": statement.excluded.quantity, "threshold": statement.excluded.threshold},
+        )
+        db.execute(statement, low)
+    if not_low:
+        db.execute(
+            delete(LowStockQueue)
+            .where(LowStockQueue.product_id.in_(not_low))
+            .execution_options(synchronize_session=False)
+        )
+    if crossings:
+        publish_after_commit(db, low_stock_events, crossings)
+
+
+def forget(db: Session, product_id: int):
+    """Take a product off the queue, e.g. before deleting it. The caller commits."""
+    db.execute(
+        delete(LowStockQueue)
+        .where(LowStockQueue.product_id == product_id)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def rebuild(db) -> int:
+    """
+    Recompute the whole queue from Products and Stock; returns how many products are low.
+    `db` is a session or connection; the caller commits.
+    """
+    quantity = func.coalesce(func.sum(Stock.product_quantity), 0)
+    low = (
+        select(Products.Pro_id, quantity, Products.reorder_threshold, literal(datetime.utcnow()))
+        .outerjoin(Stock, Stock.product_id == Products.Pro_id)
+        .where(Products.reorder_threshold.is_not(None))
+        .group_by(Products.Pro_id, Products.reorder_threshold)
+        .having(quantity <= Products.reorder_threshold)
+    )
+    db.execute(delete(LowStockQueue).execution_options(synchronize_session=False))
+    db.execute(insert(LowStockQueue).from_select(["product_id", "quantity", "threshold", "since"], low))
+    return db.execute(select(func.count()).select_from(LowStockQueue)).scalar()
+
+
+if __name__ == "__main__":
+    from db.database import engine, SessionLocal
+
+    LowStockQueue.__table__.create(bind=engine, checkfirst=True)
+    with SessionLocal() as db:
+        count = rebuild(db)
+        db.commit()
+    print(f"{count} products at or below their reorder threshold.")
@@ -0,0 +1,99 @@
+import threading
+import time
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+# Upper bounds (seconds) of the checkout wait histogram buckets
+CHECKOUT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class PoolMetrics:
+    """Process-wide counters for connection pool checkouts."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.bucket_counts = [0] * (len(CHECKOUT_BUCKETS) + 1)  # last bucket is +Inf
+            self.checkouts = 0
+            self.wait_seconds_total = 0.0
+            self.overflow_events = 0
+            self.timeouts = 0
+
+    def observe(self, seconds: float):
+        with self._lock:
+            index = next((i for i, bound in enumerate(CHECKOUT_BUCKETS) if seconds <= bound), len(CHECKOUT_BUCKETS))
+            self.bucket_counts[index] += 1
+            self.checkouts += 1
+            self.wait_seconds_total += seconds
+
+    def observe_overflow(self):
+        with self._lock:
+            self.overflow_events += 1
+
+    def observe_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self, pools: dict) -> dict:
+        with self._lock:
+            buckets = {str(bound): count for bound, count in zip(CHECKOUT_BUCKETS, self.bucket_counts)}
+            buckets["+Inf"] = self.bucket_counts[-1]
+            return {
+                "checkouts": self.checkouts,
+                "checkout_wait_seconds_total": round(self.wait_seconds_total, 6),
+                "checkout_wait_histogram": buckets,
+                "overflow_events": self.overflow_events,
+                "timeouts": self.timeouts,
+                "pools": {name: pool_status(pool) for name, pool in pools.items()},
+            }
+
+
+pool_metrics = PoolMetrics()
+
+
+def pool_status(pool) -> dict:
+    return {
+        "size": pool.size(),
+        "in_use": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+    }
+
+
+class _CheckoutTimingMixin:
+    """
+    Times every checkout (including waiting for a free connection) into `pool_metrics`, and
+    counts each connection opened beyond `pool_size`.
+    """
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            pool_metrics.observe_timeout()
+            raise
+        pool_metrics.observe(time.perf_counter() - start)
+        return connection
+
+    def _inc_overflow(self):
+        # QueuePool's own reservation of a new connection, done here so the overflow it
+        # reaches is read under the same lock that other checkouts and returns change it under
+        with self._overflow_lock:
+            if -1 < self._max_overflow <= self._overflow:
+                return False
+            self._overflow += 1
+            if self._overflow > 0:
+                pool_metrics.observe_overflow()
+            return True
+
+
+class InstrumentedQueuePool(_CheckoutTimingMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_CheckoutTimingMixin, AsyncAdaptedQueuePool):
+    pass
@@ -0,0 +1,65 @@
+import base64
+import json
+from typing import Annotated, Optional
+from fastapi import Depends, HTTPException, Query, Response
+from sqlalchemy.engine import Row
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class PageParams:
+    """
+    Keyset pagination parameters shared by the list endpoints. Every list is paged, so no
+    request loads a whole table; clients follow `X-Next-Cursor` until it is absent.
+    - **after**: Opaque cursor returned in the `X-Next-Cursor` header of the previous page.
+    - **limit**: Number of rows per page (capped at MAX_PAGE_SIZE).
+    """
+
+    def __init__(
+        self,
+        after: Optional[str] = Query(None, description="Cursor from the previous page's X-Next-Cursor header"),
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Rows per page"),
+    ):
+        self.after = after
+        self.limit = limit
+
+
+page_dependency = Annotated[PageParams, Depends(PageParams)]
+
+
+def encode_cursor(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> int:
+    """The key a cursor from `encode_cursor` points past; anything else is a 400."""
+    try:
+        value = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        value = None
+    # Every paginated list is keyed on an integer primary key
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor.")
+    return value
+
+
+def _key_of(row, key_column):
+    # Rows of multi-entity queries carry the paginated entity first
+    entity = row[0] if isinstance(row, Row) else row
+    return getattr(entity, key_column.key)
+
+
+def paginate(query, key_column, page: PageParams, response: Response):
+    """
+    Return one page of `query`, seeking past the cursor on `key_column` instead of using OFFSET,
+    so every page costs one index range scan. Sets X-Next-Cursor when more rows remain.
+    """
+    if page.after:
+        query = query.filter(key_column > decode_cursor(page.after))
+    rows = query.order_by(key_column).limit(page.limit + 1).all()
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(_key_of(rows[-1], key_column))
+    return rows
@@ -0,0 +1,69 @@
+"""
+Background listener for a Redis pub/sub channel, shared by the Redis backends of the
+product catalog (db/catalog.py) and the event broadcaster.
+
+The channel is subscribed before the constructor returns, so nothing published afterwards
+is missed; a daemon thread then hands each message's data to `on_message`. If the
+connection drops, the thread logs it and resubscribes with exponential backoff, then calls
+`on_resubscribe` so the owner can make up for what it missed while disconnected. A message
+that `on_message` fails on is logged and skipped.
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+RETRY_INITIAL_SECONDS = 0.5
+RETRY_MAX_SECONDS = 30.0
+
+
+class RedisListener:
+    def __init__(self, client, channel: str, on_message, on_resubscribe=None,
+                 retry_initial: float = RETRY_INITIAL_SECONDS, retry_max: float = RETRY_MAX_SECONDS):
+        self.client = client
+        self.channel = channel
+        self.on_message = on_message
+        self.on_resubscribe = on_resubscribe
+        self.retry_initial = retry_initial
+        self.retry_max = retry_max
+        self._pubsub = self._subscribe()
+        self._thread = threading.Thread(target=self._run, name=f"redis-listener-{channel}", daemon=True)
+        self._thread.start()
+
+    def _subscribe(self):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.channel)
+        return pubsub
+
+    def _run(self):
+        delay = self.retry_initial
+        while True:
+            try:
+                if self._pubsub is None:
+                    self._pubsub = self._subscribe()
+                    logger.warning("Resubscribed to Redis channel %r", self.channel)
+                    if self.on_resubscribe is not None:
+                        self.on_resubscribe()
+                delay = self.retry_initial
+                for item in self._pubsub.listen():
+                    if item.get("type") != "message":
+                        continue
+                    try:
+                        self.on_message(item["data"])
+                    except Exception:
+                        logger.exception("Dropped a message on Redis channel %r", self.channel)
+                logger.warning("Redis channel %r stopped listening", self.channel)
+            except Exception:
+                logger.exception("Lost the Redis channel %r; resubscribing in %.1fs", self.channel, delay)
+            self._close()
+            time.sleep(delay)
+            delay = min(delay * 2, self.retry_max)
+
+    def _close(self):
+        pubsub, self._pubsub = self._pubsub, None
+        if pubsub is not None:
+            try:
+                pubsub.close()
+            except Exception:
+                pass
@@ -0,0 +1,127 @@
+"""
+The DailyProductSummary rollup: StockHistory totals per day and product.
+
+Stock movements call `record_movements` in the same transaction that writes their
+StockHistory rows, so the rollup commits or rolls back with them. `rebuild` recomputes
+the whole table from StockHistory, for backfilling an existing database or repairing it:
+
+    python -m db.rollup
+"""
+from sqlalchemy import select, func, case, cast, delete, insert, text, Date
+from sqlalchemy.orm import Session
+
+from db.database import upsert_insert
+from models.userModels import DailyProductSummary, StockHistory
+
+STOCK_OUT = "stock out"
+TOTALS = ("qty_in", "qty_out", "revenue", "cost")
+
+
+def period_start(column, period: str, dialect: str):
+    """SQL expression truncating a date/datetime column to the first day of its day, week (Monday) or month."""
+    if dialect == "postgresql":
+        return cast(func.date_trunc(period, column), Date)
+    # SQLite
+    if period == "week":
+        return func.date(column, "weekday 0", "-6 days")
+    if period == "month":
+        return func.date(column, "start of month")
+    return func.date(column)
+
+
+def record_movements(db: Session, histories: list):
+    """
+    Add StockHistory rows (as column value dicts, `date` included) to the rollup.
+    Stock-out rows carry their `cost_of_goods`, from the cost layers. Rows for the same day
+    and product are merged first, then applied with a single executemany upsert.
+    """
+    deltas = {}
+    for history in histories:
+        key = (history["date"].date(), history["product_id"])
+        delta = deltas.setdefault(key, dict.fromkeys(TOTALS, 0))
+        quantity = history["product_quantity"]
+        if history["stocktype"] == STOCK_OUT:
+            delta["qty_out"] += quantity
+            delta["revenue"] += history["total_price"]
+            delta["cost"] += history["cost_of_goods"]
+        else:
+            delta["qty_in"] += quantity
+    if not deltas:
+        return
+
+    statement = upsert_insert(db, DailyProductSummary)
+    statement = statement.on_conflict_do_update(
+        index_elements=[DailyProductSummary.day, DailyProductSummary.product_id],
+        set_={column: getattr(DailyProductSummary, column) + statement.excluded[column] for column in TOTALS},
+    )
+    db.execute(statement, [
+        {"day": day, "product_id": product_id, **delta} for (day, product_id), delta in deltas.items()
+    ])
+
+
+def rebuild(db: Session) -> int:
+    """
+    Replace the rollup with totals recomputed from StockHistory. Sales are costed at their
+    recorded cost of goods; sales from before cost layers have none and are costed at the price
+    of the product's latest delivery (any non stock-out entry) before them, which is what its
+    Stock row held at the time. Returns the number of summary rows written; the caller commits.
+    """
+    db.flush()
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        # Keep movements from landing between the delete and the insert
+        db.execute(text('LOCK TABLE "StockHistory" IN SHARE MODE'))
+
+    # Number each product's deliveries in order, so every sale falls in the group opened by
+    # the delivery before it; that delivery is the group's first row. Window functions keep
+    # this one pass over the history instead of a lookup per sale.
+    is_out = StockHistory.stocktype == STOCK_OUT
+    numbered = select(
+        StockHistory.stock_id,
+        StockHistory.product_id,
+        StockHistory.product_quantity,
+        StockHistory.total_price,
+        StockHistory.price_per_unit,
+        StockHistory.date,
+        StockHistory.cost_of_goods,
+        is_out.label("is_out"),
+        func.sum(case((is_out, 0), else_=1))
+        .over(partition_by=StockHistory.product_id, order_by=StockHistory.stock_id)
+        .label("delivery"),
+    ).where(StockHistory.date.isnot(None), StockHistory.product_id.isnot(None)).subquery()
+    priced = select(
+        numbered,
+        func.first_value(numbered.c.price_per_unit)
+        .over(partition_by=(numbered.c.product_id, numbered.c.delivery), order_by=numbered.c.stock_id)
+        .label("purchase_price"),
+    ).subquery()
+
+    sale = priced.c.is_out
+    day = period_start(priced.c.date, "day", dialect)
+    totals = (
+        select(
+            day,
+            priced.c.product_id,
+            func.coalesce(func.sum(case((sale, 0), else_=priced.c.product_quantity)), 0),
+            func.coalesce(func.sum(case((sale, priced.c.product_quantity), else_=0)), 0),
+            func.coalesce(func.sum(case((sale, priced.c.total_price))), 0),
+            func.coalesce(func.sum(case(
+                (sale & priced.c.cost_of_goods.isnot(None), priced.c.cost_of_goods),
+                (sale & (priced.c.delivery > 0), priced.c.product_quantity * priced.c.purchase_price),
+            )), 0),
+        )
+        .group_by(day, priced.c.product_id)
+    )
+
+    db.execute(delete(DailyProductSummary))
+    return db.execute(insert(DailyProductSummary).from_select(["day", "product_id", *TOTALS], totals)).rowcount
+
+
+if __name__ == "__main__":
+    from db.database import engine, SessionLocal
+
+    DailyProductSummary.__table__.create(bind=engine, checkfirst=True)
+    with SessionLocal() as db:
+        rows = rebuild(db)
+        db.commit()
+    print(f"Rebuilt daily_product_summary: {rows} rows.")
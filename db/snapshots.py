@@ -0,0 +1,114 @@
+"""
+Stock on hand at any point in time, from daily snapshots.
+
+A snapshot is every product's on-hand quantity at the close of a day (UTC); products with
+nothing on hand have no row. `on_hand(db, at)` starts from the latest snapshot before `at`'s
+day, adds the DailyProductSummary totals of any whole days since, then replays only the
+StockHistory rows of `at`'s own day up to `at`. With a snapshot taken every night, a query
+touches one snapshot and at most one day of movements, however long the history is.
+
+`compact` thins out old snapshots to the last one of each month, which bounds the table while
+still leaving at most a month of rollup rows to add for old dates. Run both from cron:
+
+    python -m db.snapshots            # snapshot yesterday, then compact
+    python -m db.snapshots 2024-05-31 # snapshot a given day
+
+Quantities set directly on Stock rows (PATCH /stock/in/{id}) leave no StockHistory and are
+not seen here. Take snapshots again after `python -m db.rollup` rebuilds the rollup.
+"""
+import os
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import select, func, case, delete, insert, or_, union_all
+from sqlalchemy.orm import Session
+
+from db.rollup import STOCK_OUT, period_start
+from models.userModels import DailyProductSummary, StockHistory, StockSnapshot
+
+# Days of daily snapshots `compact` keeps; older ones are thinned to one per month
+SNAPSHOT_KEEP_DAYS = int(os.getenv("SNAPSHOT_KEEP_DAYS", "62"))
+
+
+def on_hand(db: Session, at: datetime, product_id: int = None) -> dict:
+    """On-hand quantity per product just before `at` (naive UTC), for products with stock; one statement."""
+    day = at.date()
+    checkpoint = select(func.max(StockSnapshot.day)).where(StockSnapshot.day < day).scalar_subquery()
+
+    snapshot = select(StockSnapshot.product_id, StockSnapshot.quantity.label("quantity")).where(
+        StockSnapshot.day == checkpoint
+    )
+    whole_days = select(
+        DailyProductSummary.product_id,
+        (DailyProductSummary.qty_in - DailyProductSummary.qty_out).label("quantity"),
+    ).where(
+        or_(checkpoint.is_(None), DailyProductSummary.day > checkpoint),
+        DailyProductSummary.day < day,
+    )
+    same_day = select(
+        StockHistory.product_id,
+        case(
+            (StockHistory.stocktype == STOCK_OUT, -StockHistory.product_quantity),
+            else_=StockHistory.product_quantity,
+        ).label("quantity"),
+    ).where(StockHistory.date >= datetime.combine(day, time()), StockHistory.date < at)
+    if product_id is not None:
+        snapshot = snapshot.where(StockSnapshot.product_id == product_id)
+        whole_days = whole_days.where(DailyProductSummary.product_id == product_id)
+        same_day = same_day.where(StockHistory.product_id == product_id)
+
+    movements = union_all(snapshot, whole_days, same_day).subquery()
+    quantity = func.sum(movements.c.quantity)
+    rows = db.execute(
+        select(movements.c.product_id, quantity)
+        .where(movements.c.product_id.isnot(None))
+        .group_by(movements.c.product_id)
+        .having(quantity != 0)
+        .order_by(movements.c.product_id)
+    )
+    return {product: int(total) for product, total in rows}
+
+
+def take_snapshot(db: Session, day: date) -> int:
+    """Store every product's quantity at the close of `day`, replacing any earlier snapshot of it. The caller commits."""
+    # Dropped first, so the day is recomputed from the snapshot before it
+    db.execute(delete(StockSnapshot).where(StockSnapshot.day == day))
+    quantities = on_hand(db, datetime.combine(day + timedelta(days=1), time()))
+    if quantities:
+        db.execute(insert(StockSnapshot), [
+            {"day": day, "product_id": product_id, "quantity": quantity}
+            for product_id, quantity in quantities.items()
+        ])
+    return len(quantities)
+
+
+def compact(db: Session, keep_days: int = SNAPSHOT_KEEP_DAYS, today: date = None) -> int:
+    """
+    Delete snapshots older than `keep_days`, except the last one of each month.
+    Returns the number of rows deleted; the caller commits.
+    """
+    cutoff = (today or datetime.utcnow().date()) - timedelta(days=keep_days)
+    month = period_start(StockSnapshot.day, "month", db.get_bind().dialect.name)
+    month_ends = (
+        select(func.max(StockSnapshot.day))
+        .where(StockSnapshot.day < cutoff)
+        .group_by(month)
+    )
+    return db.execute(
+        delete(StockSnapshot)
+        .where(StockSnapshot.day < cutoff, StockSnapshot.day.not_in(month_ends))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+
+if __name__ == "__main__":
+    import sys
+
+    from db.database import engine, SessionLocal
+
+    StockSnapshot.__table__.create(bind=engine, checkfirst=True)
+    day = date.fromisoformat(sys.argv[1]) if len(sys.argv) > 1 else datetime.utcnow().date() - timedelta(days=1)
+    with SessionLocal() as db:
+        products = take_snapshot(db, day)
+        removed = compact(db)
+        db.commit()
+    print(f"Snapshot of {day}: {products} products; compacted {removed} old rows.")
@@ -0,0 +1,83 @@
+"""
+Per-table write counters for conditional GETs.
+
+Every session commit that wrote to one of VERSIONED_TABLES, whether through the unit of
+work or through Core insert/update/delete statements, bumps that table's row in
+`table_versions` inside the same transaction. List endpoints build their ETag from these
+counters and the page parameters, so answering `If-None-Match` costs one primary-key read
+instead of running and serializing the list query.
+
+A counter, unlike a timestamp or a row count, changes with every commit whatever order
+overlapping transactions commit in, and a delete plus an insert can't cancel out. The bump
+is the last statement before COMMIT, so its row lock is only held while the commit runs.
+"""
+import hashlib
+from itertools import chain
+from typing import Optional
+
+from fastapi import Request
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from db.database import upsert_insert
+from models.userModels import TableVersion
+
+VERSIONED_TABLES = {"products", "stock"}
+
+_CHANGED = "changed_tables"  # session.info key
+
+
+@event.listens_for(Session, "after_flush")
+def _track_flush(session, flush_context):
+    changed = session.info.setdefault(_CHANGED, set())
+    for instance in chain(session.new, session.dirty, session.deleted):
+        table = getattr(instance, "__tablename__", None)
+        if table in VERSIONED_TABLES:
+            changed.add(table)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_statement(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, "table", None)
+        if table is not None and table.name in VERSIONED_TABLES:
+            orm_execute_state.session.info.setdefault(_CHANGED, set()).add(table.name)
+
+
+@event.listens_for(Session, "before_commit")
+def _bump_versions(session):
+    session.flush()  # commit's own flush comes after this hook
+    changed = session.info.pop(_CHANGED, None)
+    if not changed:
+        return
+    statement = upsert_insert(session, TableVersion)
+    statement = statement.on_conflict_do_update(
+        index_elements=[TableVersion.table_name],
+        set_={"version": TableVersion.version + 1},
+    )
+    # Sorted, so concurrent writers take the row locks in the same order
+    session.execute(statement, [{"table_name": table, "version": 1} for table in sorted(changed)])
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changes(session):
+    session.info.pop(_CHANGED, None)
+
+
+def table_etag(db: Session, tables, *params) -> str:
+    """Strong ETag for a response built from `tables` and the request parameters `params`."""
+    versions = dict(db.execute(
+        select(TableVersion.table_name, TableVersion.version).where(TableVersion.table_name.in_(tables))
+    ).all())
+    digest = hashlib.sha1(repr(params).encode()).hexdigest()[:12]
+    return '"' + ".".join(str(versions.get(table, 0)) for table in tables) + f'-{digest}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether the request's If-None-Match already names `etag` (weak comparison, as RFC 9110 asks)."""
+    header: Optional[str] = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(candidate.strip().removeprefix("W/") == etag for candidate in header.split(","))
@@ -1,14 +1,23 @@
+import os
 from enum import Enum
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from typing import Optional
-from Endpoints import auth,stock,stockIn,stockOut,Balance,transctions
+from Endpoints import auth,stock,stockIn,stockOut,stockLevels,feed,Balance,transctions,export,metrics,reports,counts
+from db.pagination import NEXT_CURSOR_HEADER
+from db.idempotency import REPLAYED_HEADER
+from web.fastjson import enable_fast_json
+from web.compression import CompressionMiddleware
 
 app = FastAPI(
     title="Ozone Milk Api Documentation",  # Replace with your desired title
     description="Stock Management",
 )
 
+# Opt-in: serialize responses with orjson, trimming to the response models without validating every row
+if os.getenv("FAST_JSON", "false").lower() in ("1", "true", "yes"):
+    enable_fast_json()
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -16,6 +25,16 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Adjust this to the specific methods you want to allow (e.g., ["GET", "POST"])
     allow_headers=["*"],  # Adjust this to the specific headers you want to allow (e.g., ["Content-Type", "Authorization"])
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag", REPLAYED_HEADER],  # Let browser clients read the pagination cursor, ETag and replay flag
+)
+
+# Compress large JSON lists and exports for clients that accept it; streamed exports stay streamed.
+# COMPRESSION_ENCODINGS in preference order (zstd / br only when installed), empty to turn it off
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.getenv("COMPRESSION_MIN_SIZE", "1024")),
+    encodings=[encoding.strip() for encoding in os.getenv("COMPRESSION_ENCODINGS", "zstd,br,gzip").split(",") if encoding.strip()],
+    levels={"gzip": int(os.getenv("GZIP_LEVEL", "6")), "br": int(os.getenv("BROTLI_QUALITY", "4")), "zstd": int(os.getenv("ZSTD_LEVEL", "3"))},
 )
 
 # Include the routers from auth, apis, and otp
@@ -24,4 +43,10 @@ app.include_router(Balance.router)
 app.include_router(stock.router)
 app.include_router(stockIn.router)
 app.include_router(stockOut.router)
+app.include_router(stockLevels.router)
+app.include_router(feed.router)
 app.include_router(transctions.router)
+app.include_router(export.router)
+app.include_router(reports.router)
+app.include_router(counts.router)
+app.include_router(metrics.router)
@@ -0,0 +1,47 @@
+"""
+Add cost layers to an existing database (Postgres or SQLite).
+New databases already get them from `Base.metadata.create_all`.
+
+    python -m migrations.cost_layers
+
+- creates the cost_layers table
+- adds the cost_of_goods column to stockOut and StockHistory; sales recorded before it keep
+  NULL until migrations.cost_of_goods_backfill costs them at the product's purchase price
+- opens one layer per product in stock, for what its Stock row holds, at the row's price per unit
+"""
+from datetime import datetime
+
+from sqlalchemy import inspect, insert, select
+
+from db.database import engine
+from models.userModels import CostLayer, Stock, StockHistory, StockOut
+
+
+def upgrade(connection):
+    CostLayer.__table__.create(bind=connection, checkfirst=True)
+
+    inspector = inspect(connection)
+    for model in (StockOut, StockHistory):
+        table = model.__table__
+        if "cost_of_goods" not in {column["name"] for column in inspector.get_columns(table.name)}:
+            connection.exec_driver_sql(f'ALTER TABLE "{table.name}" ADD COLUMN cost_of_goods NUMERIC(14, 2)')
+            print(f"{table.name}.cost_of_goods added")
+
+    layered = select(CostLayer.product_id).where(CostLayer.remaining > 0)
+    opening = connection.execute(
+        select(Stock.product_id, Stock.product_quantity, Stock.price_per_unit)
+        .where(Stock.product_quantity > 0, Stock.product_id.not_in(layered))
+    ).all()
+    if opening:
+        now = datetime.utcnow()
+        connection.execute(insert(CostLayer), [
+            {"product_id": product_id, "received_at": now, "quantity": quantity, "remaining": quantity,
+             "unit_cost": price_per_unit}
+            for product_id, quantity, price_per_unit in opening
+        ])
+    print(f"Opened {len(opening)} cost layers from current stock.")
+
+
+if __name__ == "__main__":
+    with engine.begin() as connection:
+        upgrade(connection)
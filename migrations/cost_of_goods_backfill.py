@@ -0,0 +1,50 @@
+"""
+Record a cost of goods on the sales from before cost layers (Postgres or SQLite), so the stock
+out lists read it from the row instead of looking up a purchase price on every request.
+
+    python -m migrations.cost_of_goods_backfill
+
+Run after migrations.cost_layers. Sales with no cost_of_goods, in stockOut and StockHistory,
+get their quantity times the product's purchase price, the price of its first StockHistory
+row, which is what the lists costed them at until now. Sales of products with no history
+are left NULL. Safe to run again.
+"""
+from sqlalchemy import func, select, update
+
+from db.database import engine
+from db.rollup import STOCK_OUT
+from models.userModels import StockHistory, StockOut
+
+
+def _purchase_prices():
+    """Purchase price per product, the price of its first StockHistory row."""
+    history = StockHistory.__table__.alias("history")  # apart from the StockHistory rows being updated
+    first_entry = (
+        select(history.c.product_id, func.min(history.c.stock_id).label("first_id"))
+        .group_by(history.c.product_id)
+        .subquery("first_entry")
+    )
+    first = StockHistory.__table__.alias("first_history")
+    return (
+        select(first.c.product_id, first.c.price_per_unit.label("purchase_price"))
+        .join(first_entry, first.c.stock_id == first_entry.c.first_id)
+        .subquery("purchase")
+    )
+
+
+def upgrade(connection):
+    purchase = _purchase_prices()
+    for model, criteria in ((StockOut, ()), (StockHistory, (StockHistory.stocktype == STOCK_OUT,))):
+        result = connection.execute(
+            update(model)
+            .where(model.cost_of_goods.is_(None), model.product_id.in_(select(purchase.c.product_id)), *criteria)
+            .values(cost_of_goods=model.product_quantity * (
+                select(purchase.c.purchase_price).where(purchase.c.product_id == model.product_id).scalar_subquery()
+            ))
+        )
+        print(f"{model.__tablename__}: {result.rowcount} sales costed at their purchase price.")
+
+
+if __name__ == "__main__":
+    with engine.begin() as connection:
+        upgrade(connection)
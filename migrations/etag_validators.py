@@ -0,0 +1,30 @@
+"""
+Add the table_versions counters behind the list ETags to an existing database (Postgres or SQLite).
+New databases already get the table from `Base.metadata.create_all`.
+
+    python -m migrations.etag_validators
+
+- creates the table_versions table; a table with no row counts as version 0 until its first write
+- drops the products and stock updated_at columns, if an earlier version of this migration added them
+"""
+from sqlalchemy import inspect
+
+from db.database import engine
+from models.userModels import Products, Stock, TableVersion
+
+
+def upgrade(connection):
+    TableVersion.__table__.create(bind=connection, checkfirst=True)
+
+    inspector = inspect(connection)
+    for model in (Products, Stock):
+        table = model.__table__
+        if "updated_at" in {column["name"] for column in inspector.get_columns(table.name)}:
+            connection.exec_driver_sql(f'DROP INDEX IF EXISTS "ix_{table.name}_updated_at"')
+            connection.exec_driver_sql(f'ALTER TABLE "{table.name}" DROP COLUMN updated_at')
+            print(f"{table.name}.updated_at dropped")
+
+
+if __name__ == "__main__":
+    with engine.begin() as connection:
+        upgrade(connection)
@@ -0,0 +1,30 @@
+"""
+Add reorder thresholds and the low-stock queue to an existing database (Postgres or SQLite).
+New databases already get them from `Base.metadata.create_all`.
+
+    python -m migrations.low_stock
+
+- adds the nullable products.reorder_threshold column; no product has a threshold until one is set
+- creates the low_stock_queue table and fills it from the current thresholds and stock
+"""
+from sqlalchemy import inspect
+
+from db.database import engine
+from db.lowstock import rebuild
+from models.userModels import LowStockQueue, Products
+
+
+def upgrade(connection):
+    table = Products.__table__
+    if "reorder_threshold" not in {column["name"] for column in inspect(connection).get_columns(table.name)}:
+        connection.exec_driver_sql(f'ALTER TABLE "{table.name}" ADD COLUMN reorder_threshold INTEGER')
+        print(f"{table.name}.reorder_threshold added")
+    LowStockQueue.__table__.create(bind=connection, checkfirst=True)
+
+    count = rebuild(connection)
+    print(f"{count} products at or below their reorder threshold.")
+
+
+if __name__ == "__main__":
+    with engine.begin() as connection:
+        upgrade(connection)
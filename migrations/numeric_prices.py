@@ -0,0 +1,65 @@
+"""
+Convert the price and total columns from VARCHAR(255) to NUMERIC on an existing Postgres database.
+New databases already get NUMERIC columns from `Base.metadata.create_all`.
+
+    python -m migrations.numeric_prices
+
+Rows whose text isn't a plain number are listed and nothing is changed, so they can be fixed by
+hand first. Empty strings (the old products.product_price default) become NULL.
+"""
+from sqlalchemy import text
+from db.database import engine
+
+# table -> {column: new type}
+COLUMNS = {
+    "products": {"product_price": "NUMERIC(12, 2)"},
+    "stock": {"price_per_unit": "NUMERIC(12, 2)", "total_price": "NUMERIC(14, 2)"},
+    "StockHistory": {"price_per_unit": "NUMERIC(12, 2)", "total_price": "NUMERIC(14, 2)"},
+    "stockOut": {"price_per_unit": "NUMERIC(12, 2)", "total_price": "NUMERIC(14, 2)"},
+}
+
+NUMBER_PATTERN = r"^\s*-?[0-9]+(\.[0-9]+)?\s*$"
+
+
+def _text_columns(connection):
+    rows = connection.execute(text(
+        "SELECT table_name, column_name FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND data_type = 'character varying'"
+    ))
+    return {(table, column) for table, column in rows}
+
+
+def upgrade(connection):
+    pending = _text_columns(connection)
+    todo = [(table, column, type_) for table, columns in COLUMNS.items()
+            for column, type_ in columns.items() if (table, column) in pending]
+    if not todo:
+        print("Price columns are already numeric.")
+        return
+
+    invalid = 0
+    for table, column, _ in todo:
+        bad = connection.execute(text(
+            f'SELECT {column} FROM "{table}" '
+            f"WHERE NULLIF(btrim({column}), '') IS NOT NULL AND {column} !~ :pattern LIMIT 20"
+        ), {"pattern": NUMBER_PATTERN}).scalars().all()
+        if bad:
+            invalid += len(bad)
+            print(f"{table}.{column}: non-numeric values {bad}")
+    if invalid:
+        raise SystemExit("Fix the values above and run the migration again; nothing was changed.")
+
+    for table, column, type_ in todo:
+        connection.execute(text(f'ALTER TABLE "{table}" ALTER COLUMN {column} DROP DEFAULT'))
+        connection.execute(text(
+            f'ALTER TABLE "{table}" ALTER COLUMN {column} TYPE {type_} '
+            f"USING NULLIF(btrim({column}), '')::numeric"
+        ))
+        print(f"{table}.{column} -> {type_}")
+
+
+if __name__ == "__main__":
+    if engine.dialect.name != "postgresql":
+        raise SystemExit("This migration targets Postgres; recreate local SQLite databases instead.")
+    with engine.begin() as connection:
+        upgrade(connection)
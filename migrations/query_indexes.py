@@ -0,0 +1,76 @@
+"""
+Add the indexes the endpoints' queries need to an existing database (Postgres or SQLite).
+New databases already get them from `Base.metadata.create_all`.
+
+    python -m migrations.query_indexes
+
+- StockHistory (product_id, date), replacing the product_id-only index it starts with
+- stockOut.date, transactions.date and balances (balance_type, date)
+- a unique stock.product_id: if a product has several stock rows they are listed and
+  nothing is changed, so they can be merged by hand first.
+
+Each CREATE INDEX blocks writes to its table while it runs.
+"""
+from sqlalchemy import func, inspect, select
+
+from db.database import engine
+from models.userModels import Balance, Stock, StockHistory, StockOut, Transaction
+
+# Indexes this migration adds, from the models
+TABLES = [StockHistory, StockOut, Transaction, Balance, Stock]
+INDEXES = {
+    "ix_StockHistory_product_id_date",
+    "ix_stockOut_date",
+    "ix_transactions_date",
+    "ix_balances_balance_type_date",
+    "ix_stock_product_id",
+}
+
+# Superseded by the indexes above
+DROPPED = {"StockHistory": ["ix_StockHistory_product_id"]}
+
+
+def _duplicate_stock_rows(connection):
+    return connection.execute(
+        select(Stock.product_id, func.count())
+        .group_by(Stock.product_id)
+        .having(func.count() > 1)
+        .limit(20)
+    ).all()
+
+
+def upgrade(connection):
+    duplicates = _duplicate_stock_rows(connection)
+    if duplicates:
+        for product_id, rows in duplicates:
+            print(f"stock: product {product_id} has {rows} rows")
+        raise SystemExit("Merge the stock rows above and run the migration again; nothing was changed.")
+
+    inspector = inspect(connection)
+    changed = False
+    for model in TABLES:
+        table = model.__table__
+        existing = {index["name"]: index for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in INDEXES:
+                continue
+            current = existing.get(index.name)
+            if current is not None and bool(current["unique"]) == bool(index.unique):
+                continue
+            if current is not None:
+                index.drop(connection)  # same name, but not unique yet
+            index.create(connection)
+            print(f"created {index.name}")
+            changed = True
+        for name in DROPPED.get(table.name, ()):
+            if name in existing:
+                connection.exec_driver_sql(f'DROP INDEX "{name}"')
+                print(f"dropped {name}")
+                changed = True
+    if not changed:
+        print("Indexes are already up to date.")
+
+
+if __name__ == "__main__":
+    with engine.begin() as connection:
+        upgrade(connection)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String,Text, Boolean, Float, Date, ForeignKey,DateTime,ARRAY
+from sqlalchemy import Column, Integer, String,Text, Boolean, Float, Date, ForeignKey,DateTime,ARRAY, Numeric, Index, text
 from db.database import Base
 from datetime import date
 from datetime import datetime
@@ -14,40 +14,107 @@ class Products(Base):
     Pro_id = Column(Integer, primary_key=True, index=True)
     product_name = Column(String(255), unique=True, nullable=False, default="")  # Non-nullable for uniqueness
     product_type = Column(String(255), nullable=False, default="")  # Non-nullable for uniqueness
-    product_price = Column(String(255),  nullable=True, default="")  # Non-nullable for uniqueness
+    product_price = Column(Numeric(12, 2),  nullable=True)
     date = Column(String(255),  nullable=True, default="")  # Non-nullable for uniqueness
+    reorder_threshold = Column(Integer, nullable=True)  # Low stock at or below this quantity; NULL for no alerts
     
 class Stock(Base):
     __tablename__ = "stock"
     stock_id = Column(Integer, primary_key=True, index=True)
-    product_id = Column(Integer, ForeignKey("products.Pro_id"), index=True)  # Corrected foreign key reference
+    product_id = Column(Integer, ForeignKey("products.Pro_id"), unique=True, index=True)  # One stock row per product
     product_quantity = Column(Integer, nullable=False)  # Quantity should be an integer, not a string
-    price_per_unit = Column(String(255), nullable=False)  
-    total_price = Column(String(255), nullable=True)  # Changed field name to lowercase
+    price_per_unit = Column(Numeric(12, 2), nullable=False)
+    total_price = Column(Numeric(14, 2), nullable=True)  # Changed field name to lowercase
     date = Column(Date, nullable=True)
     
 class StockHistory(Base):
     __tablename__ = "StockHistory"
+    # Per-product lookups and exports filter by product, then by date
+    __table_args__ = (Index("ix_StockHistory_product_id_date", "product_id", "date"),)
     stock_id = Column(Integer, primary_key=True, index=True)
-    product_id = Column(Integer, ForeignKey("products.Pro_id"), index=True)  # Corrected foreign key reference
+    product_id = Column(Integer, ForeignKey("products.Pro_id"))  # Corrected foreign key reference
     product_quantity = Column(Integer, nullable=False)  # Quantity should be an integer, not a string
-    price_per_unit = Column(String(255), nullable=False)  
-    total_price = Column(String(255), nullable=True)  # Changed field name to lowercase
+    price_per_unit = Column(Numeric(12, 2), nullable=False)
+    total_price = Column(Numeric(14, 2), nullable=True)  # Changed field name to lowercase
     stocktype = Column(String(255), nullable=True)   
     date = Column(DateTime, default=datetime.utcnow, index=True)
+    cost_of_goods = Column(Numeric(14, 2), nullable=True)  # Stock out rows: cost of the units sold, from the cost layers
     
 class StockOut(Base):
     __tablename__ = "stockOut"
     stock_id = Column(Integer, primary_key=True, index=True)
     product_id = Column(Integer, ForeignKey("products.Pro_id"), index=True)  # Corrected foreign key reference
     product_quantity = Column(Integer, nullable=False)  # Quantity should be an integer, not a string
-    price_per_unit = Column(String(255), nullable=False)  
-    total_price = Column(String(255), nullable=True)  # Changed field name to lowercase
-    date = Column(Date, nullable=True)
+    price_per_unit = Column(Numeric(12, 2), nullable=False)
+    total_price = Column(Numeric(14, 2), nullable=True)  # Changed field name to lowercase
+    date = Column(Date, nullable=True, index=True)
+    cost_of_goods = Column(Numeric(14, 2), nullable=True)  # Cost of the units sold, from the cost layers
+    
+
+class CostLayer(Base):
+    """A delivered lot of a product; sales consume what remains of it, see db/costing.py."""
+    __tablename__ = "cost_layers"
+    # Open layers of a product in receipt order; exhausted layers drop out of the index
+    __table_args__ = (
+        Index("ix_cost_layers_open", "product_id", "layer_id",
+              postgresql_where=text("remaining > 0"), sqlite_where=text("remaining > 0")),
+    )
+    layer_id = Column(Integer, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.Pro_id"), nullable=False)
+    received_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    quantity = Column(Integer, nullable=False)  # Units received
+    remaining = Column(Integer, nullable=False)  # Units not sold yet
+    unit_cost = Column(Numeric(14, 4), nullable=False)
+
+
+class DailyProductSummary(Base):
+    """Per day and product totals of StockHistory, kept up to date by db/rollup.py."""
+    __tablename__ = "daily_product_summary"
+    day = Column(Date, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.Pro_id"), primary_key=True)
+    qty_in = Column(Integer, nullable=False, default=0)
+    qty_out = Column(Integer, nullable=False, default=0)
+    revenue = Column(Numeric(14, 2), nullable=False, default=0)  # Sales value of qty_out
+    cost = Column(Numeric(14, 2), nullable=False, default=0)  # Purchase value of qty_out
     
     
+class StockSnapshot(Base):
+    """On-hand quantity per product at the close of a day (UTC), taken by db/snapshots.py."""
+    __tablename__ = "stock_snapshots"
+    day = Column(Date, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.Pro_id"), primary_key=True)
+    quantity = Column(Integer, nullable=False)
+
+
+class TableVersion(Base):
+    """Write counter per table, bumped on commit by db/versions.py; the list endpoints' ETags use it."""
+    __tablename__ = "table_versions"
+    table_name = Column(String(64), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+class LowStockQueue(Base):
+    """Products at or below their reorder threshold, kept up to date by db/lowstock.py."""
+    __tablename__ = "low_stock_queue"
+    product_id = Column(Integer, ForeignKey("products.Pro_id"), primary_key=True)
+    quantity = Column(Integer, nullable=False)
+    threshold = Column(Integer, nullable=False)
+    since = Column(DateTime, nullable=False, default=datetime.utcnow)  # When it went low
+
+
+class IdempotencyKey(Base):
+    """Response of a write request sent with an Idempotency-Key, replayed to its retries; see db/idempotency.py."""
+    __tablename__ = "idempotency_keys"
+    key = Column(String(64), primary_key=True)  # sha256 of the user, endpoint and header value
+    request_hash = Column(String(64), nullable=False)  # sha256 of the request body
+    response = Column(Text, nullable=True)  # JSON; written in the transaction that claims the key
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
 class Balance(Base):
     __tablename__ = "balances"
+    # The latest balance of a type: filtered by type, ordered by date
+    __table_args__ = (Index("ix_balances_balance_type_date", "balance_type", "date"),)
     id = Column(Integer, primary_key=True, index=True)
     balance_type = Column(String, nullable=False)  # "opening" or "closing"
     date = Column(Date, nullable=True)
@@ -62,4 +129,4 @@ class Transaction(Base):
     description = Column(String)
     amount = Column(Float)
     type = Column(String)
-    date = Column(Date)
\ No newline at end of file
+    date = Column(Date, index=True)
\ No newline at end of file
@@ -1,12 +1,13 @@
 from pydantic import BaseModel, Field, conint, condecimal
 from typing import Optional
+from decimal import Decimal
 from datetime import date
 
 class StockCreateSchema(BaseModel):
     product_id: int
     product_quantity: Optional[int]
-    price_per_unit: float
-    total_price: Optional[float]
+    price_per_unit: Decimal
+    total_price: Optional[Decimal]
     date: Optional[date]
 
     class Config:
@@ -14,8 +15,8 @@ class StockCreateSchema(BaseModel):
 
 class StockUpdateSchema(BaseModel):
     product_quantity: Optional[conint(ge=0)] = None
-    price_per_unit: Optional[float] = None
-    total_price: Optional[float] = None
+    price_per_unit: Optional[Decimal] = None
+    total_price: Optional[Decimal] = None
     date: Optional[date]
 
     class Config:
@@ -25,8 +26,8 @@ class StockResponseSchema(BaseModel):
     stock_id: int
     product_id: int
     product_quantity: int
-    price_per_unit: str
-    total_price: Optional[str]
+    price_per_unit: float
+    total_price: Optional[float]
     date: Optional[date]
     product_name: str  # Included product name
     product_type: str  # Included product type
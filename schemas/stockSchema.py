@@ -1,12 +1,14 @@
 from pydantic import BaseModel, Field, constr, condecimal
 from typing import Optional
+from decimal import Decimal
 
 # Schema for creating a new product
 class ProductCreateSchema(BaseModel):
     product_name: Optional[str] = None
     product_type:  Optional[str] = None
-    product_price: Optional[str] = None  # Example for price validation
+    product_price: Optional[Decimal] = None
     date: Optional[str] = None
+    reorder_threshold: Optional[int] = Field(None, ge=0)
 
     class Config:
         orm_mode = True
@@ -15,8 +17,9 @@ class ProductCreateSchema(BaseModel):
 class ProductUpdateSchema(BaseModel):
     product_name: Optional[str] = None
     product_type:  Optional[str] = None
-    product_price: Optional[str] = None
+    product_price: Optional[Decimal] = None
     date:  Optional[str] = None
+    reorder_threshold: Optional[int] = Field(None, ge=0)  # null removes the threshold
 
     class Config:
         orm_mode = True
@@ -26,8 +29,9 @@ class ProductResponseSchema(BaseModel):
     Pro_id: Optional[int] =None
     product_name:  Optional[str] = None
     product_type:  Optional[str] = None
-    product_price:  Optional[str] = None
+    product_price:  Optional[float] = None
     date:  Optional[str] = None
+    reorder_threshold: Optional[int] = None
 
     class Config:
         orm_mode = True
@@ -0,0 +1,88 @@
+import os
+import tempfile
+
+# Point the app at a throwaway SQLite database before anything imports db.database
+_TEST_DB_DIR = tempfile.mkdtemp(prefix="ozone-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TEST_DB_DIR, 'test.db')}"
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from db.catalog import product_catalog
+from db.database import engine, async_engine, SessionLocal
+from models.userModels import Base, Products, Stock
+from Endpoints.auth import get_current_user
+from main import app
+
+
+@pytest.fixture(autouse=True)
+def reset_database():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    product_catalog.clear()
+    yield
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def stock_line():
+    """Builds the body of a stock line, as the stock in and stock out endpoints take it."""
+    def build(product_id, quantity, price=400, date=None):
+        return {"product_id": product_id, "product_quantity": quantity, "price_per_unit": price,
+                "total_price": None, "date": date}
+    return build
+
+
+@pytest.fixture
+def seed_products(db):
+    """
+    Adds products 1 to `count`, named "Milk <n>", and for each product in `stock`
+    ({product_id: quantity}) a Stock row at 400 a unit.
+    """
+    def seed(count=1, stock=None):
+        db.add_all(Products(Pro_id=n, product_name=f"Milk {n}", product_type="milk", product_price="500")
+                   for n in range(1, count + 1))
+        db.add_all(Stock(product_id=product_id, product_quantity=quantity, price_per_unit="400",
+                         total_price=str(400 * quantity))
+                   for product_id, quantity in (stock or {}).items())
+        db.commit()
+    return seed
+
+
+@pytest.fixture
+def client():
+    app.dependency_overrides[get_current_user] = lambda: {"username": "tester", "user_id": 1}
+    with TestClient(app) as test_client:
+        yield test_client
+    app.dependency_overrides.clear()
+
+
+class StatementCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args, **kwargs):
+        self.count += 1
+
+
+@pytest.fixture
+def count_statements():
+    """Count the SQL statements sent to the database while the fixture is active."""
+    counter = StatementCounter()
+    engines = [engine] + ([async_engine.sync_engine] if async_engine else [])
+    for target in engines:
+        event.listen(target, "before_cursor_execute", counter)
+    yield counter
+    for target in engines:
+        event.remove(target, "before_cursor_execute", counter)
@@ -0,0 +1,55 @@
+import pytest
+from fastapi import HTTPException
+
+from Endpoints import auth
+from models.userModels import Products
+from schemas.schemas import CreateUserRequest
+
+
+def test_taken_username_is_rejected_without_hashing(client, monkeypatch):
+    client.post("/auth/register", json={"username": "cashier", "password": "s3cret"})
+    monkeypatch.setattr(auth.bcrypt_context, "hash", lambda password: pytest.fail("hashed a taken username"))
+
+    response = client.post("/auth/register", json={"username": "cashier", "password": "other"})
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Username Is Taken"
+
+
+def test_register_then_login(client):
+    response = client.post("/auth/register", json={"username": "cashier", "password": "s3cret"})
+    assert response.status_code == 201
+
+    response = client.post("/auth/login", json={"username": "cashier", "password": "s3cret"})
+    assert response.status_code == 200
+    assert response.json()["UserInfo"] == {"username": "cashier"}
+    assert response.json()["access_token"]
+
+
+def test_login_rejects_wrong_password(client):
+    client.post("/auth/register", json={"username": "cashier", "password": "s3cret"})
+
+    response = client.post("/auth/login", json={"username": "cashier", "password": "wrong"})
+
+    assert response.status_code == 401
+
+
+def test_name_taken_during_the_hash_is_a_400(client, db):
+    client.post("/auth/register", json={"username": "cashier", "password": "s3cret"})
+
+    with pytest.raises(HTTPException) as error:
+        auth._register_user(db, CreateUserRequest(username="cashier", password="other"), "hash")
+
+    assert error.value.status_code == 400
+
+
+def test_user_lookup_leaves_the_request_session_open(client, db):
+    client.post("/auth/register", json={"username": "cashier", "password": "s3cret"})
+    product = Products(product_name="Milk", product_type="milk", product_price="500")
+    db.add(product)
+    db.commit()
+
+    user = auth._find_user(db, "cashier")
+
+    assert user.password and user not in db  # detached with its columns loaded
+    assert product in db  # the rest of the request's session is untouched
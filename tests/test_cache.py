@@ -0,0 +1,42 @@
+import asyncio
+import time
+from datetime import timedelta
+
+from db.cache import TTLCache
+from Endpoints.auth import create_access_token, get_current_user, token_cache
+
+
+def test_lru_eviction_keeps_most_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    assert cache.stats()["hits"] == 3
+
+
+def test_entries_expire_after_their_ttl():
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("short", 1, ttl=0.01)
+    cache.set("long", 2)
+    time.sleep(0.02)
+
+    assert cache.get("short") is None
+    assert cache.get("long") == 2
+
+
+def test_verified_tokens_are_served_from_cache():
+    token_cache.clear()
+    token = create_access_token("cashier", 7, timedelta(minutes=5))
+    misses = token_cache.misses
+
+    first = asyncio.run(get_current_user(token))
+    second = asyncio.run(get_current_user(token))
+
+    assert first == second == {"username": "cashier", "user_id": 7}
+    assert token_cache.misses == misses + 1
+    assert len(token_cache) == 1
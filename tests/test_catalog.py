@@ -0,0 +1,140 @@
+import queue
+import time
+from collections import defaultdict
+
+from db.catalog import ProductCatalog, RedisInvalidation, product_catalog
+from models.userModels import Products
+
+DISCONNECT = object()
+
+
+class FakeRedisServer:
+    """In-memory stand-in for the pub/sub part of a Redis server."""
+
+    def __init__(self):
+        self.channels = defaultdict(list)
+
+    def client(self):
+        return FakeRedis(self)
+
+    def disconnect(self):
+        """Drop every subscriber's connection, like a Redis restart."""
+        for subscribers in self.channels.values():
+            for subscriber in subscribers:
+                subscriber.put(DISCONNECT)
+
+
+class FakeRedis:
+    def __init__(self, server):
+        self.server = server
+
+    def publish(self, channel, data):
+        for subscriber in self.server.channels[channel]:
+            subscriber.put({"type": "message", "channel": channel, "data": data})
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        return FakePubSub(self.server)
+
+
+class FakePubSub:
+    def __init__(self, server):
+        self.server = server
+        self.messages = queue.Queue()
+        self.channels = []
+
+    def subscribe(self, channel):
+        self.server.channels[channel].append(self.messages)
+        self.channels.append(channel)
+
+    def listen(self):
+        while True:
+            message = self.messages.get()
+            if message is DISCONNECT:
+                raise ConnectionError("Connection closed by server.")
+            yield message
+
+    def close(self):
+        for channel in self.channels:
+            self.server.channels[channel].remove(self.messages)
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out waiting for the invalidation"
+        time.sleep(0.01)
+
+
+def product(name="Milk", price="500"):
+    return {"product_name": name, "product_type": "milk", "product_price": price, "date": None}
+
+
+def test_product_reads_are_cached_until_the_product_changes(client, count_statements):
+    created = client.post("/products/", json=product()).json()
+    client.get(f"/products/{created['Pro_id']}")
+
+    count_statements.count = 0
+    cached = client.get(f"/products/{created['Pro_id']}")
+    assert count_statements.count == 0
+    assert cached.json()["product_name"] == "Milk"
+
+    client.patch(f"/products/{created['Pro_id']}", json={"product_name": "Fresh Milk", "product_type": None,
+                                                          "product_price": None, "date": None})
+    assert client.get(f"/products/{created['Pro_id']}").json()["product_name"] == "Fresh Milk"
+    # The old name is free again, so the by-name entry went too
+    assert client.post("/products/", json=product()).status_code == 201
+
+    client.delete(f"/products/{created['Pro_id']}")
+    assert client.get(f"/products/{created['Pro_id']}").status_code == 404
+    assert product_catalog.stats()["by_id"]["hits"] >= 1
+
+
+def test_stock_movements_use_the_cached_catalog(client, db, count_statements):
+    db.add(Products(product_name="Milk", product_type="milk", product_price="500"))
+    db.commit()
+    line = {"product_id": 1, "product_quantity": 5, "price_per_unit": 400, "total_price": None, "date": None}
+    client.post("/stock/in/", json=line)
+
+    hits = product_catalog.stats()["by_id"]["hits"]
+    response = client.post("/stock/out/add", json={**line, "product_quantity": 1, "price_per_unit": 450})
+
+    assert response.status_code == 201
+    assert response.json()["product_name"] == "Milk"
+    assert product_catalog.stats()["by_id"]["hits"] == hits + 1
+
+
+def test_invalidations_reach_other_workers_through_the_backend(db):
+    db.add(Products(product_name="Milk", product_type="milk", product_price="500"))
+    db.commit()
+    server = FakeRedisServer()
+    worker_a = ProductCatalog(100, 60, backend=RedisInvalidation(server.client()))
+    worker_b = ProductCatalog(100, 60, backend=RedisInvalidation(server.client()))
+    worker_a.get(db, 1)
+    worker_b.get(db, 1)
+
+    db.query(Products).filter(Products.Pro_id == 1).update({"product_name": "Fresh Milk"})
+    db.commit()
+    worker_a.invalidate(1, ["Milk", "Fresh Milk"])
+
+    assert worker_a.get(db, 1).product_name == "Fresh Milk"
+    wait_for(lambda: worker_b.stats()["by_id"]["size"] == 0)
+    assert worker_b.get(db, 1).product_name == "Fresh Milk"
+    assert worker_b.get_by_name(db, "Milk") is None
+
+
+def test_workers_resubscribe_and_clear_their_cache_after_a_dropped_connection(db, caplog):
+    db.add(Products(product_name="Milk", product_type="milk", product_price="500"))
+    db.commit()
+    server = FakeRedisServer()
+    worker_a = ProductCatalog(100, 60, backend=RedisInvalidation(server.client()))
+    worker_b = ProductCatalog(100, 60, backend=RedisInvalidation(server.client(), retry_initial=0.01))
+    worker_b.get(db, 1)
+
+    server.disconnect()
+    # Whatever was published while it was away is lost, so it starts from an empty cache
+    wait_for(lambda: worker_b.stats()["by_id"]["size"] == 0)
+    assert "Lost the Redis channel 'product-catalog'" in caplog.text
+
+    worker_b.get(db, 1)
+    worker_a.invalidate(1, ["Milk"])
+    wait_for(lambda: worker_b.stats()["by_id"]["size"] == 0)
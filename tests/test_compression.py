@@ -0,0 +1,120 @@
+import asyncio
+import gzip
+import zlib
+from datetime import date
+
+from web.compression import CompressionMiddleware, accepted_encodings
+from models.userModels import Products, Stock, Transaction
+
+
+def seed_transactions(db, rows):
+    db.add_all(
+        Transaction(description=f"sale {n}", amount=10.0 * (n + 1), type="income", date=date(2024, 3, 1))
+        for n in range(rows)
+    )
+    db.commit()
+
+
+def run_app(app, accept_encoding="gzip"):
+    """Call an ASGI app directly; returns the messages it sent, in order."""
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": [(b"accept-encoding", accept_encoding.encode())]}
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    return sent
+
+
+def streaming_app(chunks, content_type=b"text/csv"):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", content_type)]})
+        for chunk in chunks:
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+    return app
+
+
+def test_accepted_encodings_honours_quality():
+    assert accepted_encodings("gzip;q=0.8, br;q=0, zstd") == {"gzip", "zstd"}
+    assert accepted_encodings("") == set()
+
+
+def test_large_list_is_gzipped(client, db):
+    seed_transactions(db, rows=200)
+
+    response = client.get("/transactions/", params={"limit": 200}, headers={"Accept-Encoding": "gzip"})
+
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert int(response.headers["content-length"]) < len(response.content)  # httpx has decoded the body
+    assert len(response.json()) == 200
+
+
+def test_small_and_unaccepted_responses_are_not_compressed(client, db):
+    seed_transactions(db, rows=1)
+
+    small = client.get("/transactions/", headers={"Accept-Encoding": "gzip"})
+    seed_transactions(db, rows=200)
+    identity = client.get("/transactions/", params={"limit": 200}, headers={"Accept-Encoding": "identity"})
+
+    assert "content-encoding" not in small.headers
+    assert "content-encoding" not in identity.headers
+    assert len(identity.json()) == 200
+
+
+def test_streamed_export_is_compressed_without_buffering(client, db):
+    seed_transactions(db, rows=50)
+
+    response = client.get("/export/transactions", params={"format": "csv"}, headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert response.text.splitlines()[0] == "id,description,amount,type,date"
+    assert len(response.text.splitlines()) == 51
+
+    # Each chunk goes out compressed and flushed as soon as the app sends it
+    chunks = [f"row {n}\n".encode() * 100 for n in range(3)]
+    sent = run_app(CompressionMiddleware(streaming_app(chunks)))
+    bodies = [message for message in sent if message["type"] == "http.response.body"]
+    assert [message["more_body"] for message in bodies] == [True, True, True, False]
+    decompressor = zlib.decompressobj(31)
+    for chunk, message in zip(chunks, bodies):
+        assert decompressor.decompress(message["body"]) == chunk
+
+
+def test_event_streams_and_encoded_responses_pass_through():
+    sent = run_app(CompressionMiddleware(streaming_app([b"data: x\n\n" * 200], content_type=b"text/event-stream")))
+    assert (b"content-encoding", b"gzip") not in sent[0]["headers"]
+    assert sent[1]["body"] == b"data: x\n\n" * 200
+
+    body = gzip.compress(b"{}" * 1000)
+
+    async def encoded_app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"content-type", b"application/json"), (b"content-encoding", b"gzip"),
+        ]})
+        await send({"type": "http.response.body", "body": body})
+
+    sent = run_app(CompressionMiddleware(encoded_app))
+    assert sent[1]["body"] == body
+
+
+def test_compressed_etag_is_weak_and_still_revalidates(client, db):
+    db.add_all(Products(Pro_id=n, product_name=f"Milk {n}", product_type="milk", product_price="500") for n in range(1, 40))
+    db.add_all(Stock(product_id=n, product_quantity=5, price_per_unit="450", total_price="2250") for n in range(1, 40))
+    db.commit()
+
+    first = client.get("/stock/in/", params={"limit": 50}, headers={"Accept-Encoding": "gzip"})
+    assert first.headers["content-encoding"] == "gzip"
+    assert first.headers["etag"].startswith('W/"')
+
+    again = client.get("/stock/in/", params={"limit": 50}, headers={
+        "Accept-Encoding": "gzip", "If-None-Match": first.headers["etag"],
+    })
+    assert again.status_code == 304
@@ -0,0 +1,112 @@
+from datetime import datetime
+from decimal import Decimal
+
+from db.costing import consume, record_receipts
+from Endpoints.stockIn import _update_stock
+from models.userModels import CostLayer, StockOut
+from schemas.stockInSchema import StockUpdateSchema
+
+
+def receipt(product_id, quantity, price):
+    return {"product_id": product_id, "product_quantity": quantity, "price_per_unit": Decimal(price),
+            "date": datetime(2024, 5, 1)}
+
+
+def open_layers(db, product_id):
+    return [
+        (layer.remaining, layer.unit_cost)
+        for layer in db.query(CostLayer).filter(CostLayer.product_id == product_id, CostLayer.remaining > 0)
+        .order_by(CostLayer.layer_id)
+    ]
+
+
+def test_fifo_sales_consume_the_oldest_deliveries_first(client, db, stock_line, seed_products):
+    seed_products(1)
+    client.post("/stock/in/", json=stock_line(1, 10, 400))
+    client.post("/stock/in/", json=stock_line(1, 10, 600))
+
+    # Below the latest price but above what the oldest units cost, so not a loss
+    first = client.post("/stock/out/add", json=stock_line(1, 5, 500))
+    basket = client.post("/stock/out/bulk", json=[stock_line(1, 7, 650), stock_line(1, 4, 700)])
+
+    assert first.status_code == 201, first.text
+    assert first.json()["profit_status"] == "profit"
+    assert basket.status_code == 201, basket.text
+    costs = [row.cost_of_goods for row in db.query(StockOut).order_by(StockOut.stock_id)]
+    assert costs == [Decimal("2000"), Decimal("2000") + 2 * Decimal("600"), 4 * Decimal("600")]
+    db.expire_all()
+    assert open_layers(db, 1) == [(4, Decimal("600"))]
+
+
+def test_sale_below_its_layer_cost_is_rejected(client, db, stock_line, seed_products):
+    seed_products(1)
+    client.post("/stock/in/", json=stock_line(1, 10, 400))
+
+    response = client.post("/stock/out/add", json=stock_line(1, 5, 399))
+
+    assert response.status_code == 403
+    db.expire_all()
+    assert open_layers(db, 1) == [(10, Decimal("400"))]  # rolled back with the sale
+
+
+def test_consume_reads_only_the_layers_it_reaches(db, count_statements, seed_products):
+    seed_products(2)
+    record_receipts(db, [receipt(1, 1, 100 + n) for n in range(200)] + [receipt(2, 5, 300)])
+    db.commit()
+
+    count_statements.count = 0
+    costs = consume(db, [(1, 2), (2, 3), (1, 1)], {1: Decimal("999"), 2: Decimal("999")})
+    db.commit()
+
+    assert costs == [Decimal("201"), Decimal("900"), Decimal("102")]
+    assert count_statements.count == 2  # one read, one executemany update
+    assert open_layers(db, 1)[0] == (1, Decimal("103"))
+    assert len(open_layers(db, 1)) == 197
+
+
+def test_uncovered_units_fall_back_to_the_stock_price(db, seed_products):
+    seed_products(1)
+    record_receipts(db, [receipt(1, 2, 400)])
+
+    assert consume(db, [(1, 5)], {1: Decimal("450")}) == [Decimal("2150")]
+
+
+def test_moving_average_keeps_one_layer_per_product(db, seed_products):
+    seed_products(2)
+    record_receipts(db, [receipt(1, 10, 400), receipt(1, 10, 420), receipt(2, 3, 700)], method="average")
+    db.flush()
+
+    assert open_layers(db, 1) == [(20, Decimal("410"))]
+    assert consume(db, [(1, 5)], {1: Decimal("0")}) == [Decimal("2050")]
+
+    record_receipts(db, [receipt(1, 5, 500)], method="average")
+    db.flush()
+    db.expire_all()
+    assert open_layers(db, 1) == [(20, Decimal("432.5"))]
+    assert open_layers(db, 2) == [(3, Decimal("700"))]
+
+
+def test_deleted_stock_closes_its_layers(client, db, stock_line, seed_products):
+    seed_products(1)
+    client.post("/stock/in/", json=stock_line(1, 10, 900))
+    assert client.delete("/stock/in/1").status_code == 204
+    client.post("/stock/in/", json=stock_line(1, 10, 100))
+
+    response = client.post("/stock/out/add", json=stock_line(1, 1, 200))
+
+    assert response.status_code == 201, response.text
+    assert response.json()["profit_status"] == "profit"
+    db.expire_all()
+    assert open_layers(db, 1) == [(9, Decimal("100"))]
+
+
+def test_edited_stock_keeps_its_layers_in_step(client, db, stock_line, seed_products):
+    seed_products(1)
+    client.post("/stock/in/", json=stock_line(1, 10, 400))
+    client.post("/stock/in/", json=stock_line(1, 10, 600))
+
+    _update_stock(db, 1, StockUpdateSchema(product_quantity=12, date=None))  # PATCH /stock/in/{id}
+    assert open_layers(db, 1) == [(2, Decimal("400")), (10, Decimal("600"))]
+
+    _update_stock(db, 1, StockUpdateSchema(product_quantity=15, price_per_unit=Decimal("500"), date=None))
+    assert open_layers(db, 1) == [(2, Decimal("400")), (10, Decimal("500")), (3, Decimal("500"))]
@@ -0,0 +1,50 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+from Endpoints.counts import totals_cache
+from models.userModels import Balance, Products, Stock
+
+
+def test_totals_come_from_one_statement_and_are_cached(client, db, count_statements, stock_line):
+    totals_cache.clear()
+    db.add_all([Products(product_name="Milk", product_type="milk", product_price="500"),
+                Products(product_name="Yogurt", product_type="yogurt", product_price="800")])
+    db.flush()
+    db.add_all([
+        Stock(product_id=1, product_quantity=10, price_per_unit="400", total_price="4000"),
+        Stock(product_id=2, product_quantity=5, price_per_unit="600", total_price="3000"),
+        Balance(balance_type="opening", date=date(2024, 1, 1), cash_balance=10, momo_balance=20),
+        Balance(balance_type="opening", date=date(2024, 1, 2), cash_balance=100, momo_balance=200),
+        Balance(balance_type="opening", date=None, cash_balance=1, momo_balance=2),
+    ])
+    db.commit()
+    client.post("/stock/out/add", json=stock_line(1, 4, 450))
+
+    count_statements.count = 0
+    first = client.get("/sum/")
+    statements = count_statements.count
+    second = client.get("/sum/")
+
+    assert first.status_code == 200
+    assert statements == 1
+    assert count_statements.count == 1  # served from the cache
+    assert second.json() == first.json()
+    totals = first.json()
+    assert totals["product_count"] == 2
+    assert totals["stock_units"] == 11
+    assert Decimal(str(totals["stock_value"])) == Decimal("5400")
+    assert totals["today"]["date"] == datetime.utcnow().date().isoformat()
+    assert totals["today"]["quantity_sold"] == 4
+    assert Decimal(str(totals["today"]["profit"])) == Decimal("200")
+    assert totals["opening_balance"] == {"date": "2024-01-02", "cash_balance": 100.0, "momo_balance": 200.0}
+    assert totals["closing_balance"] is None
+
+
+def test_totals_on_an_empty_database(client):
+    totals_cache.clear()
+
+    totals = client.get("/sum/").json()
+
+    assert totals["product_count"] == 0
+    assert totals["stock_units"] == 0
+    assert totals["today"]["quantity_sold"] == 0
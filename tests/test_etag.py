@@ -0,0 +1,69 @@
+from db.database import SessionLocal
+from models.userModels import Products
+
+
+def product(name):
+    return {"product_name": name, "product_type": "milk", "product_price": "500", "date": None}
+
+
+def test_unchanged_product_list_is_a_304_without_the_query(client, count_statements):
+    client.post("/products/", json=product("Milk"))
+    first = client.get("/products/")
+    etag = first.headers["ETag"]
+
+    count_statements.count = 0
+    again = client.get("/products/", headers={"If-None-Match": etag})
+
+    assert first.status_code == 200 and etag.startswith('"')
+    assert again.status_code == 304
+    assert again.content == b""
+    assert again.headers["ETag"] == etag
+    assert count_statements.count == 1  # just the version lookup
+    assert client.get("/products/", params={"limit": 5}).headers["ETag"] != etag
+
+    client.post("/products/", json=product("Yogurt"))
+    changed = client.get("/products/", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert len(changed.json()) == 2
+
+
+def test_stock_list_etag_follows_every_write_path(client, db, stock_line):
+    db.add_all([Products(product_name="Milk", product_type="milk", product_price="500"),
+                Products(product_name="Yogurt", product_type="yogurt", product_price="800")])
+    db.commit()
+    etags = [client.get("/stock/in/").headers["ETag"]]
+
+    client.post("/stock/in/", json=stock_line(1, 10, 400))  # ORM insert
+    etags.append(client.get("/stock/in/").headers["ETag"])
+    client.post("/stock/in/bulk", json=[stock_line(1, 5, 400), stock_line(2, 5, 600)])  # Core insert + ORM update
+    etags.append(client.get("/stock/in/").headers["ETag"])
+    client.post("/stock/out/add", json=stock_line(2, 1, 700))  # Core conditional UPDATE
+    etags.append(client.get("/stock/in/").headers["ETag"])
+    client.post("/stock/out/add", json=stock_line(2, 99, 700))  # rejected, rolled back
+    etags.append(client.get("/stock/in/").headers["ETag"])
+
+    assert len(set(etags[:4])) == 4
+    assert etags[4] == etags[3]
+    assert client.get("/stock/in/", headers={"If-None-Match": f'"x", W/{etags[3]}'}).status_code == 304
+
+
+def test_etag_changes_with_every_commit_whatever_the_statement_order(client, db):
+    db.add_all([Products(product_name="Milk", product_type="milk", product_price="500"),
+                Products(product_name="Yogurt", product_type="yogurt", product_price="800")])
+    db.commit()
+
+    # A write whose statement runs before the client reads, but which commits after
+    slow = SessionLocal()
+    slow.query(Products).filter(Products.Pro_id == 1).update({"product_type": "dairy"})
+    before = client.get("/products/").headers["ETag"]
+    slow.commit()
+    slow.close()
+    after_slow_commit = client.get("/products/").headers["ETag"]
+
+    # A delete and an insert in one commit leave the row count as it was
+    db.query(Products).filter(Products.Pro_id == 2).delete()
+    db.add(Products(product_name="Cheese", product_type="cheese", product_price="900"))
+    db.commit()
+    after_swap = client.get("/products/").headers["ETag"]
+
+    assert len({before, after_slow_commit, after_swap}) == 3
@@ -0,0 +1,67 @@
+import csv
+import io
+import json
+import tracemalloc
+from datetime import date, datetime
+
+from sqlalchemy import insert, select
+
+from Endpoints.export import STOCK_HISTORY_COLUMNS, stream_rows
+from models.userModels import Products, StockHistory, Transaction
+
+
+def seed_history(db, rows):
+    db.add(Products(Pro_id=1, product_name="Milk", product_type="milk", product_price="500"))
+    db.add(Products(Pro_id=2, product_name="Yogurt", product_type="yogurt", product_price="800"))
+    db.commit()
+    db.execute(insert(StockHistory), [
+        {"product_id": 1 + n % 2, "product_quantity": 1, "price_per_unit": "450", "total_price": "450",
+         "stocktype": "stock out", "date": datetime(2024, 1, 1 + n % 28, 12)}
+        for n in range(rows)
+    ])
+    db.commit()
+
+
+def test_export_stock_history_ndjson_filters_by_product_and_date(client, db):
+    seed_history(db, rows=56)
+
+    response = client.get("/export/stock-history", params={
+        "product_id": 1, "startDate": "2024-01-01", "endDate": "2024-01-03",
+    })
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["stock_id"] for line in lines] == [1, 3, 29, 31]
+    assert lines[0]["stocktype"] == "stock out"
+
+
+def test_export_transactions_csv(client, db):
+    db.add_all(Transaction(description=f"sale {n}", amount=10.0 * n, type="income", date=date(2024, 3, 1))
+               for n in range(1, 4))
+    db.commit()
+
+    response = client.get("/export/transactions", params={"format": "csv"})
+
+    assert response.status_code == 200
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert rows[0] == ["id", "description", "amount", "type", "date"]
+    assert rows[1:] == [[str(n), f"sale {n}", f"{10.0 * n}", "income", "2024-03-01"] for n in range(1, 4)]
+
+
+def test_export_memory_stays_flat_for_large_ranges(db):
+    seed_history(db, rows=50_000)
+    statement = select(*STOCK_HISTORY_COLUMNS).order_by(StockHistory.stock_id)
+
+    tracemalloc.start()
+    total_bytes = 0
+    rows = 0
+    for chunk in stream_rows(statement, "ndjson"):
+        total_bytes += len(chunk)
+        rows += chunk.count("\n")
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert rows == 50_000
+    # The whole export is several MB; only about one batch should ever be held at once
+    assert peak < total_bytes / 5
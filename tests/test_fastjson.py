@@ -0,0 +1,60 @@
+from datetime import date
+
+import pytest
+
+from web.fastjson import FastJSONResponse, _projector, enable_fast_json
+from models.userModels import Balance, Products, Stock, Users
+from schemas.schemas import Token
+
+
+@pytest.fixture
+def fast_json():
+    enable_fast_json()
+    yield
+    enable_fast_json(False)
+
+
+def seed(db):
+    db.add_all(Products(product_name=f"Milk {n}", product_type="milk", product_price="500.50") for n in range(3))
+    db.flush()
+    db.add_all(Stock(product_id=n, product_quantity=n * 10, price_per_unit="400", total_price=str(n * 4000),
+                     date=date(2024, 5, n)) for n in range(1, 4))
+    db.add(Balance(balance_type="opening", date=date(2024, 5, 1), cash_balance=10.5, momo_balance=3))
+    db.commit()
+
+
+PATHS = [("/stock/in/", {"limit": 2}), ("/products/2", {}), ("/balance/", {}), ("/sum/", {})]
+
+
+def test_fast_mode_sends_the_same_json_as_validation(client, db, fast_json):
+    seed(db)
+    enable_fast_json(False)
+    validated = [client.get(path, params=params) for path, params in PATHS]
+    enable_fast_json()
+    fast = [client.get(path, params=params) for path, params in PATHS]
+
+    for slow_response, fast_response in zip(validated, fast):
+        assert fast_response.status_code == slow_response.status_code == 200
+        assert fast_response.json() == slow_response.json()
+    assert fast[0].headers["X-Next-Cursor"] == validated[0].headers["X-Next-Cursor"]
+    assert fast[0].headers["ETag"] == validated[0].headers["ETag"]
+
+
+def test_fast_mode_keeps_status_codes(client, fast_json):
+    created = client.post("/products/", json={"product_name": "Milk", "product_type": "milk",
+                                              "product_price": "500", "date": None})
+    deleted = client.delete(f"/products/{created.json()['Pro_id']}")
+
+    assert created.status_code == 201
+    assert created.headers["content-type"] == "application/json"
+    assert deleted.status_code == 204
+    assert deleted.content == b""
+
+
+def test_projection_only_sends_response_model_fields():
+    project = _projector(Token)
+    user = Users(id=1, username="cashier", password="$2b$12$hash")
+
+    body = FastJSONResponse(project({"UserInfo": user, "access_token": "t", "token_type": "bearer"})).body
+
+    assert body == b'{"access_token":"t","token_type":"bearer","UserInfo":{"username":"cashier"}}'
@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from db.idempotency import REPLAYED_HEADER, purge
+from models.userModels import IdempotencyKey, Stock, StockOut, Transaction
+
+
+def test_retried_stock_out_is_applied_once(client, db, count_statements, stock_line, seed_products):
+    seed_products()
+    client.post("/stock/in/", json=stock_line(1, 10, 400))
+
+    first = client.post("/stock/out/add", json=stock_line(1, 3, 500), headers={"Idempotency-Key": "sale-1"})
+    count_statements.count = 0
+    retry = client.post("/stock/out/add", json=stock_line(1, 3, 500), headers={"Idempotency-Key": "sale-1"})
+
+    assert first.status_code == retry.status_code == 201
+    assert retry.json() == first.json()
+    assert retry.headers[REPLAYED_HEADER] == "true"
+    assert REPLAYED_HEADER not in first.headers
+    assert count_statements.count == 1  # the key lookup
+    assert db.query(Stock).one().product_quantity == 7
+    assert db.query(StockOut).count() == 1
+
+
+def test_retried_stock_in_and_transaction_are_applied_once(client, db, stock_line, seed_products):
+    seed_products()
+    payment = {"description": "supplier", "amount": 120.5, "type": "expense", "date": "2024-05-01"}
+
+    stock_in = [client.post("/stock/in/", json=stock_line(1, 10, 400), headers={"Idempotency-Key": "delivery-1"})
+                for _ in range(2)]
+    transactions = [client.post("/transactions/", json=payment, headers={"Idempotency-Key": "payment-1"})
+                    for _ in range(2)]
+
+    assert stock_in[1].json() == stock_in[0].json()
+    assert db.query(Stock).one().product_quantity == 10
+    assert transactions[0].status_code == transactions[1].status_code == 201
+    assert transactions[1].json() == transactions[0].json()
+    assert transactions[0].json()["id"] == 1
+    assert db.query(Transaction).count() == 1
+
+
+def test_keys_are_scoped_and_bound_to_their_request(client, db, stock_line, seed_products):
+    seed_products()
+    client.post("/stock/in/", json=stock_line(1, 10, 400), headers={"Idempotency-Key": "k"})
+
+    same_key_other_endpoint = client.post("/stock/out/add", json=stock_line(1, 2, 500), headers={"Idempotency-Key": "k"})
+    different_body = client.post("/stock/in/", json=stock_line(1, 11, 400), headers={"Idempotency-Key": "k"})
+    without_key = [client.post("/stock/in/", json=stock_line(1, 1, 400)) for _ in range(2)]
+
+    assert same_key_other_endpoint.status_code == 201
+    assert different_body.status_code == 422
+    assert all(response.status_code == 201 for response in without_key)
+    assert db.query(Stock).one().product_quantity == 10 - 2 + 2
+
+
+def test_failed_requests_are_not_stored(client, db, stock_line, seed_products):
+    seed_products()
+    client.post("/stock/in/", json=stock_line(1, 1, 400))
+
+    short = client.post("/stock/out/add", json=stock_line(1, 3, 500), headers={"Idempotency-Key": "sale-2"})
+    client.post("/stock/in/", json=stock_line(1, 5, 400))
+    retry = client.post("/stock/out/add", json=stock_line(1, 3, 500), headers={"Idempotency-Key": "sale-2"})
+
+    assert short.status_code == 403
+    assert retry.status_code == 201
+    assert REPLAYED_HEADER not in retry.headers
+
+
+def test_work_key_and_response_commit_together(client, db, monkeypatch, stock_line, seed_products):
+    seed_products()
+    client.post("/stock/in/", json=stock_line(1, 10, 400))
+
+    # Storing the response fails after the sale ran: nothing of it may be kept
+    def broken_encoder(*args, **kwargs):
+        raise RuntimeError("lost the worker")
+
+    monkeypatch.setattr("db.idempotency.jsonable_encoder", broken_encoder)
+    with pytest.raises(RuntimeError):
+        client.post("/stock/out/add", json=stock_line(1, 3, 500), headers={"Idempotency-Key": "sale-3"})
+    monkeypatch.undo()
+    db.expire_all()
+    assert db.query(IdempotencyKey).count() == 0
+    assert db.query(Stock).one().product_quantity == 10
+
+    retry = client.post("/stock/out/add", json=stock_line(1, 3, 500), headers={"Idempotency-Key": "sale-3"})
+    assert retry.status_code == 201
+    assert REPLAYED_HEADER not in retry.headers
+    assert db.query(Stock).one().product_quantity == 7
+
+
+def test_expired_keys(client, db, stock_line, seed_products):
+    seed_products()
+    client.post("/stock/in/", json=stock_line(1, 10, 400), headers={"Idempotency-Key": "a"})
+    client.post("/stock/in/", json=stock_line(1, 10, 400), headers={"Idempotency-Key": "b"})
+
+    # Expired keys no longer replay, and the purge job removes them
+    db.query(IdempotencyKey).update({IdempotencyKey.expires_at: datetime.utcnow() - timedelta(seconds=1)})
+    db.commit()
+    rerun = client.post("/stock/in/", json=stock_line(1, 10, 400), headers={"Idempotency-Key": "a"})
+    assert rerun.status_code == 201
+    assert REPLAYED_HEADER not in rerun.headers
+    assert purge(db) == 1  # "b"; "a" was claimed again
+    db.commit()
+    assert db.query(IdempotencyKey).count() == 1
@@ -0,0 +1,140 @@
+"""
+Index plan checks: run the key endpoints on a seeded database, capture the statements they
+send and assert, with SQLite's EXPLAIN QUERY PLAN, that each searches the expected index
+rather than scanning its table.
+"""
+from contextlib import contextmanager
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import event, insert
+from sqlalchemy.exc import IntegrityError
+
+from db.database import engine, async_engine
+from Endpoints.counts import totals_cache
+from models.userModels import Balance, Products, Stock, StockHistory, StockOut, Transaction
+
+pytestmark = pytest.mark.skipif(engine.dialect.name != "sqlite", reason="reads SQLite query plans")
+
+TODAY = datetime.utcnow()
+
+
+def seed(db, products=20, movements=50):
+    db.execute(insert(Products), [
+        {"Pro_id": n, "product_name": f"Milk {n}", "product_type": "milk", "product_price": 500}
+        for n in range(1, products + 1)
+    ])
+    db.execute(insert(Stock), [
+        {"product_id": n, "product_quantity": 1000, "price_per_unit": 400, "total_price": 400000}
+        for n in range(1, products + 1)
+    ])
+    db.execute(insert(StockHistory), [
+        {"product_id": n, "product_quantity": 1, "price_per_unit": 450, "total_price": 450,
+         "stocktype": "stock out" if m else "stock in", "cost_of_goods": 400 if m else None,
+         "date": datetime(2024, 1 + m % 12, 1 + m % 28, 12)}
+        for n in range(1, products + 1) for m in range(movements)
+    ] + [
+        {"product_id": 1, "product_quantity": 1, "price_per_unit": 450, "total_price": 450,
+         "stocktype": "stock out", "cost_of_goods": 400, "date": TODAY}
+    ])
+    db.execute(insert(StockOut), [
+        {"product_id": 1 + m % products, "product_quantity": 1, "price_per_unit": 450, "total_price": 450,
+         "cost_of_goods": 400, "date": date(2024, 1 + m % 12, 1 + m % 28)}
+        for m in range(products * movements)
+    ])
+    db.execute(insert(Transaction), [
+        {"description": f"sale {m}", "amount": 10 + m, "type": "income", "date": date(2024, 1 + m % 12, 1 + m % 28)}
+        for m in range(products * movements)
+    ])
+    db.execute(insert(Balance), [
+        {"balance_type": ("opening", "closing")[m % 2], "date": date(2024, 1 + m % 12, 1 + m % 28),
+         "cash_balance": 100, "momo_balance": 50}
+        for m in range(500)
+    ])
+    db.commit()
+
+
+@contextmanager
+def captured_statements():
+    """The (sql, parameters) of every SELECT sent while the block runs."""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "WITH")) and not executemany:
+            statements.append((statement, parameters))
+
+    engines = [engine] + ([async_engine.sync_engine] if async_engine else [])
+    for target in engines:
+        event.listen(target, "before_cursor_execute", capture)
+    try:
+        yield statements
+    finally:
+        for target in engines:
+            event.remove(target, "before_cursor_execute", capture)
+
+
+def query_plans(statements):
+    with engine.connect() as connection:
+        return [
+            [row[-1] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+            for statement, parameters in statements
+        ]
+
+
+def assert_searches(plans, table, index):
+    details = [detail for plan in plans for detail in plan]
+    assert any(detail.startswith(f"SEARCH {table} USING") and f"INDEX {index} " in detail for detail in details), details
+    full_scans = [detail for detail in details if detail == f"SCAN {table}"]
+    assert not full_scans, details
+
+
+@pytest.mark.parametrize("method, url, params, table, index", [
+    ("POST", "/stock/out/byDate", None, "StockHistory", "ix_StockHistory_date"),
+    ("GET", "/export/stock-history", {"product_id": 3, "startDate": "2024-02-01", "endDate": "2024-03-31"},
+     "StockHistory", "ix_StockHistory_product_id_date"),
+    ("GET", "/export/transactions", {"startDate": "2024-02-01", "endDate": "2024-02-03"},
+     "transactions", "ix_transactions_date"),
+    ("GET", "/sum/", None, "balances", "ix_balances_balance_type_date"),
+])
+def test_endpoint_queries_use_indexes(client, db, method, url, params, table, index):
+    seed(db)
+    totals_cache.clear()  # /sum/ may still hold another test's totals
+
+    with captured_statements() as statements:
+        response = client.request(method, url, params=params)
+    assert response.status_code == 200, response.text
+
+    assert_searches(query_plans(statements), table, index)
+
+
+def test_stock_out_pages_read_only_their_own_rows(client, db):
+    seed(db)
+    first = client.get("/stock/out/", params={"limit": 50})
+
+    with captured_statements() as statements:
+        response = client.get("/stock/out/", params={"limit": 50, "after": first.headers["X-Next-Cursor"]})
+    assert response.status_code == 200, response.text
+
+    details = [detail for plan in query_plans(statements) for detail in plan]
+    assert not [detail for detail in details if "StockHistory" in detail or "MATERIALIZE" in detail], details
+    assert any(detail.startswith("SEARCH stockOut USING INTEGER PRIMARY KEY") for detail in details), details
+
+
+def test_stock_out_looks_up_stock_by_product_index(client, db):
+    seed(db)
+
+    with captured_statements() as statements:
+        response = client.post("/stock/out/add", json={
+            "product_id": 4, "product_quantity": 1, "price_per_unit": 450, "total_price": None, "date": None,
+        })
+    assert response.status_code == 201, response.text
+
+    assert_searches(query_plans(statements), "stock", "ix_stock_product_id")
+
+
+def test_stock_rows_are_unique_per_product(db):
+    seed(db, products=1, movements=1)
+
+    db.add(Stock(product_id=1, product_quantity=1, price_per_unit=400, total_price=400))
+    with pytest.raises(IntegrityError):
+        db.commit()
@@ -0,0 +1,143 @@
+import asyncio
+
+from db.database import SessionLocal
+from db.lowstock import low_stock_events, rebuild, record_levels
+from web.broadcast import sse_stream
+from Endpoints.stockIn import _update_stock
+from Endpoints.stockOut import _create_stock_out_bulk
+from models.userModels import LowStockQueue, Products, Stock
+from schemas.stockInSchema import StockCreateSchema, StockUpdateSchema
+
+
+def queued(db):
+    db.expire_all()
+    return {row.product_id: row.quantity for row in db.query(LowStockQueue)}
+
+
+def add_products(client, thresholds):
+    for name, threshold in thresholds.items():
+        client.post("/products/", json={"product_name": name, "product_type": "milk", "product_price": 500,
+                                        "reorder_threshold": threshold})
+
+
+def test_queue_follows_stock_movements(client, db, stock_line):
+    add_products(client, {"Milk": 5, "Bread": None})
+    assert queued(db) == {1: 0}  # nothing in stock yet
+
+    client.post("/stock/in/", json=stock_line(1, 10, 400))
+    client.post("/stock/in/", json=stock_line(2, 1, 400))
+    assert queued(db) == {}
+
+    client.post("/stock/out/add", json=stock_line(1, 4, 500))
+    assert queued(db) == {}
+    client.post("/stock/out/add", json=stock_line(1, 1, 500))
+    assert queued(db) == {1: 5}  # at the threshold counts as low
+    client.post("/stock/out/bulk", json=[stock_line(1, 2, 500), stock_line(1, 1, 500), stock_line(2, 1, 500)])
+    assert queued(db) == {1: 2}
+
+    client.post("/stock/in/bulk", json=[stock_line(1, 2, 400), stock_line(1, 2, 400)])
+    assert queued(db) == {}
+
+    stock_id = db.query(Stock.stock_id).filter(Stock.product_id == 1).scalar()
+    _update_stock(db, stock_id, StockUpdateSchema(product_quantity=3, date=None))  # PATCH /stock/in/{id}
+    assert queued(db) == {1: 3}
+    client.delete(f"/stock/in/{stock_id}")
+    assert queued(db) == {1: 0}
+
+
+def test_threshold_changes(client, db, stock_line):
+    add_products(client, {"Milk": None})
+    client.post("/stock/in/", json=stock_line(1, 10, 400))
+
+    client.patch("/products/1", json={"reorder_threshold": 12})
+    assert queued(db) == {1: 10}
+    client.patch("/products/1", json={"product_type": "dairy"})
+    assert queued(db) == {1: 10}
+    client.patch("/products/1", json={"reorder_threshold": None})
+    assert queued(db) == {}
+    assert client.get("/products/1").json()["reorder_threshold"] is None
+
+    client.patch("/products/1", json={"reorder_threshold": 10})
+    assert client.delete("/products/1").status_code == 204
+    assert queued(db) == {}
+
+
+def test_low_stock_only_reads_the_queue(client, db, count_statements):
+    db.add_all(Products(Pro_id=n, product_name=f"Milk {n}", product_type="milk", product_price="500",
+                        reorder_threshold=5) for n in range(1, 201))
+    db.add_all(Stock(product_id=n, product_quantity=n % 50 + 1, price_per_unit="400", total_price="400")
+               for n in range(1, 201))
+    db.commit()
+    assert rebuild(db) == 20
+    db.commit()
+
+    count_statements.count = 0
+    response = client.get("/stock/low")
+
+    assert response.status_code == 200
+    rows = response.json()
+    assert count_statements.count == 1
+    assert len(rows) == 20
+    assert [row["quantity"] - row["reorder_threshold"] for row in rows] == sorted(
+        row["quantity"] - row["reorder_threshold"] for row in rows
+    )
+    assert rows[0] == {**rows[0], "product_id": 50, "product_name": "Milk 50", "quantity": 1, "reorder_threshold": 5}
+
+
+def test_crossings_are_streamed_after_commit(client, db, stock_line):
+    add_products(client, {"Milk": 5})
+    client.post("/stock/in/", json=stock_line(1, 6, 400))
+
+    async def watch():
+        stream = sse_stream(low_stock_events, "low-stock", heartbeat=0.05)
+        assert await anext(stream) == ": keep-alive\n\n"  # subscribed
+        loop = asyncio.get_running_loop()
+
+        # Rolled back: nothing is published
+        record_levels(db, [{"product_id": 1, "product_name": "Milk", "threshold": 5, "quantity": 0, "was_low": False}])
+        db.rollback()
+
+        await loop.run_in_executor(None, lambda: client.post("/stock/out/add", json=stock_line(1, 2, 500)))
+        await loop.run_in_executor(None, lambda: client.post("/stock/out/add", json=stock_line(1, 1, 500)))
+        await loop.run_in_executor(None, lambda: client.post("/stock/in/", json=stock_line(1, 5, 400)))
+        messages = []
+        while len(messages) < 2:
+            message = await anext(stream)
+            if not message.startswith(":"):
+                messages.append(message)
+        await stream.aclose()
+        return messages
+
+    low, recovered = asyncio.run(watch())
+
+    assert low.startswith("id: ") and "\nevent: low-stock\ndata: " in low
+    assert '"status":"low"' in low and '"quantity":4' in low
+    assert '"status":"recovered"' in recovered and '"quantity":8' in recovered
+    assert len(low_stock_events) == 0
+
+
+def test_bulk_sale_records_the_quantity_left_after_concurrent_sales(client, db, stock_line):
+    add_products(client, {"Milk": 5})
+    client.post("/stock/in/", json=stock_line(1, 10, 400))
+    stale = db.query(Stock).one()  # held, so it stays at 10 in this session's identity map
+
+    other = SessionLocal()
+    other.query(Stock).update({Stock.product_quantity: 7})
+    other.commit()
+    other.close()
+    assert stale.product_quantity == 10
+
+    _create_stock_out_bulk(db, [StockCreateSchema(**stock_line(1, 2, 500))])
+
+    assert queued(db) == {1: 5}
+
+
+def test_stale_queue_rows_are_cleared(client, db, stock_line):
+    add_products(client, {"Milk": 5})
+    client.post("/stock/in/", json=stock_line(1, 10, 400))
+    db.add(LowStockQueue(product_id=1, quantity=3, threshold=5))  # a crossing that was missed
+    db.commit()
+
+    client.post("/stock/in/", json=stock_line(1, 1, 400))
+
+    assert queued(db) == {}
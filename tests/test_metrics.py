@@ -0,0 +1,59 @@
+import sqlite3
+import threading
+import time
+
+from db.database import engine
+from db.metrics import InstrumentedQueuePool, pool_metrics
+
+
+def test_metrics_report_pool_checkouts(client):
+    pool_metrics.reset()
+    client.get("/products/")
+
+    response = client.get("/internal/metrics")
+
+    assert response.status_code == 200
+    pool = response.json()["pool"]
+    assert pool["checkouts"] >= 1
+    assert sum(pool["checkout_wait_histogram"].values()) == pool["checkouts"]
+    assert pool["pools"]["sync"]["size"] == engine.pool.size()
+
+
+def test_overflow_checkouts_are_counted():
+    pool_metrics.reset()
+    held = [engine.connect() for _ in range(engine.pool.size() + 2)]
+    try:
+        assert pool_metrics.overflow_events == 2
+    finally:
+        for connection in held:
+            connection.close()
+
+
+def test_overflow_is_counted_once_per_connection_under_contention():
+    opened = []
+
+    def creator():
+        opened.append(1)
+        time.sleep(0.001)  # a slow connect, so others check out and return meanwhile
+        return sqlite3.connect(":memory:", check_same_thread=False)
+
+    pool = InstrumentedQueuePool(creator, pool_size=2, max_overflow=30, timeout=10)
+
+    def churn():
+        for _ in range(200):
+            connection = pool.connect()
+            time.sleep(0.0001)
+            connection.close()
+
+    pool_metrics.reset()
+    threads = [threading.Thread(target=churn) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    pool.dispose()
+
+    # Returned connections only close while the pool is full, so all but the first
+    # pool_size connections opened were overflow
+    assert pool_metrics.checkouts == 16 * 200
+    assert pool_metrics.overflow_events == len(opened) - 2
@@ -0,0 +1,111 @@
+from datetime import datetime
+from decimal import Decimal
+
+from db.rollup import rebuild
+from models.userModels import DailyProductSummary, Products, StockHistory
+
+
+def seed_history(db):
+    milk = Products(product_name="Milk", product_type="milk", product_price="500")
+    yogurt = Products(product_name="Yogurt", product_type="yogurt", product_price="800")
+    db.add_all([milk, yogurt])
+    db.flush()
+    db.add_all([
+        StockHistory(product_id=milk.Pro_id, product_quantity=100, price_per_unit="400", total_price="40000",
+                     stocktype="stock in", date=datetime(2024, 1, 1)),
+        StockHistory(product_id=yogurt.Pro_id, product_quantity=100, price_per_unit="600", total_price="60000",
+                     stocktype="stock in", date=datetime(2024, 1, 1)),
+        # Week of Mon 2024-01-01
+        StockHistory(product_id=milk.Pro_id, product_quantity=2, price_per_unit="500", total_price="1000",
+                     stocktype="stock out", date=datetime(2024, 1, 2, 9)),
+        StockHistory(product_id=milk.Pro_id, product_quantity=3, price_per_unit="450", total_price="1350",
+                     stocktype="stock out", date=datetime(2024, 1, 2, 17)),
+        StockHistory(product_id=yogurt.Pro_id, product_quantity=1, price_per_unit="800", total_price="800",
+                     stocktype="stock out", date=datetime(2024, 1, 7, 12)),
+        # February
+        StockHistory(product_id=yogurt.Pro_id, product_quantity=4, price_per_unit="700", total_price="2800",
+                     stocktype="stock out", date=datetime(2024, 2, 15)),
+    ])
+    rebuild(db)
+    db.commit()
+    return milk, yogurt
+
+
+def totals(row):
+    return {key: Decimal(str(row[key])) for key in ("quantity", "revenue", "cost", "profit")}
+
+
+def test_daily_report_by_product(client, db):
+    milk, yogurt = seed_history(db)
+
+    response = client.get("/reports/sales", params={"group_by": "product", "startDate": "2024-01-01",
+                                                     "endDate": "2024-12-31"})
+
+    assert response.status_code == 200
+    rows = response.json()["rows"]
+    assert [(row["period_start"], row["product_name"]) for row in rows] == [
+        ("2024-01-02", "Milk"), ("2024-01-07", "Yogurt"), ("2024-02-15", "Yogurt"),
+    ]
+    assert totals(rows[0]) == {"quantity": 5, "revenue": Decimal("2350"), "cost": Decimal("2000"),
+                               "profit": Decimal("350")}
+
+
+def test_weekly_and_monthly_buckets(client, db):
+    seed_history(db)
+    params = {"startDate": "2024-01-01", "endDate": "2024-12-31"}
+
+    weekly = client.get("/reports/sales", params={**params, "period": "week"}).json()["rows"]
+    monthly = client.get("/reports/sales", params={**params, "period": "month", "group_by": "product_type"}).json()["rows"]
+
+    assert [(row["period_start"], row["quantity"]) for row in weekly] == [("2024-01-01", 6), ("2024-02-12", 4)]
+    assert [(row["period_start"], row["product_type"], row["quantity"]) for row in monthly] == [
+        ("2024-01-01", "milk", 5), ("2024-01-01", "yogurt", 1), ("2024-02-01", "yogurt", 4),
+    ]
+    assert totals(monthly[2])["profit"] == Decimal("400")
+
+
+def test_report_respects_date_range_and_validates_dates(client, db):
+    seed_history(db)
+
+    january = client.get("/reports/sales", params={"startDate": "2024-01-01", "endDate": "2024-01-31",
+                                                   "period": "month"})
+    bad = client.get("/reports/sales", params={"startDate": "01/01/2024"})
+
+    assert [row["quantity"] for row in january.json()["rows"]] == [6]
+    assert bad.status_code == 400
+
+
+def summary_rows(db):
+    return [
+        (row.day, row.product_id, row.qty_in, row.qty_out, row.revenue, row.cost)
+        for row in db.query(DailyProductSummary).order_by(DailyProductSummary.day, DailyProductSummary.product_id)
+    ]
+
+
+def test_rollup_follows_stock_movements_and_matches_rebuild(client, db, stock_line):
+    db.add_all([Products(product_name="Milk", product_type="milk", product_price="500"),
+                Products(product_name="Yogurt", product_type="yogurt", product_price="800")])
+    db.commit()
+
+    client.post("/stock/in/", json=stock_line(1, 50, 400))
+    client.post("/stock/in/bulk", json=[stock_line(1, 10, 420), stock_line(2, 30, 600)])
+    client.post("/stock/out/add", json=stock_line(1, 5, 500))
+    client.post("/stock/out/bulk", json=[stock_line(1, 2, 450), stock_line(2, 3, 700)])
+    rejected = client.post("/stock/out/add", json=stock_line(2, 1, 1))
+
+    db.expire_all()
+    incremental = summary_rows(db)
+    rebuild(db)
+    db.commit()
+
+    assert rejected.status_code == 403
+    assert [row[1:] for row in incremental] == [
+        (1, 60, 7, Decimal("3400"), Decimal("2800")),  # FIFO: all seven from the first delivery, at 400
+        (2, 30, 3, Decimal("2100"), Decimal("1800")),
+    ]
+    assert summary_rows(db) == incremental
+
+    today = incremental[0][0].isoformat()
+    report = client.get("/reports/sales", params={"startDate": today, "endDate": today}).json()["rows"]
+    assert totals(report[0]) == {"quantity": 10, "revenue": Decimal("5500"), "cost": Decimal("4600"),
+                                 "profit": Decimal("900")}
@@ -0,0 +1,165 @@
+import asyncio
+import statistics
+import threading
+import time
+import tracemalloc
+from datetime import timedelta
+
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from web.broadcast import Broadcaster, RESET, sse_stream
+from web.stockfeed import record_feed, stock_events
+from Endpoints.auth import create_access_token
+from models.userModels import Products
+
+SUBSCRIBERS = 500
+EVENTS = 20
+
+
+def token():
+    return create_access_token("tester", 1, timedelta(minutes=5))
+
+
+def test_websocket_feed_and_resume(client, db, stock_line, seed_products):
+    seed_products()
+
+    with client.websocket_connect(f"/stock/feed/ws?token={token()}") as websocket:
+        client.post("/stock/in/", json=stock_line(1, 10, 400))
+        client.post("/stock/out/bulk", json=[stock_line(1, 2, 500), stock_line(1, 3, 500)])
+        delivery, first_sale, second_sale = (websocket.receive_json() for _ in range(3))
+
+    assert delivery["event"] == "stock"
+    assert {key: delivery["data"][key] for key in ("product_id", "stocktype", "quantity", "price_per_unit")} == {
+        "product_id": 1, "stocktype": "stock in", "quantity": 10, "price_per_unit": 400.0,
+    }
+    assert [first_sale["data"]["quantity"], second_sale["data"]["quantity"]] == [2, 3]
+    assert delivery["id"] < first_sale["id"] < second_sale["id"]
+
+    # Reconnecting after the delivery replays the two sales, then goes on live
+    resume = f"/stock/feed/ws?token={token()}&last_event_id={delivery['id']}"
+    with client.websocket_connect(resume) as websocket:
+        replayed = [websocket.receive_json() for _ in range(2)]
+        client.post("/stock/out/add", json=stock_line(1, 1, 500))
+        live = websocket.receive_json()
+    assert replayed == [first_sale, second_sale]
+    assert live["id"] == second_sale["id"] + 1
+
+
+def test_websocket_feed_needs_a_token(client):
+    with pytest.raises(WebSocketDisconnect) as error:
+        with client.websocket_connect("/stock/feed/ws") as websocket:
+            websocket.receive_json()
+    assert error.value.code == 1008
+
+
+def test_rolled_back_movements_are_not_published(db):
+    history = {"product_id": 1, "product_quantity": 1, "price_per_unit": 400, "total_price": 400,
+               "stocktype": "stock in", "date": None}
+
+    async def watch():
+        subscription = stock_events.subscribe()
+        try:
+            db.query(Products).count()  # writers always have a transaction open by now
+            record_feed(db, [history])
+            db.rollback()
+            db.commit()  # nothing left to publish
+            with pytest.raises(asyncio.TimeoutError):
+                await subscription.get(0.05)
+        finally:
+            stock_events.unsubscribe(subscription)
+
+    asyncio.run(watch())
+
+
+def test_resume_from_the_ring_buffer():
+    broadcaster = Broadcaster(history=3)
+
+    async def resume():
+        for n in range(5):
+            broadcaster.publish({"n": n})
+        await asyncio.sleep(0)
+        ids = [event_id for event_id, _ in broadcaster._buffer]
+
+        recent = broadcaster.subscribe(last_event_id=ids[0])
+        missed_too_many = broadcaster.subscribe(last_event_id=ids[0] - 2)
+        stream = sse_stream(broadcaster, "stock", last_event_id=ids[0] - 2)
+        first_message = await anext(stream)
+        await stream.aclose()
+        return ids, list(recent.pending), missed_too_many, first_message
+
+    ids, replayed, missed_too_many, first_message = asyncio.run(resume())
+
+    assert replayed == [(ids[1], {"n": 3}), (ids[2], {"n": 4})]
+    assert missed_too_many.reset and not missed_too_many.pending
+    assert first_message == f"event: {RESET}\ndata: {{}}\n\n"
+
+
+def test_fan_out_to_hundreds_of_subscribers():
+    """Every SSE subscriber gets every event, in order, quickly and without much memory each."""
+    broadcaster = Broadcaster(maxsize=EVENTS)
+
+    async def subscriber(stream, received):
+        async for message in stream:
+            if not message.startswith(":"):
+                received.append((time.perf_counter(), message))
+                if len(received) == EVENTS:
+                    return
+
+    async def fan_out():
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        streams = [sse_stream(broadcaster, "stock") for _ in range(SUBSCRIBERS)]
+        received = [[] for _ in range(SUBSCRIBERS)]
+        tasks = [asyncio.ensure_future(subscriber(stream, into)) for stream, into in zip(streams, received)]
+        while len(broadcaster) < SUBSCRIBERS:
+            await asyncio.sleep(0.01)
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        per_connection = sum(stat.size_diff for stat in after.compare_to(before, "filename")) / SUBSCRIBERS
+
+        sent = []
+
+        def publish():  # from a worker thread, like a request handler
+            for n in range(EVENTS):
+                sent.append(time.perf_counter())
+                broadcaster.publish({"n": n})
+                time.sleep(0.005)
+
+        publisher = threading.Thread(target=publish)
+        publisher.start()
+        await asyncio.wait_for(asyncio.gather(*tasks), timeout=30)
+        publisher.join()
+        return sent, received, per_connection
+
+    sent, received, per_connection = asyncio.run(fan_out())
+
+    # Fan-out latency of an event: from publish until its last subscriber has it
+    latencies = [max(into[n][0] for into in received) - sent[n] for n in range(EVENTS)]
+    print(f"\n{SUBSCRIBERS} subscribers: fan-out latency median {statistics.median(latencies) * 1000:.1f} ms, "
+          f"max {max(latencies) * 1000:.1f} ms; {per_connection / 1024:.1f} KiB per connection")
+
+    for into in received:
+        assert [message for _, message in into] == [message for _, message in received[0]]
+    assert [f'"n":{n}' in message for n, (_, message) in enumerate(received[0])] == [True] * EVENTS
+    assert statistics.median(latencies) < 0.1
+    assert per_connection < 8 * 1024
+    assert len(broadcaster) == 0
+
+
+class BrokenBackend:
+    def subscribe(self, callback):
+        pass
+
+    def publish(self, data):
+        raise ConnectionError("redis is down")
+
+
+def test_failed_publish_does_not_fail_the_committed_write(client, db, monkeypatch, caplog, stock_line, seed_products):
+    seed_products()
+    monkeypatch.setattr(stock_events, "backend", BrokenBackend())
+
+    response = client.post("/stock/in/", json=stock_line(1, 10, 400))
+
+    assert response.status_code == 201
+    assert "Could not publish an event after commit" in caplog.text
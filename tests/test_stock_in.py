@@ -0,0 +1,44 @@
+from models.userModels import Stock, StockHistory
+
+
+def test_bulk_stock_in_creates_and_updates_in_one_request(client, db, count_statements, stock_line, seed_products):
+    seed_products(3)
+    client.post("/stock/in/", json=stock_line(1, 5))
+
+    count_statements.count = 0
+    response = client.post("/stock/in/bulk", json=[stock_line(1, 10), stock_line(2, 4), stock_line(2, 6, price=450), stock_line(3, 1)])
+
+    assert response.status_code == 201
+    results = response.json()
+    assert [r["message"] for r in results] == [
+        "Stock updated successfully", "Stock created successfully", "Stock updated successfully", "Stock created successfully",
+    ]
+    assert [r["product_quantity"] for r in results] == [15, 4, 10, 1]
+    assert count_statements.count <= 8  # 2 lookups, stock upsert, history + cost layer inserts, rollup + version upserts, low stock queue
+    quantities = {stock.product_id: stock.product_quantity for stock in db.query(Stock)}
+    assert quantities == {1: 15, 2: 10, 3: 1}
+    assert db.query(StockHistory).count() == 5
+
+
+def test_bulk_stock_in_is_all_or_nothing(client, db, stock_line, seed_products):
+    seed_products(2)
+
+    response = client.post("/stock/in/bulk", json=[stock_line(1, 10), stock_line(99, 4), stock_line(2, 1)])
+
+    assert response.status_code == 404
+    assert "99" in response.json()["detail"]
+    assert db.query(Stock).count() == 0
+    assert db.query(StockHistory).count() == 0
+
+
+def test_stock_in_totals_are_numeric(client, db, stock_line, seed_products):
+    seed_products(1)
+
+    client.post("/stock/in/", json=stock_line(1, 3, price=400.5))
+    response = client.post("/stock/in/", json=stock_line(1, 2, price=410.25))
+
+    assert response.json()["total_price"] == 2051.25
+    stock = db.query(Stock).one()
+    assert str(stock.total_price) == "2051.25"
+    response = client.get(f"/stock/in/{stock.stock_id}")
+    assert response.json()["price_per_unit"] == 410.25
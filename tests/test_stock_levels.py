@@ -0,0 +1,107 @@
+import random
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import insert
+
+from db.rollup import record_movements
+from db.snapshots import compact, on_hand, take_snapshot
+from models.userModels import Products, StockHistory, StockSnapshot
+
+START = datetime(2024, 1, 1)
+
+
+def seed_history(db, products=5, days=90, seed=7):
+    """Random deliveries and sales, never selling more than is on hand; rollup kept in step."""
+    generator = random.Random(seed)
+    db.add_all(Products(Pro_id=n, product_name=f"Milk {n}", product_type="milk", product_price="500")
+               for n in range(1, products + 1))
+    db.commit()
+    stock = dict.fromkeys(range(1, products + 1), 0)
+    histories = []
+    for day in range(days):
+        for _ in range(generator.randint(0, 6)):
+            product_id = generator.randint(1, products)
+            moment = START + timedelta(days=day, seconds=generator.randint(0, 86399))
+            if stock[product_id] and generator.random() < 0.6:
+                quantity = generator.randint(1, stock[product_id])
+                stock[product_id] -= quantity
+                histories.append({"product_id": product_id, "product_quantity": quantity, "price_per_unit": 500,
+                                  "total_price": 500 * quantity, "stocktype": "stock out", "date": moment,
+                                  "cost_of_goods": 400 * quantity})
+            else:
+                quantity = generator.randint(1, 20)
+                stock[product_id] += quantity
+                histories.append({"product_id": product_id, "product_quantity": quantity, "price_per_unit": 400,
+                                  "total_price": 400 * quantity, "stocktype": "stock in", "date": moment})
+    db.execute(insert(StockHistory), histories)
+    record_movements(db, histories)
+    db.commit()
+    return histories
+
+
+def replay(histories, at):
+    quantities = {}
+    for history in histories:
+        if history["date"] < at:
+            sign = -1 if history["stocktype"] == "stock out" else 1
+            quantities[history["product_id"]] = quantities.get(history["product_id"], 0) + sign * history["product_quantity"]
+    return {product_id: quantity for product_id, quantity in sorted(quantities.items()) if quantity}
+
+
+def sample_times(count=25, seed=11):
+    generator = random.Random(seed)
+    times = [START, START + timedelta(days=30), START + timedelta(days=95)]
+    times += [START + timedelta(seconds=generator.randint(0, 95 * 86400)) for _ in range(count)]
+    return times
+
+
+def test_snapshot_plus_delta_matches_full_replay(db):
+    histories = seed_history(db)
+
+    for at in sample_times():
+        assert on_hand(db, at) == replay(histories, at), at  # no snapshots yet: rollup and same-day replay
+
+    for day in range(90):
+        take_snapshot(db, date(2024, 1, 1) + timedelta(days=day))
+    db.commit()
+    for at in sample_times():
+        assert on_hand(db, at) == replay(histories, at), at
+        assert on_hand(db, at, product_id=3) == {key: value for key, value in replay(histories, at).items() if key == 3}
+
+    removed = compact(db, keep_days=20, today=date(2024, 3, 31))
+    db.commit()
+    assert removed > 0
+    kept_days = {row.day for row in db.query(StockSnapshot.day).distinct()}
+    assert {date(2024, 1, 31), date(2024, 2, 29)} <= kept_days
+    assert date(2024, 2, 15) not in kept_days
+    for at in sample_times():
+        assert on_hand(db, at) == replay(histories, at), at
+
+
+def test_on_hand_is_one_statement(db, count_statements):
+    seed_history(db, days=10)
+    take_snapshot(db, date(2024, 1, 5))
+    db.commit()
+
+    count_statements.count = 0
+    on_hand(db, datetime(2024, 1, 8, 12))
+
+    assert count_statements.count == 1
+
+
+def test_stock_at_endpoint(client, db):
+    histories = seed_history(db, days=10)
+
+    response = client.get("/stock/at", params={"date": "2024-01-05"})
+    timestamp = client.get("/stock/at", params={"date": "2024-01-05T12:00:00+02:00", "product_id": 2})
+    bad = client.get("/stock/at", params={"date": "05/01/2024"})
+
+    assert response.status_code == 200
+    expected = replay(histories, datetime(2024, 1, 6))
+    assert {row["product_id"]: row["quantity"] for row in response.json()["products"]} == expected
+    assert response.json()["products"][0]["product_name"] == f"Milk {min(expected)}"
+    assert timestamp.json()["at"] == "2024-01-05T10:00:00"
+    assert {row["product_id"]: row["quantity"] for row in timestamp.json()["products"]} == {
+        key: value for key, value in replay(histories, datetime(2024, 1, 5, 10)).items() if key == 2
+    }
+    assert bad.status_code == 400
@@ -0,0 +1,199 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.exc import OperationalError
+
+from db.database import SessionLocal
+from db.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, encode_cursor
+from Endpoints.stockIn import _create_or_update_stock
+from Endpoints.stockOut import _create_stock_out
+from models.userModels import Products, Stock, StockHistory, StockOut
+from schemas.stockInSchema import StockCreateSchema
+
+SALE_ATTEMPTS = 200
+
+
+def seed_sales(db, products, sales_per_product):
+    offset = db.query(Products).count()
+    for index in range(offset, offset + products):
+        product = Products(product_name=f"Milk {index}", product_type="milk", product_price="500")
+        db.add(product)
+        db.flush()
+        db.add(StockHistory(product_id=product.Pro_id, product_quantity=1000, price_per_unit="400",
+                            total_price="400000", stocktype="stock in"))
+        for sale in range(sales_per_product):
+            db.add(StockOut(product_id=product.Pro_id, product_quantity=1, price_per_unit=str(390 + sale % 20),
+                            total_price=str(390 + sale % 20), date=date.today(), cost_of_goods="400"))
+    db.commit()
+
+
+def test_list_stock_out_reports_profit_status(client, db):
+    seed_sales(db, products=1, sales_per_product=20)
+
+    response = client.get("/stock/out/")
+
+    assert response.status_code == 200
+    assert "X-Next-Cursor" not in response.headers
+    rows = response.json()
+    assert len(rows) == 20
+    assert rows[0]["product_name"] == "Milk 0"
+    assert {row["profit_status"] for row in rows} == {"loss", "break-even", "profit"}
+
+
+def test_list_stock_out_statement_count_is_constant(client, db, count_statements):
+    seed_sales(db, products=2, sales_per_product=5)
+    count_statements.count = 0
+    client.get("/stock/out/", params={"limit": 1000})
+    small = count_statements.count
+
+    seed_sales(db, products=20, sales_per_product=45)
+    count_statements.count = 0
+    response = client.get("/stock/out/", params={"limit": 1000})
+
+    assert len(response.json()) == 2 * 5 + 20 * 45
+    assert count_statements.count == small
+
+
+def test_stock_out_by_date_enriches_rows_in_one_statement(client, db, count_statements):
+    seed_sales(db, products=3, sales_per_product=0)
+    db.add_all(Stock(product_id=product_id, product_quantity=7, price_per_unit="400", total_price="2800")
+               for product_id in (1, 2, 3))
+    db.commit()
+
+    count_statements.count = 0
+    response = client.post("/stock/out/byDate")
+
+    assert response.status_code == 200
+    assert count_statements.count == 1
+    rows = response.json()
+    assert len(rows) == 3
+    assert rows[0]["remaing_quantity"] == 7
+    assert rows[0]["tra_type"] == "stock in"
+    assert rows[0]["profit_status"] == "break-even"
+
+
+def test_list_stock_out_pages_with_cursor(client, db):
+    seed_sales(db, products=1, sales_per_product=25)
+
+    seen = []
+    params = {"limit": 10}
+    while True:
+        response = client.get("/stock/out/", params=params)
+        assert response.status_code == 200
+        seen.extend(row["stock_id"] for row in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+        params["after"] = cursor
+
+    assert seen == list(range(1, 26))
+
+
+def test_lists_are_paged_by_default(client, db):
+    seed_sales(db, products=1, sales_per_product=150)
+
+    first = client.get("/stock/out/")
+    rest = client.get("/stock/out/", params={"after": first.headers["X-Next-Cursor"]})
+
+    assert len(first.json()) == DEFAULT_PAGE_SIZE
+    assert len(rest.json()) == 150 - DEFAULT_PAGE_SIZE
+    assert "X-Next-Cursor" not in rest.headers
+    assert client.get("/stock/out/", params={"limit": MAX_PAGE_SIZE + 1}).status_code == 422
+
+
+def test_invalid_cursor_is_rejected(client):
+    wrong_shapes = [encode_cursor(value) for value in ({"id": 1}, [1], "1", None, True)]
+    for cursor in ["not-a-cursor", *wrong_shapes]:
+        response = client.get("/stock/out/", params={"after": cursor, "limit": 10})
+        assert response.status_code == 400, cursor
+
+
+def test_bulk_checkout_records_every_line_in_one_transaction(client, db, count_statements, stock_line, seed_products):
+    seed_products(3, stock={1: 10, 2: 5, 3: 2})
+
+    count_statements.count = 0
+    response = client.post("/stock/out/bulk", json=[
+        stock_line(1, 3, 450), stock_line(2, 5, 400), stock_line(1, 2, 500), stock_line(3, 1, 420),
+    ])
+
+    assert response.status_code == 201
+    assert [row["profit_status"] for row in response.json()] == ["profit", "break-even", "profit", "profit"]
+    assert count_statements.count <= 12  # 2 lookups, a decrement per product (+1 delete), cost layer read + update, 2 inserts, rollup + version upserts, low stock queue
+    assert {stock.product_id: stock.product_quantity for stock in db.query(Stock)} == {1: 5, 3: 1}
+    assert db.query(StockOut).count() == 4
+    assert db.query(StockHistory).filter(StockHistory.stocktype == "stock out").count() == 4
+
+
+def test_bulk_checkout_rejects_whole_basket_when_a_line_fails(client, db, stock_line, seed_products):
+    seed_products(2, stock={1: 10, 2: 5})
+
+    response = client.post("/stock/out/bulk", json=[stock_line(1, 3, 450), stock_line(2, 4, 450), stock_line(2, 2, 450)])
+
+    assert response.status_code == 403
+    assert response.json()["detail"].startswith("Line 3: Insufficient quantity")
+    assert {stock.product_id: stock.product_quantity for stock in db.query(Stock)} == {1: 10, 2: 5}
+    assert db.query(StockOut).count() == 0
+
+    response = client.post("/stock/out/bulk", json=[stock_line(1, 1, 390)])
+    assert response.status_code == 403
+    assert response.json()["detail"] == "Line 1: You Cant Make Loss On Our Watch"
+
+
+def attempt(work, line):
+    """
+    Run one write in its own session, retrying like a client would when SQLite reports the
+    database as locked, but not forever. False when it is rejected as short of stock.
+    """
+    for _ in range(SALE_ATTEMPTS):
+        session = SessionLocal()
+        try:
+            work(session, line)
+            session.commit()
+            return True
+        except HTTPException as error:
+            assert error.status_code in (403, 404)  # short, or the exhausted row is gone
+            return False
+        except OperationalError:
+            continue
+        finally:
+            session.close()
+    pytest.fail(f"a write was still locked out after {SALE_ATTEMPTS} attempts")
+
+
+def test_concurrent_sales_never_oversell(db, stock_line, seed_products):
+    seed_products(stock={1: 200})
+    sale = StockCreateSchema(**stock_line(1, 1, 450))
+
+    def sell():
+        return attempt(_create_stock_out, sale)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        outcomes = list(pool.map(lambda _: sell(), range(300)))
+    elapsed = time.perf_counter() - start
+
+    db.expire_all()
+    stock = db.query(Stock).filter(Stock.product_id == 1).first()
+    sold = sum(outcomes)
+    print(f"\n{sold} sales in {elapsed:.2f}s ({sold / elapsed:.0f} sales/sec), {len(outcomes) - sold} rejected")
+    assert sold == 200
+    assert stock is None  # exhausted rows are removed, never driven negative
+    assert db.query(StockOut).count() == 200
+
+
+def test_concurrent_receipts_and_sales_keep_every_change(db, stock_line, seed_products):
+    seed_products(stock={1: 100})
+    sale = StockCreateSchema(**stock_line(1, 1, 450))
+    receipt = StockCreateSchema(**stock_line(1, 1, 400))
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        jobs = [(_create_stock_out, sale), (_create_or_update_stock, receipt)] * 100
+        outcomes = list(pool.map(lambda job: attempt(*job), jobs))
+
+    db.expire_all()
+    assert all(outcomes)
+    assert db.query(Stock.product_quantity).filter(Stock.product_id == 1).scalar() == 100
+    assert db.query(StockOut).count() == 100
@@ -0,0 +1,308 @@
+"""
+Publish/subscribe for live event streams (server-sent events and WebSockets).
+
+Publishers are request handlers, which run on the threadpool (or inside `run_sync`);
+subscribers are streaming responses on the event loop. Writers don't publish directly:
+`publish_after_commit` queues events on the session and they go out once it commits, so
+a rolled back write publishes nothing.
+
+Every event gets an increasing id, and each worker keeps the last `history` events in a
+ring buffer. A client that reconnects with `Last-Event-ID` is first sent what it missed;
+if that has already left the buffer (or the worker restarted) it gets a `reset` event and
+should reload its view instead. A subscriber that falls `maxsize` events behind loses its
+oldest ones rather than holding memory for them.
+
+The backend assigns ids and carries events to every worker's subscribers:
+
+- `LocalBackend` (default): a single worker, events go straight to its own subscribers.
+- `RedisBackend`: a Redis pub/sub channel shared by all uvicorn workers, with ids from a
+  Redis counter so a client can resume on any worker. Enabled with BROADCAST_REDIS_URL;
+  needs `pip install redis`.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+from fastapi import WebSocket, WebSocketDisconnect
+from sqlalchemy import event as orm_event
+from sqlalchemy.orm import Session
+
+from db.pubsub import RedisListener
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}  # no proxy buffering
+HEARTBEAT_SECONDS = 15.0
+RESET = "reset"  # event name telling a resuming client it missed events
+
+_PENDING = "pending_broadcasts"  # session.info key
+
+logger = logging.getLogger(__name__)
+
+
+class LocalBackend:
+    """Backend for a single worker. Ids start from the clock so they keep growing across restarts."""
+
+    def __init__(self):
+        self._callbacks = []
+        self._next_id = int(time.time() * 1000)
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback):
+        self._callbacks.append(callback)
+
+    def publish(self, data):
+        with self._lock:  # ids reach the subscribers in order
+            event_id = self._next_id
+            self._next_id += 1
+            for callback in self._callbacks:
+                callback(event_id, data)
+
+
+class RedisBackend:
+    """
+    Publishes on a Redis pub/sub channel; every worker delivers from a background listener
+    thread, the publisher included. A Lua script takes the id and publishes in one step, so
+    ids arrive in order. `client` is a `redis.Redis`-like object; `data` must be JSON-serializable.
+    """
+
+    _PUBLISH = """
+    local id = redis.call('INCR', KEYS[1])
+    redis.call('PUBLISH', ARGV[1], '{"id":' .. id .. ',"data":' .. ARGV[2] .. '}')
+    return id
+    """
+
+    def __init__(self, client, channel: str, **listener_options):
+        self.client = client
+        self.channel = channel
+        self._callbacks = []
+        self._publish = client.register_script(self._PUBLISH)
+        self._listener = RedisListener(client, channel, self._receive, **listener_options)
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs):
+        import redis
+
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def subscribe(self, callback):
+        self._callbacks.append(callback)
+
+    def publish(self, data):
+        self._publish(keys=[f"{self.channel}:last-id"], args=[self.channel, json.dumps(data, separators=(",", ":"))])
+
+    def _receive(self, data):
+        message = json.loads(data)
+        for callback in self._callbacks:
+            callback(message["id"], message["data"])
+
+
+def broadcast_backend(channel: str):
+    """The backend for a broadcaster: Redis on `channel` when BROADCAST_REDIS_URL is set, else local."""
+    url = os.getenv("BROADCAST_REDIS_URL")
+    return RedisBackend.from_url(url, channel=channel) if url else LocalBackend()
+
+
+class Subscription:
+    """
+    A subscriber's pending events. Lighter than an `asyncio.Queue` with `wait_for`: a wait is
+    one future (and one timer with a timeout), and a backlog is taken without waiting at all.
+    """
+
+    def __init__(self, maxsize: int):
+        self.loop = asyncio.get_running_loop()
+        self.maxsize = maxsize
+        self.pending = deque()
+        self.dropped = 0
+        self.reset = False  # the client resumed from an event that is no longer buffered
+        self._waiter = None
+
+    def _put(self, item):
+        if len(self.pending) >= self.maxsize:
+            self.pending.popleft()
+            self.dropped += 1
+        self.pending.append(item)
+        _wake(self._waiter)
+
+    async def get(self, timeout: Optional[float] = None):
+        """The next `(event_id, data)`; raises `asyncio.TimeoutError` if none arrives within `timeout` seconds."""
+        if not self.pending:
+            waiter = self._waiter = self.loop.create_future()
+            timer = None if timeout is None else self.loop.call_later(timeout, _wake, waiter)
+            try:
+                await waiter
+            finally:
+                self._waiter = None
+                if timer is not None:
+                    timer.cancel()
+            if not self.pending:
+                raise asyncio.TimeoutError
+        return self.pending.popleft()
+
+
+def _wake(waiter):
+    if waiter is not None and not waiter.done():
+        waiter.set_result(None)
+
+
+class Broadcaster:
+    def __init__(self, maxsize: int = 100, history: int = 1000, backend=None):
+        self.maxsize = maxsize
+        self._subscribers = set()
+        self._buffer = deque(maxlen=history)
+        self._lock = threading.Lock()
+        self.backend = backend or LocalBackend()
+        self.backend.subscribe(self._deliver)
+
+    def subscribe(self, last_event_id: Optional[int] = None) -> Subscription:
+        """
+        A new subscription for the calling event loop; pair with `unsubscribe`. With
+        `last_event_id` it starts with the buffered events after that one.
+        """
+        subscription = Subscription(self.maxsize)
+        with self._lock:
+            self._subscribers.add(subscription)
+            if last_event_id is not None:
+                if self._buffer and self._buffer[0][0] <= last_event_id + 1:
+                    for item in self._buffer:
+                        if item[0] > last_event_id:
+                            subscription._put(item)
+                else:
+                    subscription.reset = True
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, data):
+        """Send `data` to every subscriber, on every worker. Safe from any thread."""
+        self.backend.publish(data)
+
+    def _deliver(self, event_id: int, data):
+        item = (event_id, data)
+        by_loop = {}
+        with self._lock:
+            self._buffer.append(item)
+            for subscription in self._subscribers:
+                by_loop.setdefault(subscription.loop, []).append(subscription)
+        # One wake-up per event loop, not one per subscriber
+        for loop, subscriptions in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(_put_all, subscriptions, item)
+            except RuntimeError:  # the loop is closed
+                for subscription in subscriptions:
+                    self.unsubscribe(subscription)
+
+    def __len__(self):
+        return len(self._subscribers)
+
+
+def _put_all(subscriptions, item):
+    for subscription in subscriptions:
+        subscription._put(item)
+
+
+def publish_after_commit(session: Session, broadcaster: Broadcaster, events):
+    """Publish `events` to `broadcaster` once `session` commits; a rollback drops them."""
+    session.info.setdefault(_PENDING, []).extend((broadcaster, data) for data in events)
+
+
+@orm_event.listens_for(Session, "after_commit")
+def _publish_pending(session):
+    # The data is already committed: a failed publish (e.g. Redis down) must not fail the request
+    for broadcaster, data in session.info.pop(_PENDING, ()):
+        try:
+            broadcaster.publish(data)
+        except Exception:
+            logger.exception("Could not publish an event after commit")
+
+
+@orm_event.listens_for(Session, "after_rollback")
+def _drop_pending(session):
+    session.info.pop(_PENDING, None)
+
+
+def parse_event_id(value: Optional[str]) -> Optional[int]:
+    """A `Last-Event-ID` header or query value; anything that isn't an event id counts as none."""
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+def sse_message(data, event: Optional[str] = None, event_id=None) -> str:
+    """One server-sent event with `data` as compact JSON."""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.append("data: " + json.dumps(data, separators=(",", ":"), default=str))
+    return "\n".join(lines) + "\n\n"
+
+
+async def sse_stream(broadcaster: Broadcaster, event: str, last_event_id: Optional[int] = None,
+                     heartbeat: float = HEARTBEAT_SECONDS):
+    """
+    Body of a `text/event-stream` response: each event published from now on (and any the
+    client missed since `last_event_id`) as an SSE message, and a comment line every
+    `heartbeat` seconds so proxies keep the connection open. The subscription ends when the
+    client disconnects.
+    """
+    subscription = broadcaster.subscribe(last_event_id)
+    try:
+        if subscription.reset:
+            yield sse_message({}, RESET)
+        while True:
+            try:
+                event_id, data = await subscription.get(heartbeat)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield sse_message(data, event, event_id)
+    finally:
+        broadcaster.unsubscribe(subscription)
+
+
+async def _send_event(websocket: WebSocket, event: str, item):
+    event_id, data = item
+    message = {"id": event_id, "event": event, "data": data}
+    await websocket.send_text(json.dumps(message, separators=(",", ":"), default=str))
+
+
+async def websocket_feed(websocket: WebSocket, broadcaster: Broadcaster, event: str,
+                         last_event_id: Optional[int] = None):
+    """
+    Send events to an accepted WebSocket as `{"id", "event", "data"}` JSON text frames until
+    the client disconnects; messages from the client are ignored.
+    """
+    subscription = broadcaster.subscribe(last_event_id)
+    receiver = asyncio.ensure_future(websocket.receive())
+    getter = None
+    try:
+        if subscription.reset:
+            await websocket.send_text(json.dumps({"id": None, "event": RESET, "data": {}}))
+        while True:
+            while subscription.pending:
+                await _send_event(websocket, event, subscription.pending.popleft())
+            getter = asyncio.ensure_future(subscription.get())
+            await asyncio.wait({getter, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if getter.done():
+                await _send_event(websocket, event, getter.result())
+            else:
+                getter.cancel()
+            if receiver.done():
+                if receiver.result()["type"] == "websocket.disconnect":
+                    return
+                receiver = asyncio.ensure_future(websocket.receive())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for task in (getter, receiver):
+            if task is not None:
+                task.cancel()
+        broadcaster.unsubscribe(subscription)
@@ -0,0 +1,181 @@
+"""
+Response compression for large list and export payloads.
+
+`CompressionMiddleware` picks the best encoding the client accepts from `encodings`
+(zstd and br need the optional `zstandard` / `brotli` packages and are skipped without
+them, gzip is always available):
+
+- Complete responses smaller than `minimum_size` are sent as they are.
+- Streamed responses (`more_body`) are compressed chunk by chunk and flushed after each
+  one, so exports keep streaming instead of being buffered to the end.
+- Only compressible content types are touched, never text/event-stream, and never a
+  response that already has a Content-Encoding.
+"""
+import zlib
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional
+    zstandard = None
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/csv", "text/plain", "text/html")
+
+
+class _Gzip:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip container
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class _Brotli:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class _Zstd:
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+# Content-Encoding -> compressor class, for the codecs importable here
+CODECS = {"gzip": _Gzip}
+if brotli is not None:
+    CODECS["br"] = _Brotli
+if zstandard is not None:
+    CODECS["zstd"] = _Zstd
+
+
+def accepted_encodings(header: str) -> set:
+    """Encodings an Accept-Encoding header allows (q > 0)."""
+    accepted = set()
+    for item in header.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name and quality > 0:
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = 1024, encodings=("zstd", "br", "gzip"), levels: dict = None):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encodings = [encoding for encoding in encodings if encoding in CODECS]
+        self.levels = {"gzip": 6, "br": 4, "zstd": 3, **(levels or {})}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.encodings:
+            return await self.app(scope, receive, send)
+
+        header = next((value.decode("latin-1") for key, value in scope["headers"] if key == b"accept-encoding"), "")
+        accepted = accepted_encodings(header)
+        encoding = next((encoding for encoding in self.encodings if encoding in accepted or "*" in accepted), None)
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        responder = _CompressingSend(send, encoding, CODECS[encoding](self.levels[encoding]), self.minimum_size)
+        await self.app(scope, receive, responder)
+
+
+class _CompressingSend:
+    """The `send` callable handed to the app: holds the response start until the first body chunk."""
+
+    def __init__(self, send, encoding: str, compressor, minimum_size: int):
+        self.send = send
+        self.encoding = encoding
+        self.compressor = compressor
+        self.minimum_size = minimum_size
+        self.start = None
+        self.compressing = None  # decided on the first body chunk
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            self.start = message
+            return
+        if message["type"] != "http.response.body" or self.compressing is False:
+            return await self.send(message)
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.compressing is None:
+            self.compressing = self._compressible(body, more_body)
+            if not self.compressing:
+                await self.send(self.start)
+                return await self.send(message)
+            await self._send_start(None if more_body else body)
+            if not more_body:
+                return  # sent whole by _send_start
+
+        data = self.compressor.compress(body)
+        data += self.compressor.flush() if more_body else self.compressor.finish()
+        await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+    def _compressible(self, body: bytes, more_body: bool) -> bool:
+        headers = {key.lower(): value for key, value in self.start.get("headers", [])}
+        content_type = headers.get(b"content-type", b"").decode("latin-1").split(";")[0].strip().lower()
+        if b"content-encoding" in headers or content_type not in COMPRESSIBLE_TYPES:
+            return False
+        if self.start["status"] < 200 or self.start["status"] in (204, 304):
+            return False
+        return more_body or len(body) >= self.minimum_size
+
+    async def _send_start(self, whole_body):
+        headers = [
+            (key, value) for key, value in self.start.get("headers", [])
+            if key.lower() not in (b"content-length", b"content-encoding")
+        ]
+        vary = False
+        for index, (key, value) in enumerate(headers):
+            if key.lower() == b"etag" and not value.startswith(b"W/"):
+                headers[index] = (key, b"W/" + value)  # a different representation than the identity one
+            elif key.lower() == b"vary":
+                headers[index] = (key, value + b", Accept-Encoding")
+                vary = True
+        headers.append((b"content-encoding", self.encoding.encode()))
+        if not vary:
+            headers.append((b"vary", b"Accept-Encoding"))
+        if whole_body is None:
+            return await self.send({**self.start, "headers": headers})
+
+        data = self.compressor.compress(whole_body) + self.compressor.finish()
+        headers.append((b"content-length", str(len(data)).encode()))
+        await self.send({**self.start, "headers": headers})
+        await self.send({"type": "http.response.body", "body": data, "more_body": False})
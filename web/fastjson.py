@@ -0,0 +1,143 @@
+"""
+Opt-in fast JSON responses.
+
+Routers use `FastJSONRoute` as their route class. While fast mode is off (the default, and
+what the tests run) nothing changes: FastAPI validates each result against the route's
+`response_model` and serializes it. With `enable_fast_json()`, called from main.py when
+FAST_JSON=true, a route's result is instead:
+
+- trimmed to the response model's fields by a projector built once per route, without
+  per-row validation, so nothing the model leaves out is ever sent, and
+- encoded straight to bytes by orjson (`FastJSONResponse`).
+
+Headers and status set on the injected `Response` (X-Next-Cursor, ETag, ...) are kept.
+"""
+import functools
+import inspect
+from decimal import Decimal
+from typing import List, Union, get_args, get_origin
+
+import orjson
+from fastapi import Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.encoders import decimal_encoder, jsonable_encoder
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
+
+_RESPONSE_PARAMETER = "_fast_json_response"
+
+_enabled = False
+
+
+def enable_fast_json(enabled: bool = True):
+    global _enabled
+    _enabled = enabled
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return decimal_encoder(value)
+    return jsonable_encoder(value)
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _to_float(value):
+    return None if value is None else float(value)
+
+
+def _projector(annotation):
+    """
+    A function trimming a value to what `annotation` would output, or None when the value
+    can be passed through as is. Models become dicts of their fields, read from dict keys or
+    attributes (ORM rows, dataclasses); lists and Optionals are followed, and float fields are
+    converted here, which is much cheaper than leaving Decimals to orjson's `default`.
+    """
+    origin = get_origin(annotation)
+    if annotation is float:
+        return _to_float
+    if origin in (list, List):
+        (item_type,) = get_args(annotation) or (None,)
+        project_item = _projector(item_type)
+        if project_item is None:
+            return None
+        return lambda value: None if value is None else [project_item(item) for item in value]
+    if origin is Union:
+        members = [member for member in get_args(annotation) if member is not type(None)]
+        return _projector(members[0]) if len(members) == 1 else None
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        fields = [
+            (name, _projector(field.annotation), None if field.is_required() else field.get_default())
+            for name, field in annotation.model_fields.items()
+        ]
+        plain = [(name, default) for name, project, default in fields if project is None]
+        converted = [(name, project, default) for name, project, default in fields if project is not None]
+
+        def project_model(value):
+            if value is None or isinstance(value, (str, bytes)):
+                return value
+            read = value.get if isinstance(value, dict) else functools.partial(getattr, value)
+            result = {name: read(name, default) for name, default in plain}
+            for name, project, default in converted:
+                result[name] = project(read(name, default))
+            return result
+
+        return project_model
+    return None
+
+
+def _fast_endpoint(endpoint, response_model, status_code):
+    """Wrap `endpoint` so that, in fast mode, it returns a ready FastJSONResponse."""
+    project = _projector(response_model)
+    is_coroutine = inspect.iscoroutinefunction(endpoint)
+
+    # The wrapper needs the Response FastAPI injects; reuse the endpoint's own one if it has it
+    signature = inspect.signature(endpoint)
+    response_name = next(
+        (name for name, parameter in signature.parameters.items() if parameter.annotation is Response), None
+    )
+    added = response_name is None
+    if added:
+        response_name = _RESPONSE_PARAMETER
+        signature = signature.replace(parameters=[
+            *signature.parameters.values(),
+            inspect.Parameter(response_name, inspect.Parameter.KEYWORD_ONLY, annotation=Response),
+        ])
+
+    @functools.wraps(endpoint)
+    async def fast_endpoint(**values):
+        response = values.pop(response_name) if added else values[response_name]
+        if is_coroutine:
+            result = await endpoint(**values)
+        else:
+            result = await run_in_threadpool(endpoint, **values)
+        if not _enabled or isinstance(result, Response):
+            return result
+
+        code = response.status_code or status_code or 200
+        if code < 200 or code in (204, 304):
+            fast_response = Response(status_code=code)
+        else:
+            fast_response = FastJSONResponse(project(result) if project else result, status_code=code)
+        fast_response.headers.raw.extend(response.headers.raw)
+        return fast_response
+
+    fast_endpoint.__signature__ = signature
+    fast_endpoint.__fast_json__ = True
+    return fast_endpoint
+
+
+class FastJSONRoute(APIRoute):
+    def __init__(self, path, endpoint, **kwargs):
+        if not getattr(endpoint, "__fast_json__", False):
+            response_model = kwargs.get("response_model")
+            if isinstance(response_model, DefaultPlaceholder):
+                response_model = response_model.value
+            endpoint = _fast_endpoint(endpoint, response_model, kwargs.get("status_code"))
+        super().__init__(path, endpoint, **kwargs)
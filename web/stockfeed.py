@@ -0,0 +1,39 @@
+"""
+Live feed of stock movements.
+
+Every StockHistory row the stock in and stock out endpoints write is announced on
+`stock_events` once its transaction commits, so dashboards can follow `GET /stock/feed`
+(server-sent events) or `/stock/feed/ws` (WebSocket) instead of polling the lists. Events
+are compact:
+
+    {"product_id": 3, "stocktype": "stock out", "quantity": 2, "price_per_unit": 500.0,
+     "total_price": 1000.0, "date": "2024-05-01T10:15:00"}
+
+The last STOCK_FEED_HISTORY events (default 1000) are kept for clients resuming with
+Last-Event-ID; see web/broadcast.py for fanning out across workers.
+"""
+import os
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.orm import Session
+
+from web.broadcast import Broadcaster, broadcast_backend, publish_after_commit
+
+STOCK_FEED_HISTORY = int(os.getenv("STOCK_FEED_HISTORY", "1000"))
+
+stock_events = Broadcaster(history=STOCK_FEED_HISTORY, backend=broadcast_backend("stock-feed"))
+
+
+def record_feed(db: Session, histories):
+    """Announce StockHistory rows, given as their column values, once `db` commits."""
+    publish_after_commit(db, stock_events, jsonable_encoder([
+        {
+            "product_id": history["product_id"],
+            "stocktype": history["stocktype"],
+            "quantity": history["product_quantity"],
+            "price_per_unit": history["price_per_unit"],
+            "total_price": history["total_price"],
+            "date": history["date"],
+        }
+        for history in histories
+    ]))